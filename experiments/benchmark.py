@@ -0,0 +1,380 @@
+"""Benchmark the host minimisers on routing table files and compare the results
+of two benchmark runs.
+
+Usage::
+
+    python benchmark.py run [files ...] --method mtrie --method oc-fast \\
+        --repeats 3 --output results.json
+    python benchmark.py compare old.json new.json
+
+`run` (which defaults to every file in `uncompressed`) minimises every table
+in each file with each of the methods of `minimise.py`, one chip at a time.
+Each file is minimised with each method (and each repetition) in a fresh
+worker process. For each chip the wall-clock time, the CPU time (including
+that of child processes, e.g., Espresso), the peak resident set size of the
+worker while minimising the table, the lengths of the original and minimised
+tables and whether the minimised table fits in a SpiNNaker router (1024
+entries) are recorded. The results are written as JSON or, if the output file
+ends `.csv`, as CSV.
+
+`compare` reads two sets of results (in either format) and, for each file and
+method which appear in both, compares the median, over the repetitions, of the
+total time taken to minimise every table and the greatest length of each
+minimised table. Files are matched by the path given to `run`. Any
+file and method which became slower by more than `--time-threshold`, or has
+a chip whose minimised table became longer, is reported as a regression, in
+which case the exit status is 1.
+"""
+import argparse
+from collections import OrderedDict, defaultdict
+import common
+import csv
+import glob
+import json
+import minimise
+import multiprocessing
+import numpy as np
+import os
+import platform
+import resource
+from six import itervalues
+import sys
+import time
+import verify
+
+
+TABLE_SIZE = 1024
+"""Number of entries in the routing table of a SpiNNaker chip."""
+
+FIELDS = ("file", "model", "method", "repeat", "x", "y", "input_length",
+          "output_length", "fits", "wall_time", "cpu_time", "peak_rss")
+"""Fields recorded for each chip (times in seconds, peak RSS in KiB). The file
+is the path given to :py:func:`run_benchmarks` and the model its name without
+the directory or extension."""
+
+_TYPES = dict(repeat=int, x=int, y=int, input_length=int, output_length=int,
+              fits=lambda value: value in (True, "True"), wall_time=float,
+              cpu_time=float, peak_rss=int)
+"""Types of the fields which are not strings, used to read CSV files."""
+
+
+def _reset_peak_rss():
+    """Reset the peak resident set size of this process (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except (IOError, OSError):
+        pass  # The peak is that of the whole process
+
+
+def _peak_rss():
+    """Get the peak resident set size of this process in KiB, since it was
+    last reset.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _cpu_time():
+    """Get the CPU time used by this process and its finished children."""
+    user, system, children_user, children_system, _ = os.times()
+    return user + system + children_user + children_system
+
+
+def _run_task(task):
+    """Minimise the tables in a file with a method, recording the results
+    for each chip.
+    """
+    fn, method, repeat, chips, verify_method = task
+    model = os.path.splitext(os.path.basename(fn))[0]
+
+    results = list()
+    with common.RoutingTableFile(fn) as f:
+        for chip in chips or list(f):
+            table = f.get_table(chip)
+
+            _reset_peak_rss()
+            wall_time, cpu_time = time.time(), _cpu_time()
+            new_table = minimise.METHODS[method](table)
+            wall_time = time.time() - wall_time
+            cpu_time = _cpu_time() - cpu_time
+            peak_rss = _peak_rss()
+
+            verify.check_table(table, new_table, verify_method)
+            results.append(OrderedDict((
+                ("file", fn), ("model", model), ("method", method),
+                ("repeat", repeat),
+                ("x", chip[0]), ("y", chip[1]),
+                ("input_length", len(table)),
+                ("output_length", len(new_table)),
+                ("fits", len(new_table) <= TABLE_SIZE),
+                ("wall_time", wall_time), ("cpu_time", cpu_time),
+                ("peak_rss", peak_rss),
+            )))
+
+    return results
+
+
+def run_benchmarks(files, methods, repeats=1, jobs=1, chips=None,
+                   verify_method="fast", progress=None):
+    """Minimise every table in each file with each method.
+
+    Parameters
+    ----------
+    files : [str, ...]
+    methods : [str, ...]
+        Names of methods in :py:data:`minimise.METHODS`.
+    repeats : int
+        Number of times to minimise each file with each method.
+    jobs : int
+        Number of files (or repetitions) which are minimised at once, each in
+        a fresh worker process. Concurrent runs compete for the CPUs and
+        memory bandwidth, so the times are most reliable with one job.
+    chips : [(x, y), ...] or None
+        Chips whose tables should be minimised, if None then all the tables
+        are minimised.
+    verify_method : str
+        How to check each minimised table (see `verify.METHODS`), which is not
+        included in the times.
+    progress : file or None
+        File to which a summary of each run is reported.
+
+    Returns
+    -------
+    [OrderedDict, ...]
+        The `FIELDS` of each chip, for each file, method and repetition.
+
+    Raises
+    ------
+    ValueError
+        If a file is given more than once.
+    """
+    if len(set(os.path.normpath(fn) for fn in files)) != len(files):
+        raise ValueError("Files may only be benchmarked once per run")
+
+    tasks = [(fn, method, repeat, chips, verify_method)
+             for fn in files for method in methods
+             for repeat in range(repeats)]
+
+    pool = multiprocessing.Pool(jobs, maxtasksperchild=1)
+    try:
+        results = list()
+        for task_results in pool.imap(_run_task, tasks):
+            results.extend(task_results)
+
+            if progress is not None and task_results:
+                first = task_results[0]
+                progress.write(
+                    "{:40s}{:>16s}{:>4d}{:9.2f} s{:9.2f} s{:>10d} KiB"
+                    "{:>5d}/{:d} fit\n".format(
+                        first["file"], first["method"], first["repeat"],
+                        sum(r["wall_time"] for r in task_results),
+                        sum(r["cpu_time"] for r in task_results),
+                        max(r["peak_rss"] for r in task_results),
+                        sum(r["fits"] for r in task_results),
+                        len(task_results)))
+                progress.flush()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return results
+
+
+def write_results(fn, results, metadata=None):
+    """Write results to a JSON file or, if the name ends `.csv`, a CSV
+    file (which does not include the metadata).
+    """
+    if fn.endswith(".csv"):
+        with open(fn, "w") as f:
+            writer = csv.DictWriter(f, FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(fn, "w") as f:
+            json.dump(OrderedDict((("metadata", metadata or {}),
+                                   ("results", results))), f, indent=1)
+
+
+def read_results(fn):
+    """Read results written by :py:func:`write_results`."""
+    with open(fn) as f:
+        if fn.endswith(".csv"):
+            results = list(csv.DictReader(f))
+        else:
+            results = json.load(f)["results"]
+
+    return [{field: _TYPES.get(field, str)(result[field])
+             for field in FIELDS} for result in results]
+
+
+def summarise(results):
+    """Summarise the results of each file and method.
+
+    Returns
+    -------
+    {(file, method): ({repeat: {(x, y): time, ...}, ...}, {(x, y): (output_length, fits), ...}), ...}
+        The wall-clock time taken to minimise the table for each chip in each
+        repetition and the greatest length of the minimised table for each
+        chip (and whether it fitted in every repetition).
+    """
+    times = defaultdict(lambda: defaultdict(dict))
+    sizes = defaultdict(dict)
+    for result in results:
+        run = (result["file"], result["method"])
+        chip = (result["x"], result["y"])
+        times[run][result["repeat"]][chip] = result["wall_time"]
+
+        length, fits = sizes[run].get(chip, (0, True))
+        sizes[run][chip] = (max(length, result["output_length"]),
+                            fits and result["fits"])
+
+    return {run: (times[run], sizes[run]) for run in times}
+
+
+def _median_total_time(times, chips):
+    """Get the median, over the repetitions, of the total time taken to
+    minimise the tables for some chips.
+    """
+    return float(np.median([sum(repeat[chip] for chip in chips
+                                if chip in repeat)
+                            for repeat in itervalues(times)]))
+
+
+def compare_results(old, new, time_threshold=0.1, min_time=0.01,
+                    out=sys.stdout):
+    """Compare two sets of results, reporting the total time and minimised
+    table lengths of each file and method found in both.
+
+    Parameters
+    ----------
+    old, new : [dict, ...]
+        Results, as returned by :py:func:`run_benchmarks`.
+    time_threshold : float
+        Fractional increase in the total time which is a regression.
+    min_time : float
+        Increase in the total time (in seconds) below which the time is not
+        considered to have regressed, so that noise in very short runs is not
+        reported.
+
+    Returns
+    -------
+    int
+        The number of files and methods which regressed.
+    """
+    old = summarise(old)
+    new = summarise(new)
+
+    out.write("{:40s}{:>16s}{:>10s}{:>10s}{:>8s}{:>10s}{:>10s}{:>10s}"
+              "{:>10s}\n".format("file", "method", "old time",
+                                 "new time", "change", "old size",
+                                 "new size", "old fit", "new fit"))
+    n_regressions = 0
+    for run in sorted(set(old) & set(new)):
+        (old_times, old_sizes), (new_times, new_sizes) = old[run], new[run]
+        chips = sorted(set(old_sizes) & set(new_sizes))
+        if not chips:
+            continue
+
+        old_time = _median_total_time(old_times, chips)
+        new_time = _median_total_time(new_times, chips)
+        old_size, new_size = (sum(sizes[chip][0] for chip in chips)
+                              for sizes in (old_sizes, new_sizes))
+        old_fit, new_fit = (sum(sizes[chip][1] for chip in chips)
+                            for sizes in (old_sizes, new_sizes))
+        n_longer = sum(new_sizes[chip][0] > old_sizes[chip][0]
+                       for chip in chips)
+
+        regressions = list()
+        if (new_time > old_time * (1.0 + time_threshold) and
+                new_time - old_time > min_time):
+            regressions.append("slower")
+        if n_longer:
+            regressions.append("{} tables longer".format(n_longer))
+        n_regressions += bool(regressions)
+
+        out.write("{:40s}{:>16s}{:9.2f}s{:9.2f}s{:>7.1f}%{:>10d}{:>10d}"
+                  "{:>10d}{:>10d}{}\n".format(
+                      run[0], run[1], old_time, new_time,
+                      100.0 * (new_time - old_time) / max(old_time, 1e-9),
+                      old_size, new_size, old_fit, new_fit,
+                      "  REGRESSION: " + ", ".join(regressions)
+                      if regressions else ""))
+
+    return n_regressions
+
+
+if __name__ == "__main__":
+    # Parse the arguments
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser(
+        "run", help="minimise the tables and record the results")
+    run_parser.add_argument("files", nargs="*")
+    run_parser.add_argument("--method", choices=list(minimise.METHODS),
+                            action="append", required=True,
+                            help="method to benchmark, may be repeated")
+    run_parser.add_argument("--repeats", "-n", type=int, default=1,
+                            help="number of times to minimise each file with "
+                                 "each method (default: %(default)s)")
+    run_parser.add_argument("--output", "-o", default="results.json",
+                            help="file to write the results to, as CSV if "
+                                 "the name ends .csv (default: %(default)s)")
+    run_parser.add_argument("--jobs", "-j", type=int, default=1,
+                            help="number of files minimised at once "
+                                 "(default: %(default)s)")
+    run_parser.add_argument("--chip", nargs=2, type=int, action="append",
+                            metavar=("X", "Y"),
+                            help="only minimise the table for this chip")
+    run_parser.add_argument("--verify", choices=verify.METHODS,
+                            default="fast",
+                            help="how to check that each minimised table "
+                                 "routes packets as the original did (not "
+                                 "timed, default: %(default)s)")
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="report regressions between two sets of results")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--time-threshold", type=float, default=0.1,
+                                help="fractional increase in time which is a "
+                                     "regression (default: %(default)s)")
+    compare_parser.add_argument("--min-time", type=float, default=0.01,
+                                help="smallest increase in time, in seconds, "
+                                     "which is a regression (default: "
+                                     "%(default)s)")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        files = args.files or sorted(glob.glob("uncompressed/*.bin"))
+        chips = [tuple(c) for c in args.chip] if args.chip else None
+        metadata = OrderedDict((
+            ("date", time.strftime("%Y-%m-%d %H:%M:%S")),
+            ("host", platform.node()),
+            ("platform", platform.platform()),
+            ("python", platform.python_version()),
+            ("numpy", np.__version__),
+            ("cpus", multiprocessing.cpu_count()),
+            ("jobs", args.jobs),
+            ("argv", sys.argv),
+        ))
+
+        results = run_benchmarks(files, args.method, args.repeats, args.jobs,
+                                 chips, args.verify, progress=sys.stdout)
+        write_results(args.output, results, metadata)
+        print("Wrote {} results to {}".format(len(results), args.output))
+    else:
+        n_regressions = compare_results(read_results(args.old),
+                                        read_results(args.new),
+                                        args.time_threshold, args.min_time)
+        if n_regressions:
+            print("{} regressions".format(n_regressions))
+            sys.exit(1)
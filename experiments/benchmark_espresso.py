@@ -0,0 +1,64 @@
+"""Compare the run time of, and the size of the tables produced by, the
+Espresso executable and the minimiser in `two_level` (`--backend native` in
+`espresso.py`).
+
+Usage: `python benchmark_espresso.py [files ...]` (defaults to every file in
+`uncompressed`).
+
+Both the order-exploiting mode (each route with the later routes as the
+off-set) and the whole-table mode (without an off-set, after removing default
+entries) are compared. Espresso results are never cached.
+"""
+import argparse
+import common
+import espresso
+import glob
+import time
+
+
+MODES = {
+    "order-exploiting": dict(),
+    "whole-table": dict(whole_table=True, provide_offset=False,
+                        remove_default_entries=True),
+}
+"""Arguments to `espresso.minimise` for each mode."""
+
+
+if __name__ == "__main__":
+    # Parse the arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--chip", nargs=2, type=int, action="append",
+                        metavar=("X", "Y"),
+                        help="only minimise the table for this chip")
+    parser.add_argument("--mode", choices=sorted(MODES), action="append",
+                        help="mode to compare (default: both)")
+    parser.add_argument("--backend", choices=("espresso", "native"),
+                        action="append",
+                        help="backend to compare (default: both)")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob("uncompressed/*.bin"))
+    modes = args.mode or sorted(MODES)
+    backends = args.backend or ["espresso", "native"]
+
+    print("{:40s}{:>18s}{:>10s}{:>10s}{:>8s}{:>8s}{:>8s}".format(
+        "File", "Mode", "Backend", "Time", "Mean", "Max", "Fit"))
+    for fn in files:
+        with common.RoutingTableFile(fn) as f:
+            chips = [tuple(c) for c in args.chip] if args.chip else list(f)
+            tables = [f.get_table(chip) for chip in chips]
+
+        for mode in modes:
+            for backend in backends:
+                lengths = list()
+                t = time.time()
+                for table in tables:
+                    lengths.append(len(espresso.minimise(
+                        table, backend=backend, **MODES[mode])))
+                run_time = time.time() - t
+
+                print("{:40s}{:>18s}{:>10s}{:9.1f}s{:8.1f}{:8d}{:8d}".format(
+                    fn, mode, backend, run_time,
+                    float(sum(lengths)) / len(lengths), max(lengths),
+                    sum(1 for l in lengths if l <= 1024)))
@@ -0,0 +1,133 @@
+"""Compare the time taken to read and write routing table files using the
+original entry-by-entry implementations and the Numpy implementations in
+`common`.
+
+Usage: `python benchmark_io.py [files ...]` (defaults to every file in
+`uncompressed`).
+"""
+import argparse
+import common
+import glob
+import io
+from rig.routing_table import RoutingTableEntry, Routes
+from six import iteritems
+import struct
+import timeit
+
+
+def read_routing_tables_struct(fp):
+    """Original reader which unpacks every entry with `struct`."""
+    tables = dict()
+
+    data = fp.read()
+    offset = 0
+    while offset < len(data):
+        # Read the header
+        x, y, n_entries = struct.unpack_from("<2BH", data, offset)
+        offset += 4
+
+        # Prepare the entries
+        entries = [None for _ in range(n_entries)]
+
+        # Read the entries
+        for i in range(n_entries):
+            key, mask, source_word, route_word = \
+                struct.unpack_from("<4I", data, offset)
+            offset += 16
+
+            route = {r for r in Routes if route_word & (1 << r)}
+            source = {s for s in Routes if source_word & (1 << s)}
+            entries[i] = RoutingTableEntry(route, key, mask, source)
+
+        # Store the table
+        tables[(x, y)] = entries
+
+    return tables
+
+
+def dump_routing_tables_struct(fp, tables):
+    """Original writer which packs every entry with `struct`."""
+    for (x, y), entries in iteritems(tables):
+        # Write the header
+        fp.write(struct.pack("<2BH", x, y, len(entries)))
+
+        # Write the entries
+        for entry in entries:
+            route_word = 0x0
+            for route in entry.route:
+                route_word |= 1 << route
+
+            source_word = 0x0
+            for source in entry.sources:
+                if source is not None:
+                    source_word |= 1 << source
+
+            fp.write(struct.pack("<4I", entry.key, entry.mask,
+                                 source_word, route_word))
+
+
+def time_reader(reader, fn, repeats):
+    """Return the best time taken to read a file."""
+    def read():
+        with open(fn, "rb") as f:
+            reader(f)
+
+    return min(timeit.repeat(read, number=1, repeat=repeats))
+
+
+def time_writer(writer, tables, repeats):
+    """Return the best time taken to write a set of tables."""
+    def write():
+        writer(io.BytesIO(), tables)
+
+    return min(timeit.repeat(write, number=1, repeat=repeats))
+
+
+if __name__ == "__main__":
+    # Parse the arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob("uncompressed/*.bin"))
+
+    readers = (("struct", read_routing_tables_struct),
+               ("entries", common.read_routing_tables),
+               ("arrays", common.read_routing_table_arrays))
+
+    # Check that the readers and writers agree before timing them
+    for fn in files:
+        with open(fn, "rb") as f:
+            data = f.read()
+            f.seek(0)
+            expected = read_routing_tables_struct(f)
+        with open(fn, "rb") as f:
+            assert common.read_routing_tables(f) == expected
+
+        fp = io.BytesIO()
+        common.dump_routing_tables(fp, expected)
+        assert fp.getvalue() == data
+
+    print("{:40s}".format("File") +
+          "".join("{:>10s}".format(name) for name, _ in readers) +
+          "".join("{:>10s}".format("w-" + name) for name in
+                  ("struct", "entries", "arrays")))
+    for fn in files:
+        times = [time_reader(reader, fn, args.repeats) for _, reader in
+                 readers]
+
+        # Time writing the tables in each form
+        with open(fn, "rb") as f:
+            entries = common.read_routing_tables(f)
+        with open(fn, "rb") as f:
+            arrays = common.read_routing_table_arrays(f)
+        times.append(time_writer(dump_routing_tables_struct, entries,
+                                 args.repeats))
+        times.append(time_writer(common.dump_routing_tables, entries,
+                                 args.repeats))
+        times.append(time_writer(common.dump_routing_tables, arrays,
+                                 args.repeats))
+
+        print("{:40s}".format(fn) +
+              "".join("{:9.3f}s".format(t) for t in times))
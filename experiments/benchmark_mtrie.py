@@ -0,0 +1,106 @@
+"""Compare the time taken to minimise routing tables with each of the m-Trie
+engines in `mtrie`, checking that they produce the same minimised tables.
+
+Usage: `python benchmark_mtrie.py [files ...] [--stats] [--batch]` (defaults
+to every file in `uncompressed`).
+
+With `--stats` the number of paths enumerated by each engine while finding
+paths to merge (see `mtrie.stats`) is also reported. With `--batch` each engine
+is also timed in batch mode (shown as `engine+b`).
+
+Default entries are removed before timing, so only the time spent in the
+tries is compared.
+"""
+import argparse
+import common
+import fast_rde
+import glob
+import mtrie
+import time
+
+
+def time_engines(table, engines, batch=False):
+    """Minimise a table with each engine.
+
+    Parameters
+    ----------
+    engines : [str, ...]
+    batch : bool
+        If True each engine is also used in batch mode (after all the engines
+        have been used without it).
+
+    Returns
+    -------
+    ([float, ...], [int, ...], int, bool)
+        Time taken by and number of paths enumerated by each engine (and mode),
+        the length of the minimised table and whether every engine produced
+        the same table.
+    """
+    table = fast_rde.minimise(table)
+
+    times = list()
+    paths = list()
+    results = list()
+    for batch_ in ((False, True) if batch else (False, )):
+        for engine in engines:
+            mtrie.stats.clear()
+            t = time.time()
+            new_table = mtrie.minimise_subtables(table, engine, batch_)
+            times.append(time.time() - t)
+            paths.append(mtrie.stats["paths"])
+            results.append(sorted(zip(new_table.keys.tolist(),
+                                      new_table.masks.tolist(),
+                                      new_table.routes.tolist())))
+
+    same = all(r == results[0] for r in results[1:])
+    return times, paths, len(results[0]), same
+
+
+if __name__ == "__main__":
+    # Parse the arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--chip", nargs=2, type=int, action="append",
+                        metavar=("X", "Y"),
+                        help="only minimise the table for this chip")
+    parser.add_argument("--engine", choices=list(mtrie.ENGINES),
+                        action="append",
+                        help="engine to compare (default: all of them); "
+                             "speedups are relative to the first")
+    parser.add_argument("--batch", action="store_true",
+                        help="also compare each engine in batch mode")
+    parser.add_argument("--stats", action="store_true",
+                        help="report the number of paths enumerated")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob("uncompressed/*.bin"))
+    engines = args.engine or list(mtrie.ENGINES)
+    names = engines + ([e + "+b" for e in engines] if args.batch else [])
+
+    print("{:40s}".format("File") +
+          "".join("{:>10s}".format(name) for name in names) +
+          "".join("{:>10s}".format("x" + name) for name in names[1:]) +
+          "{:>6s}".format("same"))
+    for fn in files:
+        total_times = [0.0 for _ in names]
+        total_paths = [0 for _ in names]
+        same = True
+
+        with common.RoutingTableFile(fn) as f:
+            chips = [tuple(c) for c in args.chip] if args.chip else list(f)
+            for chip in chips:
+                times, paths, _, chip_same = time_engines(
+                    f.get_table(chip), engines, args.batch)
+                total_times = [a + b for a, b in zip(total_times, times)]
+                total_paths = [a + b for a, b in zip(total_paths, paths)]
+                same &= chip_same
+
+        print("{:40s}".format(fn) +
+              "".join("{:9.2f}s".format(t) for t in total_times) +
+              "".join("{:9.1f}x".format(total_times[0] / t)
+                      for t in total_times[1:]) +
+              "{:>6s}".format("yes" if same else "NO"))
+
+        if args.stats:
+            print("{:>40s}".format("paths enumerated") +
+                  "".join("{:10d}".format(p) for p in total_paths))
@@ -0,0 +1,116 @@
+"""Time Ordered Covering on the host, with the implementation in `rig` and
+with `fast_oc`, checking that they produce the same minimised tables.
+
+Usage: `python benchmark_oc.py [files ...] [--output host_timing.csv]`
+(defaults to every file in `uncompressed`).
+
+The times are written in the same layout as `timing.csv` (which records the
+on-chip implementation, see `run_spinnaker_timing.sh`), so may be summarised
+with `get_timing_results.py`: the model is named after the engine (e.g.,
+`oc_rig_centroid_12_12_hilbert`), the load time is the time taken to read
+the tables into the form the engine uses and the run time is the time taken
+to minimise every table, one after another. As in `timing.csv` a target
+length of 0 means that the tables are minimised as far as possible.
+"""
+import argparse
+from collections import OrderedDict
+import common
+import fast_oc
+import glob
+import os
+from rig.routing_table.ordered_covering import ordered_covering
+from six import iteritems
+import time
+
+
+def _minimise_with_rig(entries, target_length):
+    table, _ = ordered_covering(entries, target_length, no_raise=True)
+    return common.RoutingTable.from_entries(table)
+
+
+ENGINES = OrderedDict((
+    ("rig", (common.RoutingTable.to_entries, _minimise_with_rig)),
+    ("fast", (lambda table: table,
+              lambda table, target_length: fast_oc.ordered_covering(
+                  table, target_length, no_raise=True))),
+))
+"""For each engine, functions to convert a :py:class:`common.RoutingTable`
+into the form it minimises and to minimise a table to a target length (or
+None).
+"""
+
+
+def time_engine(fn, engine, target_length, chips=None):
+    """Minimise the tables in a file with an engine.
+
+    Returns
+    -------
+    (float, float, {(x, y): :py:class:`common.RoutingTable`, ...})
+        The load time, run time and minimised tables.
+    """
+    load, minimise = ENGINES[engine]
+
+    t = time.time()
+    with common.RoutingTableFile(fn) as f:
+        tables = [(chip, load(f.get_table(chip)))
+                  for chip in (chips or list(f))]
+    load_time = time.time() - t
+
+    minimised = dict()
+    t = time.time()
+    for chip, table in tables:
+        minimised[chip] = minimise(table, target_length or None)
+    run_time = time.time() - t
+
+    return load_time, run_time, minimised
+
+
+if __name__ == "__main__":
+    # Parse the arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--output", "-o", default="host_timing.csv",
+                        help="file to write the times to")
+    parser.add_argument("--chip", nargs=2, type=int, action="append",
+                        metavar=("X", "Y"),
+                        help="only minimise the table for this chip")
+    parser.add_argument("--engine", choices=list(ENGINES), action="append",
+                        help="engine to time (default: all of them)")
+    parser.add_argument("--target-length", type=int, action="append",
+                        help="target length (default: 0, i.e., none)")
+    parser.add_argument("--repeats", "-n", type=int, default=1,
+                        help="number of times to time each engine")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob("uncompressed/*.bin"))
+    engines = args.engine or list(ENGINES)
+    chips = [tuple(c) for c in args.chip] if args.chip else None
+
+    with open(args.output, "w") as out:
+        out.write("# Model, Target Length, Load time / s, Run time / s\n")
+
+        for fn in files:
+            model = os.path.splitext(os.path.basename(fn))[0]
+            for target_length in args.target_length or [0]:
+                results = list()
+                for engine in engines:
+                    for _ in range(args.repeats):
+                        load_time, run_time, minimised = time_engine(
+                            fn, engine, target_length, chips)
+                        out.write("oc_{}_{} {} {:.3f} {:.3f}\n".format(
+                            engine, model, target_length, load_time,
+                            run_time))
+                        out.flush()
+
+                    results.append({
+                        chip: list(zip(table.keys.tolist(),
+                                       table.masks.tolist(),
+                                       table.routes.tolist()))
+                        for chip, table in iteritems(minimised)
+                    })
+                    print("{:40s}{:>6d}{:>8s}{:9.2f}s{:9.2f}s".format(
+                        fn, target_length, engine, load_time, run_time))
+
+                if any(r != results[0] for r in results[1:]):
+                    print("{:40s} engines produced different tables".format(
+                        fn))
@@ -0,0 +1,66 @@
+"""Compare the memory used by, and the time taken to group by route, routing
+tables held as lists of `RoutingTableEntry` and as `common.RoutingTable`.
+
+Usage: `python benchmark_tables.py [files ...]` (defaults to every file in
+`uncompressed`).
+"""
+import argparse
+from collections import defaultdict
+import common
+import glob
+from six import itervalues
+import time
+import tracemalloc
+
+
+def load(reader, fn):
+    """Load a file and return the tables and the memory allocated in doing
+    so.
+    """
+    tracemalloc.start()
+    with open(fn, "rb") as f:
+        tables = reader(f)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tables, size
+
+
+def group_entries(tables):
+    """Group every table of entries by route, as in the minimisers."""
+    for table in itervalues(tables):
+        subtables = defaultdict(list)
+        for entry in table:
+            subtables[entry.route].append((entry.key, entry.mask))
+
+
+def group_columns(tables):
+    """Group every `RoutingTable` by route."""
+    for table in itervalues(tables):
+        table.group_by_route()
+
+
+if __name__ == "__main__":
+    # Parse the arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob("uncompressed/*.bin"))
+
+    print("{:40s}{:>12s}{:>12s}{:>10s}{:>10s}".format(
+        "File", "entries/MB", "columns/MB", "entries", "columns"))
+    for fn in files:
+        entries, entries_size = load(common.read_routing_tables, fn)
+        columns, columns_size = load(common.read_routing_table_columns, fn)
+
+        t = time.time()
+        group_entries(entries)
+        entries_time = time.time() - t
+
+        t = time.time()
+        group_columns(columns)
+        columns_time = time.time() - t
+
+        print("{:40s}{:12.1f}{:12.1f}{:9.3f}s{:9.3f}s".format(
+            fn, entries_size / 2.0**20, columns_size / 2.0**20,
+            entries_time, columns_time))
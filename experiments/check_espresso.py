@@ -0,0 +1,140 @@
+"""Check the pipes to and from Espresso and the cache of its results, using
+`espresso_stub.py` in place of Espresso (so no Espresso executable is
+required).
+
+Usage: `python check_espresso.py [--cubes N] [--table FILE --chip X Y]`.
+"""
+import argparse
+import common
+import espresso
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import verify
+
+STUB = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                    "espresso_stub.py")
+
+
+def make_pla(n_cubes):
+    """Get the lines of a PLA with `n_cubes` distinct cubes."""
+    yield ".i 32\n.o 1\n".encode("ascii")
+    for i in range(n_cubes):
+        yield espresso.key_mask_to_espresso(i, 0xffffffff) + b" 1\n"
+    yield b".e\n"
+
+
+def check_stream(n_cubes):
+    """Every cube is streamed through Espresso and back."""
+    cubes = list(espresso.iter_espresso(make_pla(n_cubes)))
+    assert len(cubes) == n_cubes, len(cubes)
+    assert cubes[-1] == (espresso.key_mask_to_espresso(n_cubes - 1,
+                                                       0xffffffff), b"1")
+
+
+def check_early_close(n_cubes):
+    """Closing the generator before every cube is read does not hang or
+    raise.
+    """
+    cubes = espresso.iter_espresso(make_pla(n_cubes))
+    next(cubes)
+    cubes.close()
+
+
+def check_error(n_cubes):
+    """A non-zero exit status raises CalledProcessError."""
+    os.environ["ESPRESSO_STUB_EXIT"] = "3"
+    try:
+        list(espresso.iter_espresso(make_pla(n_cubes)))
+    except subprocess.CalledProcessError as e:
+        assert e.returncode == 3, e.returncode
+    else:
+        raise AssertionError("CalledProcessError not raised")
+    finally:
+        del os.environ["ESPRESSO_STUB_EXIT"]
+
+
+def check_cache(n_cubes):
+    """Results are the same with and without the cache, are read from the
+    cache the second time and are not reused for a different executable
+    with the same name.
+    """
+    pla = list(make_pla(n_cubes))
+    directory = tempfile.mkdtemp()
+    try:
+        cache = espresso.EspressoCache(os.path.join(directory, "cache"))
+        uncached, cached = espresso.run_espresso(pla)
+        assert not cached
+
+        for expected_hits in (0, 1):
+            cubes, cached = espresso.run_espresso(pla, cache)
+            assert cubes == uncached
+            assert cached == bool(expected_hits)
+            assert cache.hits == expected_hits, cache.hits
+
+        # Replace the executable with a different one of the same name
+        executable = os.path.join(directory, os.path.basename(STUB))
+        shutil.copy(STUB, executable)
+        espresso.ESPRESSO = executable
+        try:
+            cubes, cached = espresso.run_espresso(pla, cache)
+            assert not cached
+
+            with open(executable, "a") as f:
+                f.write("# A different executable\n")
+            cubes, cached = espresso.run_espresso(pla, cache)
+            assert not cached, "stale result for a different executable"
+            assert cubes == uncached
+        finally:
+            espresso.ESPRESSO = STUB
+    finally:
+        shutil.rmtree(directory)
+
+
+def check_minimise(table):
+    """Tables minimised through Espresso, with and without the off-set and as
+    a whole, route packets as the original table did.
+    """
+    for whole_table in (False, True):
+        for provide_offset in (True, False):
+            new_table = espresso.minimise(table, whole_table, provide_offset)
+            assert verify.find_counterexample(table, new_table) is None, \
+                "whole_table={}, provide_offset={}".format(whole_table,
+                                                           provide_offset)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cubes", "-n", type=int, default=200000,
+                        help="number of cubes in the PLAs (default: "
+                             "%(default)s)")
+    parser.add_argument("--table",
+                        default="uncompressed/centroid_12_12_xyp.bin",
+                        help="routing tables to minimise with the stub "
+                             "(default: %(default)s)")
+    parser.add_argument("--chip", type=int, nargs=2, default=(0, 0),
+                        metavar=("X", "Y"),
+                        help="chip whose table is minimised (default: 0 0)")
+    args = parser.parse_args()
+
+    with common.RoutingTableFile(args.table) as f:
+        table = f.get_table(tuple(args.chip))
+
+    espresso.ESPRESSO = STUB
+    failed = False
+    for check, arg in ((check_stream, args.cubes),
+                       (check_early_close, args.cubes),
+                       (check_error, args.cubes),
+                       (check_cache, args.cubes),
+                       (check_minimise, table)):
+        try:
+            check(arg)
+            print("{}: ok".format(check.__name__))
+        except AssertionError as e:
+            print("{}: FAILED {}".format(check.__name__, e))
+            failed = True
+
+    if failed:
+        sys.exit(1)
@@ -4,11 +4,71 @@ Each file may contain multiple routing tables. The 2-bytes of a routing table
 are the x and y co-ordinate the table relates to, the following short is the
 length of the table. Following the header there are 4 words for each entry:
 key, mask, source and route.
+
+Version 2 files lift the limits on chip co-ordinates and table lengths and
+may be indexed without scanning the file. They are formatted as::
+
+    magic ("\\x89RTB") : 4 bytes
+    version (2) : 2 bytes
+    padding : 2 bytes
+    tables : the entries (4 words each) of each table, optionally compressed
+    index : 32 bytes per table
+        x : 4 bytes
+        y : 4 bytes
+        offset of the table data : 8 bytes
+        n_entries : 4 bytes
+        length of the table data : 4 bytes
+        CRC32 of the (uncompressed) entries : 4 bytes
+        compression (0 = none, 1 = zlib, 2 = lzma) : 1 byte
+        padding : 3 bytes
+    offset of the index : 8 bytes
+    n_tables : 4 bytes
+    magic ("\\x89RTB") : 4 bytes
+
+Readers detect the version of a file automatically.
 """
+from collections import namedtuple, OrderedDict
+import mmap
+import numbers
 import numpy as np
+import os
 from rig.routing_table import RoutingTableEntry, Routes
 from six import iteritems
 import struct
+import zlib
+
+
+# Layout of a single routing table entry within a file
+ENTRY_DTYPE = np.dtype([("key", "<u4"), ("mask", "<u4"),
+                        ("source", "<u4"), ("route", "<u4")])
+
+# Layout of version 2 files
+V2_MAGIC = b"\x89RTB"
+V2_HEADER = struct.Struct("<4sHxx")
+V2_INDEX_ENTRY = struct.Struct("<2IQ3IB3x")
+V2_FOOTER = struct.Struct("<QI4s")
+
+# Compression schemes which may be applied to tables in version 2 files
+COMPRESSION = {None: 0, "zlib": 1, "lzma": 2}
+
+
+class TableLocation(namedtuple("TableLocation",
+                               "offset, n_entries, length, crc, compression")):
+    """Location of a table within a file.
+
+    Parameters
+    ----------
+    offset : int
+        Offset of the data for the table.
+    n_entries : int
+        Number of entries in the table.
+    length : int
+        Number of bytes of data (after compression) for the table.
+    crc : int or None
+        CRC32 of the entries of the table (None for version 1 files).
+    compression : int
+        Compression applied to the table data (see `COMPRESSION`).
+    """
 
 
 def dump_memory_profile(fp, profile):
@@ -28,89 +88,712 @@ def dump_memory_profile(fp, profile):
 
 
 def read_memory_profile(fp):
-    """Read memory profiles from a file."""
+    """Read memory profiles from a file.
+
+    Where possible the file is memory-mapped and each profile is a read-only
+    view onto the file, otherwise each profile views the data read from the
+    file.
+    """
     profile = dict()
 
-    data = fp.read()
+    data = _map_file(fp)
     offset = 0
     while offset < len(data):
         x, y, n_entries = struct.unpack_from("<2B2xI", data, offset)
         offset += 8
 
-        # Read the entries into a Numpy array
-        profile[(x, y)] = np.ndarray(
-            shape=n_entries,
-            dtype=np.uint32,
-            buffer=data[offset:offset + n_entries*4]
-        )
+        # View the entries as a Numpy array
+        profile[(x, y)] = np.frombuffer(data, dtype=np.uint32,
+                                        count=n_entries, offset=offset)
         offset += n_entries * 4
 
     return profile
 
 
-def dump_routing_tables(fp, tables):
-    """Dump routing tables to file."""
-    for (x, y), entries in iteritems(tables):
-        # Write the header
-        fp.write(struct.pack("<2BH", x, y, len(entries)))
+def _map_file(fp):
+    """Get the contents of a file, memory-mapping it where possible."""
+    try:
+        fileno = fp.fileno()
+    except (AttributeError, IOError, OSError, ValueError):
+        return fp.read()
+
+    # Empty files cannot be mapped
+    if os.fstat(fileno).st_size == 0:
+        return b""
+    return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+
+def iter_memory_profile(fp):
+    """Iterate over the memory profiles in a file, reading one profile at a
+    time.
+
+    Yields
+    ------
+    ((x, y), np.ndarray)
+    """
+    header = fp.read(8)
+    while len(header) == 8:
+        x, y, n_entries = struct.unpack("<2B2xI", header)
+        yield (x, y), np.frombuffer(fp.read(n_entries * 4), dtype=np.uint32)
+        header = fp.read(8)
+
+
+def dump_routing_tables(fp, tables, version=1, compression=None):
+    """Dump routing tables to file.
+
+    Tables may be given as lists of
+    :py:class:`~rig.routing_table.RoutingTableEntry`, as structured arrays
+    (see `ENTRY_DTYPE`) or as :py:class:`.RoutingTable` objects.
+
+    Parameters
+    ----------
+    version : int
+        Version of the file format to write.
+    compression : None or "zlib" or "lzma"
+        Compression to apply to each table (version 2 only).
+    """
+    with RoutingTableWriter(fp, version, compression) as writer:
+        for chip, table in iteritems(tables):
+            writer.append(chip, table)
+
+
+class RoutingTableWriter(object):
+    """Write routing tables to a file one chip at a time.
+
+    For example::
+
+        with RoutingTableWriter("out.bin") as writer:
+            for chip, table in iter_routing_tables(fp):
+                writer.append(chip, minimise(table))
+
+    Only the index of a version 2 file is retained until the writer is
+    closed.
+    """
+
+    def __init__(self, fp, version=1, compression=None):
+        """
+        Parameters
+        ----------
+        fp : file or str
+            File (opened for binary writing) or name of a file to create. If a
+            name is given the file is closed when the writer is closed.
+        version : int
+            Version of the file format to write.
+        compression : None or "zlib" or "lzma"
+            Compression to apply to each table (version 2 only).
+        """
+        if version not in (1, 2):
+            raise ValueError("Unknown file version {}".format(version))
+        if version == 1 and compression is not None:
+            raise ValueError("Version 1 files cannot be compressed")
+
+        self._owns_fp = not hasattr(fp, "write")
+        self._fp = open(fp, "wb+") if self._owns_fp else fp
+        self.version = version
+        self.compression = compression
+
+        # Version 2 files require the offset of each table to be recorded
+        self._index = list()
+        self._offset = 0
+        if version == 2:
+            self._write(V2_HEADER.pack(V2_MAGIC, 2))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _write(self, data):
+        self._fp.write(data)
+        self._offset += len(data)
+
+    def append(self, chip, table):
+        """Write the routing table for a chip.
+
+        Tables may be given as lists of
+        :py:class:`~rig.routing_table.RoutingTableEntry`, as structured arrays
+        or as :py:class:`.RoutingTable` objects.
+        """
+        x, y = chip
+        table = _as_array(table)
+
+        if self.version == 1:
+            # Pack the header and entries into a single buffer and write it
+            data = bytearray(4 + len(table) * ENTRY_DTYPE.itemsize)
+            struct.pack_into("<2BH", data, 0, x, y, len(table))
+            np.frombuffer(data, dtype=ENTRY_DTYPE, offset=4)[:] = table
+            self._write(data)
+        else:
+            data, location = _pack_table_v2(table, self._offset,
+                                            self.compression)
+            self._write(data)
+            self._index.append(((x, y), location))
+
+    def close(self):
+        """Finish writing the file."""
+        if self._fp is None:
+            return
+
+        if self.version == 2:
+            self._write(_pack_index_v2(self._index, self._offset))
+
+        if self._owns_fp:
+            self._fp.close()
+        self._fp = None
 
-        # Write the entries
-        for entry in entries:
-            route_word = 0x0
-            for route in entry.route:
-                route_word |= 1 << route
 
-            source_word = 0x0
-            for source in entry.sources:
-                if source is not None:
-                    source_word |= 1 << source
+def _as_array(table):
+    """Get a table given in any form as a structured array of entries."""
+    if isinstance(table, RoutingTable):
+        return table.to_array()
+    elif isinstance(table, np.ndarray):
+        return table
+    else:
+        return array_from_entries(table)
 
-            fp.write(struct.pack("<4I", entry.key, entry.mask,
-                                 source_word, route_word))
+
+def _pack_table_v2(table, offset, compression):
+    """Get the data for a table in a version 2 file and its location."""
+    data = table.astype(ENTRY_DTYPE, copy=False).tobytes()
+    crc = zlib.crc32(data) & 0xffffffff
+
+    compression = COMPRESSION[compression]
+    if compression == COMPRESSION["zlib"]:
+        data = zlib.compress(data)
+    elif compression == COMPRESSION["lzma"]:
+        import lzma
+        data = lzma.compress(data)
+
+    return data, TableLocation(offset, len(table), len(data), crc, compression)
+
+
+def _pack_index_v2(index, offset):
+    """Pack the index and footer of a version 2 file.
+
+    Parameters
+    ----------
+    index : [((x, y), TableLocation), ...]
+    offset : int
+        Offset at which the index will be written.
+    """
+    data = b"".join(
+        V2_INDEX_ENTRY.pack(x, y, location.offset, location.n_entries,
+                            location.length, location.crc,
+                            location.compression)
+        for (x, y), location in index
+    )
+    return data + V2_FOOTER.pack(offset, len(index), V2_MAGIC)
 
 
 def read_routing_tables(fp):
     """Read routing tables from a file."""
-    tables = dict()
+    return {chip: entries_from_array(table) for chip, table in
+            iteritems(read_routing_table_arrays(fp))}
+
+
+def read_routing_table_arrays(fp):
+    """Read routing tables from a file as structured Numpy arrays.
 
+    Each table is a read-only view (with fields "key", "mask", "source" and
+    "route", see `ENTRY_DTYPE`) onto the data read from the file, no entries
+    are copied or converted into :py:class:`~rig.routing_table.RoutingTableEntry`
+    objects (unless the table is compressed).
+
+    Returns
+    -------
+    {(x, y): np.ndarray, ...}
+    """
     data = fp.read()
-    offset = 0
-    while offset < len(data):
-        # Read the header
-        x, y, n_entries = struct.unpack_from("<2BH", data, offset)
-        offset += 4
+    return {chip: get_table_array(data, location) for chip, location in
+            iteritems(index_routing_tables(data))}
+
+
+def get_table_array(data, location):
+    """Get a table from a buffer as a structured array of entries.
+
+    Uncompressed tables are read-only views onto the buffer.
+
+    Parameters
+    ----------
+    data : buffer
+    location : TableLocation
+        Location of the table as given by `index_routing_tables`.
+    """
+    if location.compression == COMPRESSION[None]:
+        table_data = memoryview(data)[location.offset:
+                                      location.offset + location.length]
+    else:
+        table_data = bytes(data[location.offset:
+                                location.offset + location.length])
+        if location.compression == COMPRESSION["zlib"]:
+            table_data = zlib.decompress(table_data)
+        elif location.compression == COMPRESSION["lzma"]:
+            import lzma
+            table_data = lzma.decompress(table_data)
+        else:
+            raise ValueError("Unknown compression {}".format(
+                location.compression))
+
+    if (location.crc is not None and
+            zlib.crc32(table_data) & 0xffffffff != location.crc):
+        raise ValueError("CRC mismatch in table at offset {}".format(
+            location.offset))
+
+    return np.frombuffer(table_data, dtype=ENTRY_DTYPE,
+                         count=location.n_entries)
+
+
+def iter_routing_tables(fp):
+    """Iterate over the routing tables in a file, reading one table at a time.
+
+    Yields
+    ------
+    ((x, y), [RoutingTableEntry, ...])
+    """
+    for chip, table in iter_routing_table_arrays(fp):
+        yield chip, entries_from_array(table)
+
+
+def iter_routing_table_columns(fp):
+    """Iterate over the routing tables in a file as
+    :py:class:`.RoutingTable` objects, reading one table at a time.
+    """
+    for chip, table in iter_routing_table_arrays(fp):
+        yield chip, RoutingTable.from_array(table)
+
+
+def iter_routing_table_arrays(fp):
+    """Iterate over the routing tables in a file as structured arrays,
+    reading one table at a time.
+
+    Version 2 files must be seekable.
+    """
+    if _is_v2_file(fp):
+        # Read the index and then each table in turn
+        for chip, location in iteritems(_read_index_v2(fp)):
+            fp.seek(location.offset)
+            data = fp.read(location.length)
+            yield chip, get_table_array(data, location._replace(offset=0))
+    else:
+        header = fp.read(4)
+        while len(header) == 4:
+            x, y, n_entries = struct.unpack("<2BH", header)
+            data = fp.read(n_entries * ENTRY_DTYPE.itemsize)
+            yield (x, y), np.frombuffer(data, dtype=ENTRY_DTYPE)
+            header = fp.read(4)
+
+
+def entries_from_array(table):
+    """Convert a structured array of entries into a list of
+    :py:class:`~rig.routing_table.RoutingTableEntry`.
+    """
+    return _entries_from_columns(table["key"], table["mask"],
+                                 table["source"], table["route"])
+
+
+def _entries_from_columns(keys, masks, sources, routes):
+    """Build a list of :py:class:`~rig.routing_table.RoutingTableEntry` from
+    arrays of keys, masks, source words and route words.
+    """
+    # Many entries share route and source words, so only decode each word
+    # once.
+    decoded = dict()
+
+    def get_routes(word):
+        if word not in decoded:
+            decoded[word] = tuple(routes_from_word(word))
+        return decoded[word]
+
+    return [
+        RoutingTableEntry(get_routes(route), key, mask, get_routes(source))
+        for key, mask, source, route in zip(keys.tolist(), masks.tolist(),
+                                            sources.tolist(), routes.tolist())
+    ]
 
-        # Prepare the entries
-        entries = [None for _ in range(n_entries)]
 
-        # Read the entries
-        for i in range(n_entries):
-            key, mask, source_word, route_word = \
-                struct.unpack_from("<4I", data, offset)
-            offset += 16
+def routes_from_word(word):
+    """Get the set of :py:class:`~rig.routing_table.Routes` indicated by a
+    route (or source) word.
+    """
+    return {r for r in Routes if word & (1 << r)}
+
+
+def route_word(routes):
+    """Get the route (or source) word for a set of
+    :py:class:`~rig.routing_table.Routes`, `None` is ignored.
+    """
+    word = 0x0
+    for route in routes:
+        if route is not None:
+            word |= 1 << route
+    return word
+
+
+def array_from_entries(entries):
+    """Convert a list of :py:class:`~rig.routing_table.RoutingTableEntry` into
+    a structured array of entries.
+    """
+    rows = list()
+    for entry in entries:
+        route_word = 0x0
+        for route in entry.route:
+            route_word |= 1 << route
+
+        source_word = 0x0
+        for source in entry.sources:
+            if source is not None:
+                source_word |= 1 << source
+
+        rows.append((entry.key, entry.mask, source_word, route_word))
+
+    return np.array(rows, dtype=ENTRY_DTYPE).reshape(len(rows))
+
+
+class RoutingTable(object):
+    """A routing table stored as parallel arrays of 32-bit words.
+
+    Routes and sources are stored as bit-fields (as in the file format) rather
+    than as sets of :py:class:`~rig.routing_table.Routes`, so tables may be
+    grouped by route without hashing any sets.
+
+    Indexing with an integer or iterating over the table yields
+    :py:class:`~rig.routing_table.RoutingTableEntry` objects, indexing with a
+    slice or an array yields a new :py:class:`.RoutingTable`. Use
+    :py:meth:`.to_entries` before passing a table to a function which will
+    iterate over it repeatedly.
+    """
+    __slots__ = ("keys", "masks", "routes", "sources")
+
+    def __init__(self, keys=(), masks=(), routes=(), sources=None):
+        """
+        Parameters
+        ----------
+        keys : array_like
+        masks : array_like
+        routes : array_like
+            Route words of the entries.
+        sources : array_like or None
+            Source words of the entries, if None then the sources are unknown.
+        """
+        self.keys = np.asarray(keys, dtype=np.uint32)
+        self.masks = np.asarray(masks, dtype=np.uint32)
+        self.routes = np.asarray(routes, dtype=np.uint32)
+        if sources is None:
+            self.sources = np.zeros(len(self.keys), dtype=np.uint32)
+        else:
+            self.sources = np.asarray(sources, dtype=np.uint32)
+
+    @classmethod
+    def from_array(cls, table):
+        """Create a table which views the columns of a structured array of
+        entries (see `ENTRY_DTYPE`).
+        """
+        return cls(table["key"], table["mask"], table["route"],
+                   table["source"])
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Create a table from a list of
+        :py:class:`~rig.routing_table.RoutingTableEntry`.
+        """
+        return cls.from_array(array_from_entries(entries))
+
+    @classmethod
+    def from_table(cls, table):
+        """Get a :py:class:`.RoutingTable` for a table given as a
+        :py:class:`.RoutingTable` (which is returned unchanged), a structured
+        array or a list of entries.
+        """
+        if isinstance(table, cls):
+            return table
+        elif isinstance(table, np.ndarray):
+            return cls.from_array(table)
+        else:
+            return cls.from_entries(table)
+
+    def to_array(self):
+        """Get the table as a structured array of entries."""
+        table = np.empty(len(self), dtype=ENTRY_DTYPE)
+        table["key"] = self.keys
+        table["mask"] = self.masks
+        table["source"] = self.sources
+        table["route"] = self.routes
+        return table
+
+    def to_entries(self):
+        """Get the table as a list of
+        :py:class:`~rig.routing_table.RoutingTableEntry`.
+        """
+        return _entries_from_columns(self.keys, self.masks,
+                                     self.sources, self.routes)
 
-            route = {r for r in Routes if route_word & (1 << r)}
-            source = {s for s in Routes if source_word & (1 << s)}
-            entries[i] = RoutingTableEntry(route, key, mask, source)
+    @property
+    def nbytes(self):
+        """Number of bytes used to store the table."""
+        return (self.keys.nbytes + self.masks.nbytes +
+                self.routes.nbytes + self.sources.nbytes)
 
-        # Store the table
-        tables[(x, y)] = entries
+    def __len__(self):
+        return len(self.keys)
 
-    return tables
+    def __iter__(self):
+        return iter(self.to_entries())
+
+    def __getitem__(self, index):
+        if isinstance(index, numbers.Integral):
+            return RoutingTableEntry(
+                routes_from_word(int(self.routes[index])),
+                int(self.keys[index]), int(self.masks[index]),
+                routes_from_word(int(self.sources[index]))
+            )
+        else:
+            return RoutingTable(self.keys[index], self.masks[index],
+                                self.routes[index], self.sources[index])
+
+    def __repr__(self):
+        return "<RoutingTable with {} entries>".format(len(self))
+
+    def group_by_route(self):
+        """Group the entries of the table by route.
+
+        Returns
+        -------
+        order : np.ndarray
+            Indices of the entries arranged such that entries which share a
+            route are contiguous (and retain their order within the table).
+        routes : [int, ...]
+            Route word of each group, in order of first appearance.
+        bounds : [int, ...]
+            Group `i` consists of the entries `order[bounds[i]:bounds[i+1]]`.
+        """
+        # Sort the entries by route and find where each route begins
+        order = np.argsort(self.routes, kind="stable")
+        sorted_routes = self.routes[order]
+        is_start = np.empty(len(order), dtype=bool)
+        is_start[:1] = True
+        np.not_equal(sorted_routes[1:], sorted_routes[:-1], out=is_start[1:])
+        starts = np.flatnonzero(is_start)
+
+        # Rearrange the groups into order of first appearance
+        rank = np.empty(len(starts), dtype=np.intp)
+        rank[np.argsort(order[starts])] = np.arange(len(starts))
+        order = order[np.argsort(rank[np.cumsum(is_start) - 1],
+                                 kind="stable")]
+
+        counts = np.diff(np.append(starts, len(order)))[np.argsort(rank)]
+        bounds = [0] + np.cumsum(counts).tolist()
+        return order, self.routes[order[bounds[:-1]]].tolist(), bounds
+
+
+def read_routing_table_columns(fp):
+    """Read routing tables from a file as :py:class:`.RoutingTable` objects
+    (which view the data read from the file).
+    """
+    return {chip: RoutingTable.from_array(table) for chip, table in
+            iteritems(read_routing_table_arrays(fp))}
 
 
 def read_table_lengths(fp):
     """Read routing table lengths from a file."""
+    # Version 2 files store the lengths in the index
+    if _is_v2_file(fp):
+        return {chip: location.n_entries for chip, location in
+                iteritems(_read_index_v2(fp))}
+
     lengths = dict()
 
-    data = fp.read()
+    # Read each header in turn, skipping over the entries
+    header = fp.read(4)
+    while len(header) == 4:
+        x, y, n_entries = struct.unpack("<2BH", header)
+        lengths[(x, y)] = n_entries
+
+        fp.seek(n_entries * ENTRY_DTYPE.itemsize, os.SEEK_CUR)
+        header = fp.read(4)
+
+    return lengths
+
+
+def _is_v2(data):
+    """Determine whether a buffer holds a version 2 file."""
+    return (len(data) >= V2_HEADER.size + V2_FOOTER.size and
+            bytes(data[:len(V2_MAGIC)]) == V2_MAGIC and
+            bytes(data[-len(V2_MAGIC):]) == V2_MAGIC)
+
+
+def _is_v2_file(fp):
+    """Determine whether a file holds a version 2 file, the file is left
+    positioned at its start.
+
+    Files which cannot be seeked (e.g., pipes) are assumed to be version 1.
+    """
+    if hasattr(fp, "seekable") and not fp.seekable():
+        return False
+
+    fp.seek(0, os.SEEK_END)
+    size = fp.tell()
+
+    is_v2 = False
+    if size >= V2_HEADER.size + V2_FOOTER.size:
+        fp.seek(0)
+        start = fp.read(len(V2_MAGIC))
+        fp.seek(-len(V2_MAGIC), os.SEEK_END)
+        end = fp.read(len(V2_MAGIC))
+        is_v2 = start == V2_MAGIC and end == V2_MAGIC
+
+    fp.seek(0)
+    return is_v2
+
+
+def _read_index_v2(fp):
+    """Read the index from a version 2 file."""
+    fp.seek(-V2_FOOTER.size, os.SEEK_END)
+    offset, n_tables, _ = V2_FOOTER.unpack(fp.read(V2_FOOTER.size))
+    fp.seek(offset)
+    return _unpack_index_v2(fp.read(n_tables * V2_INDEX_ENTRY.size), 0,
+                            n_tables)
+
+
+def _unpack_index_v2(data, offset, n_tables):
+    """Unpack the index of a version 2 file."""
+    index = OrderedDict()
+    for i in range(n_tables):
+        x, y, table_offset, n_entries, length, crc, compression = \
+            V2_INDEX_ENTRY.unpack_from(data, offset + i*V2_INDEX_ENTRY.size)
+        index[(x, y)] = TableLocation(table_offset, n_entries, length, crc,
+                                      compression)
+    return index
+
+
+def index_routing_tables(data):
+    """Build an index of the routing tables held in a buffer.
+
+    Version 1 files are indexed by scanning the header of each table, the
+    index of version 2 files is read from the end of the file.
+
+    Returns
+    -------
+    OrderedDict
+        Mapping from chip co-ordinates to the :py:class:`.TableLocation` of
+        the table for that chip (in the order in which they appear in the
+        buffer).
+    """
+    if _is_v2(data):
+        offset, n_tables, _ = V2_FOOTER.unpack_from(
+            data, len(data) - V2_FOOTER.size)
+        return _unpack_index_v2(data, offset, n_tables)
+
+    index = OrderedDict()
+
     offset = 0
     while offset < len(data):
-        # Read the header
         x, y, n_entries = struct.unpack_from("<2BH", data, offset)
-        offset += 4 + n_entries*16
+        offset += 4
 
-        # Store the length
-        lengths[(x, y)] = n_entries
+        length = n_entries * ENTRY_DTYPE.itemsize
+        index[(x, y)] = TableLocation(offset, n_entries, length, None,
+                                      COMPRESSION[None])
+        offset += length
 
-    return lengths
+    return index
+
+
+class RoutingTableFile(object):
+    """Random access to the routing tables stored in a file.
+
+    The file is memory-mapped and indexed by a single scan of the table
+    headers (or by reading the index of version 2 files); the entries of a
+    table are only read when the table for that chip is accessed. For
+    example::
+
+        with RoutingTableFile("uncompressed/gaussian_12_12_xyp.bin") as f:
+            table = f[(5, 7)]  # [RoutingTableEntry, ...]
+
+    Objects may be pickled (only the filename and index are stored) to hand
+    them to worker processes, and :py:meth:`.select` produces an object which
+    only presents a subset of the chips in the file.
+    """
+
+    def __init__(self, filename, index=None):
+        """
+        Parameters
+        ----------
+        filename : str
+            File to open.
+        index : OrderedDict or None
+            Index of the tables to present (as produced by
+            `index_routing_tables`), if None then the file is indexed.
+        """
+        self.filename = filename
+
+        # Map the file into memory
+        with open(filename, "rb") as fp:
+            self._data = _map_file(fp)
+
+        if index is None:
+            index = index_routing_tables(self._data)
+        self.index = index
+
+    def __getstate__(self):
+        return {"filename": self.filename, "index": self.index}
+
+    def __setstate__(self, state):
+        self.__init__(state["filename"], state["index"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the mapping of the file.
+
+        Arrays returned by :py:meth:`.get_array` keep the mapping open until
+        they are no longer referenced.
+        """
+        self._data = b""
+        self.index = OrderedDict()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __contains__(self, chip):
+        return chip in self.index
+
+    def __getitem__(self, chip):
+        """Get the routing table for a chip as a list of
+        :py:class:`~rig.routing_table.RoutingTableEntry`.
+        """
+        return entries_from_array(self.get_array(chip))
+
+    def get_table(self, chip):
+        """Get the routing table for a chip as a :py:class:`.RoutingTable`."""
+        return RoutingTable.from_array(self.get_array(chip))
+
+    def get_array(self, chip):
+        """Get the routing table for a chip as a read-only structured array
+        (see `read_routing_table_arrays`).
+        """
+        return get_table_array(self._data, self.index[chip])
+
+    def items(self):
+        """Iterate over the chips and their routing tables."""
+        for chip in self.index:
+            yield chip, self[chip]
+
+    def lengths(self):
+        """Get a dictionary mapping chips to the length of their tables."""
+        return {chip: location.n_entries for chip, location in
+                iteritems(self.index)}
+
+    def select(self, chips):
+        """Get a new object which presents only the tables for the given
+        chips.
+        """
+        index = OrderedDict((chip, self.index[chip]) for chip in chips)
+        return RoutingTableFile(self.filename, index)
@@ -0,0 +1,22 @@
+"""Convert a routing table file between versions of the file format.
+
+Usage: `python convert_tables.py in out --version 2 --compression zlib`.
+"""
+import argparse
+import common
+
+
+if __name__ == "__main__":
+    # Parse the arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    parser.add_argument("--version", type=int, choices=(1, 2), default=2)
+    parser.add_argument("--compression", choices=("zlib", "lzma"))
+    args = parser.parse_args()
+
+    with open(args.input_file, "rb") as f:
+        tables = common.read_routing_table_arrays(f)
+
+    with open(args.output_file, "wb+") as f:
+        common.dump_routing_tables(f, tables, args.version, args.compression)
@@ -1,13 +1,45 @@
 import argparse
+from collections import namedtuple
 import common
-from collections import defaultdict
-from rig.routing_table import RoutingTableEntry, table_is_subset_of
-from rig.routing_table.remove_default_routes import minimise as rde_minimise
-from six import iteritems
+import csv
+import fast_rde
+import hashlib
+import numpy as np
+import os
 import subprocess
 import sys
 import tempfile
+import threading
 import time
+import two_level
+import verify
+
+
+ESPRESSO = os.environ.get("ESPRESSO", "espresso")
+"""Espresso executable (may be set with the `ESPRESSO` environment
+variable)."""
+
+
+def _espresso_identity():
+    """Identify the Espresso executable by its resolved path, modification
+    time and size, so that a different executable with the same name is not
+    mistaken for it.
+    """
+    path = ESPRESSO
+    if not os.path.dirname(path):
+        # Search the path, as subprocess does
+        for directory in os.environ.get("PATH", os.defpath).split(os.pathsep):
+            candidate = os.path.join(directory, path)
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                path = candidate
+                break
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ESPRESSO  # Not found, Espresso will fail to start
+    return "{}\0{}\0{}".format(os.path.realpath(path), stat.st_mtime,
+                               stat.st_size)
 
 
 def key_mask_to_espresso(key, mask):
@@ -32,128 +64,641 @@ def espresso_to_key_mask(text):
     return key, mask
 
 
-def use_espresso(table, times, provide_offset=True):
-    """Call Espresso with appropriate arguments to minimise a routing table."""
+def encode_pla(keys, masks, outputs=b"1"):
+    """Encode keys and masks as lines of a PLA, in one step.
+
+    Bit 0 of each key and mask is the first character of the line, as in
+    `key_mask_to_espresso`.
+
+    Parameters
+    ----------
+    keys : array_like
+    masks : array_like
+    outputs : bytes or np.ndarray
+        Output part of every line or an (n, n_outputs) array of characters
+        (as uint8) with the output part of each line.
+
+    Returns
+    -------
+    bytes
+        Lines of the form `inputs outputs\\n`, one for each key and mask.
+    """
+    keys = np.asarray(keys, dtype=np.uint32)
+    masks = np.asarray(masks, dtype=np.uint32)
+    if isinstance(outputs, bytes):
+        outputs = np.frombuffer(outputs, dtype=np.uint8)
+    outputs = np.broadcast_to(outputs, (len(keys), outputs.shape[-1]))
+
+    if np.any(keys & ~masks):
+        raise ValueError("Keys may not have bits set outside their masks")
+
+    # Expand the keys and masks into an array of bits
+    bits = np.arange(32, dtype=np.uint32)
+    key_bits = ((keys[:, np.newaxis] >> bits) & 1).astype(np.uint8)
+    mask_bits = ((masks[:, np.newaxis] >> bits) & 1).astype(np.bool_)
+
+    lines = np.empty((len(keys), 32 + 1 + outputs.shape[1] + 1),
+                     dtype=np.uint8)
+    lines[:, :32] = np.where(mask_bits, ord("0") + key_bits, ord("-"))
+    lines[:, 32] = ord(" ")
+    lines[:, 33:-1] = outputs
+    lines[:, -1] = ord("\n")
+    return lines.tobytes()
+
+
+def decode_pla(cubes):
+    """Decode the inputs of cubes produced by Espresso into keys and masks,
+    in one step.
+
+    Parameters
+    ----------
+    cubes : [bytes, ...]
+        Input parts (32 characters) of each cube.
+
+    Returns
+    -------
+    (np.ndarray, np.ndarray)
+        Keys and masks of the cubes.
+    """
+    chars = np.frombuffer(b"".join(cubes), dtype=np.uint8).reshape(-1, 32)
+    weights = np.uint64(1) << np.arange(32, dtype=np.uint64)
+
+    ones = chars == ord("1")
+    cares = ones | (chars == ord("0"))
+    keys = np.dot(ones, weights).astype(np.uint32)
+    masks = np.dot(cares, weights).astype(np.uint32)
+    return keys, masks
+
+
+class EspressoCall(namedtuple("EspressoCall",
+                              "route, on_set, off_set, cubes, time, cached")):
+    """Record of a call to Espresso.
+
+    Parameters
+    ----------
+    route : int or None
+        Route word of the group of entries which was minimised, or None if the
+        whole table was minimised.
+    on_set : int
+        Number of cubes in the on-set.
+    off_set : int
+        Number of cubes in the off-set.
+    cubes : int
+        Number of cubes returned by Espresso.
+    time : float
+        Time taken by the call (including writing the PLA and reading back the
+        result) in seconds.
+    cached : bool
+        Whether the result was read from an :py:class:`EspressoCache` rather
+        than produced by Espresso.
+    """
+
+
+def _write_pla(fp, pla):
+    """Write the lines of a PLA to a pipe and close it."""
+    try:
+        for line in pla:
+            fp.write(line)
+        fp.close()
+    except (IOError, OSError):
+        pass  # Espresso exited early, its return code is checked later
+
+
+def iter_espresso(pla):
+    """Run Espresso on a PLA.
+
+    The PLA is streamed to the standard input of Espresso (from another
+    thread) and the cubes are yielded as they are read from its standard
+    output, so nothing is written to disk.
+
+    Parameters
+    ----------
+    pla : iterable
+        Lines (as bytes, including the line endings) of the PLA.
+
+    Yields
+    ------
+    (bytes, bytes)
+        The input and output parts of each cube in the minimised PLA.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If Espresso exits with a non-zero return code.
+    """
+    process = subprocess.Popen([ESPRESSO], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE)
+    writer = threading.Thread(target=_write_pla, args=(process.stdin, pla))
+    writer.daemon = True
+    writer.start()
+
+    try:
+        for line in process.stdout:
+            if line.strip() and not line.startswith(b"."):
+                inputs, outputs = line.split()
+                yield inputs, outputs
+    finally:
+        writer.join()
+        process.stdout.close()
+        returncode = process.wait()
+
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, ESPRESSO)
+
+
+class EspressoCache(object):
+    """On-disk cache of the results of calls to Espresso.
+
+    Results are stored in files named with the SHA-256 hash of the Espresso
+    executable (its resolved path, modification time and size) and the PLA,
+    so a result is reused whenever the same PLA is minimised by the same
+    Espresso. When the total size of the cached results exceeds `max_size`
+    the least recently used results (by modification time, which is updated
+    whenever a result is used) are removed.
+
+    Writes are atomic, so several processes may share a cache.
+
+    Attributes
+    ----------
+    hits : int
+        Number of results read from the cache.
+    misses : int
+        Number of results which were not in the cache.
+    evictions : int
+        Number of results removed from the cache to limit its size.
+    """
+    def __init__(self, directory, max_size=2**30):
+        """
+        Parameters
+        ----------
+        directory : str
+            Directory in which the results are stored, created if it does not
+            exist.
+        max_size : int
+            Maximum total size of the cached results in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.size = sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        """Get the (mtime, path, size) of every cached result."""
+        entries = list()
+        for shard in os.listdir(self.directory):
+            shard = os.path.join(self.directory, shard)
+            if not os.path.isdir(shard):
+                continue
+
+            for name in os.listdir(shard):
+                path = os.path.join(shard, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # Removed by another process
+                entries.append((stat.st_mtime, path, stat.st_size))
+
+        return entries
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    @staticmethod
+    def key(pla):
+        """Get the key for the result of minimising a PLA (a sequence of
+        bytes-like objects) with the current Espresso executable.
+        """
+        h = hashlib.sha256()
+        h.update(_espresso_identity().encode("utf-8") + b"\0")
+        for chunk in pla:
+            h.update(chunk)
+        return h.hexdigest()
+
+    def get(self, key):
+        """Get the cubes stored for a key.
+
+        Returns
+        -------
+        [(bytes, bytes), ...] or None
+            The input and output parts of each cube, or None if the result is
+            not in the cache.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, None)  # Mark as recently used
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return [tuple(line.split()) for line in data.splitlines()]
+
+    def put(self, key, cubes):
+        """Store the cubes for a key and evict old results if necessary."""
+        path = self._path(key)
+        if not os.path.isdir(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                pass  # Created by another process
+
+        data = b"".join(inputs + b" " + outputs + b"\n"
+                        for inputs, outputs in cubes)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path),
+                                         delete=False) as f:
+            f.write(data)
+        os.rename(f.name, path)
+        self.size += len(data)
+
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used results until the cache is below
+        90% of its maximum size.
+        """
+        entries = sorted(self._entries())
+        self.size = sum(size for _, _, size in entries)
+
+        for _, path, size in entries:
+            if self.size <= 0.9 * self.max_size:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                continue  # Removed by another process
+            self.size -= size
+            self.evictions += 1
+
+
+def run_espresso(pla, cache=None):
+    """Run Espresso on a PLA, using the cached result if there is one.
+
+    Parameters
+    ----------
+    pla : [bytes, ...]
+        Lines or blocks of lines of the PLA.
+    cache : :py:class:`EspressoCache` or None
+
+    Returns
+    -------
+    ([(bytes, bytes), ...], bool)
+        The input and output parts of each cube in the minimised PLA and
+        whether the result came from the cache.
+    """
+    if cache is None:
+        return list(iter_espresso(pla)), False
+
+    key = cache.key(pla)
+    cubes = cache.get(key)
+    if cubes is not None:
+        return cubes, True
+
+    cubes = list(iter_espresso(pla))
+    cache.put(key, cubes)
+    return cubes, False
+
+
+def route_groups(table):
+    """Break a table up into groups of the unique keys and masks with each
+    route, in ascending order of length.
+
+    Returns
+    -------
+    [(route, [(key, mask), ...]), ...]
+    """
+    table = common.RoutingTable.from_table(table)
+
     # Begin by breaking entries up into sets of unique routes
-    route_entries = defaultdict(set)
-    for entry in table:
-        route_entries[frozenset(entry.route)].add((entry.key, entry.mask))
+    order, group_routes, bounds = table.group_by_route()
+    keymasks = list(zip(table.keys[order].tolist(),
+                        table.masks[order].tolist()))
+    route_entries = [
+        (route, list(set(keymasks[start:end]))) for route, start, end in
+        zip(group_routes, bounds[:-1], bounds[1:])
+    ]
 
     # Sort these groups into ascending order of length
-    groups = sorted(route_entries.items(), key=lambda kv: len(kv[1]))
+    return sorted(route_entries, key=lambda kv: len(kv[1]))
+
+
+def reached_target(length, target_length=None, deadline=None):
+    """Determine whether to stop minimising a table which is now `length`
+    entries long, because it is no longer than `target_length` or because the
+    time (as given by `time.time()`) is past `deadline` (either may be None).
+    """
+    return ((target_length is not None and length <= target_length) or
+            (deadline is not None and time.time() >= deadline))
+
+
+def use_espresso(table, times, provide_offset=True, cache=None,
+                 target_length=None, deadline=None):
+    """Call Espresso with appropriate arguments to minimise a routing table.
+
+    An :py:class:`EspressoCall` is appended to `times` for each call to
+    Espresso, results are looked up in and added to `cache` (if it is not
+    None). Once the table `reached_target` the remaining groups are copied
+    rather than minimised.
+    """
+    groups = route_groups(table)
+
+    # Encode every entry once, in the order of the groups, as both on-set and
+    # off-set lines. The off-set for each group is then just the remainder of
+    # the encoded off-set lines.
+    entries = [keymask for _, group in groups for keymask in group]
+    keys = [key for key, _ in entries]
+    masks = [mask for _, mask in entries]
+    on_set = memoryview(encode_pla(keys, masks, b"1"))
+    off_set = memoryview(encode_pla(keys, masks, b"0"))
+    line_length = len(on_set) // len(entries) if entries else 0
 
     # Prepare to create a new table
-    new_table = list()
+    keys, masks, routes = list(), list(), list()
+
+    # Minimise each group individually using all the groups later on in the
+    # table as the off-set.
+    start = 0
+    length = 0  # Length of the minimised groups
+    for route, group in groups:
+        end = start + len(group)
+
+        if reached_target(length + len(entries) - start, target_length,
+                          deadline):
+            keys.append(np.array([key for key, _ in group], dtype=np.uint32))
+            masks.append(np.array([mask for _, mask in group],
+                                  dtype=np.uint32))
+            routes.append(np.full(len(group), route, dtype=np.uint32))
+            start = end
+            continue
+
+        pla = [b".i 32\n.o 1\n.type fr\n" if provide_offset else
+               b".i 32\n.o 1\n.type f\n",
+               on_set[start * line_length:end * line_length],
+               off_set[end * line_length:] if provide_offset else b"",
+               b".e\n"]
+
+        # Perform the minimisation, reading back the result as it is produced
+        t = time.time()
+        cubes, cached = run_espresso(pla, cache)
+        cubes = [inputs for inputs, _ in cubes]
+        group_keys, group_masks = decode_pla(cubes)
+        keys.append(group_keys)
+        masks.append(group_masks)
+        routes.append(np.full(len(cubes), route, dtype=np.uint32))
+
+        times.append(EspressoCall(
+            route, len(group), len(entries) - end if provide_offset else 0,
+            len(cubes), time.time() - t, cached))
+
+        start = end
+        length += len(cubes)
+
+    if not groups:
+        return common.RoutingTable()
+    return common.RoutingTable(np.concatenate(keys), np.concatenate(masks),
+                               np.concatenate(routes))
+
+
+def use_espresso_on_entire_table(table, provide_offset, times=None,
+                                 cache=None):
+    """Call Espresso with appropriate arguments to minimise a routing table.
+
+    An :py:class:`EspressoCall` is appended to `times` (if it is not None),
+    the result is looked up in and added to `cache` (if it is not None).
+    """
+    table = common.RoutingTable.from_table(table)
+
+    # Begin by breaking entries up into sets of unique routes, the outputs of
+    # the function are the index of the route (one-hot, most significant
+    # first).
+    order, routes, bounds = table.group_by_route()
+    route_indices = np.empty(len(table), dtype=np.intp)
+    route_indices[order] = np.repeat(np.arange(len(routes)), np.diff(bounds))
+
+    outputs = np.full((len(table), len(routes)), ord("0"), dtype=np.uint8)
+    outputs[np.arange(len(table)), len(routes) - 1 - route_indices] = ord("1")
+
+    # Minimise the table, using the route indices as the function output
+    pla = [b".i 32\n.o %u\n.type %s\n" % (len(routes),
+                                            b"fr" if provide_offset else b"f"),
+           encode_pla(table.keys, table.masks, outputs),
+           b".e\n"]
+
+    # Perform the minimisation, reading back the result as it is produced
+    t = time.time()
+    cubes, cached = run_espresso(pla, cache)
+    keys, masks = decode_pla([inputs for inputs, _ in cubes])
+    outputs = np.frombuffer(b"".join(outputs for _, outputs in cubes),
+                            dtype=np.uint8).reshape(-1, len(routes)) == ord("1")
+    if np.any(np.sum(outputs, axis=1) != 1):
+        raise ValueError("Espresso returned a cube with more than one route")
+    new_routes = np.asarray(routes, dtype=np.uint32)[
+        len(routes) - 1 - np.argmax(outputs, axis=1)]
+
+    if times is not None:
+        times.append(EspressoCall(None, len(table), 0, len(cubes),
+                                  time.time() - t, cached))
+
+    return common.RoutingTable(keys, masks, new_routes)
+
+
+def use_native(table, times, provide_offset=True, target_length=None,
+               deadline=None):
+    """Minimise a routing table as `use_espresso` does, but with the
+    minimiser in `two_level` rather than Espresso.
+    """
+    groups = route_groups(table)
+    entries = [keymask for _, group in groups for keymask in group]
+    entry_keys = np.array([key for key, _ in entries], dtype=np.uint32)
+    entry_masks = np.array([mask for _, mask in entries], dtype=np.uint32)
 
     # Minimise each group individually using all the groups later on in the
     # table as the off-set.
-    for i, (route, entries) in enumerate(groups):
-        with tempfile.NamedTemporaryFile() as f:
-            if provide_offset:
-                f.write(b".i 32\n.o 1\n.type fr\n")
-            else:
-                f.write(b".i 32\n.o 1\n.type f\n")
-
-            # Write the "on-set"
-            for key, mask in entries:
-                f.write(key_mask_to_espresso(key, mask) + b" 1\n")
-
-            # Write the offset
-            if provide_offset:
-                for _, entries in groups[i+1:]:
-                    for key, mask in entries:
-                        f.write(key_mask_to_espresso(key, mask) + b" 0\n")
-
-            f.write(b".e")
-            f.flush()
-
-            # Perform the minimisation and read back the result
-            with tempfile.TemporaryFile() as g:
-                t = time.time()
-                subprocess.call(["espresso", f.name], stdout=g)
-                times.append(time.time() - t)
-
-                # Read back from g()
-                g.seek(0)
-                for line in g:
-                    if b'.' not in line:
-                        key, mask = espresso_to_key_mask(
-                            line.decode("utf-8").strip().split()[0])
-                        new_table.append(RoutingTableEntry(route, key, mask))
+    keys, masks, routes = list(), list(), list()
+    start = 0
+    length = 0  # Length of the minimised groups
+    for route, group in groups:
+        end = start + len(group)
+
+        if reached_target(length + len(entries) - start, target_length,
+                          deadline):
+            keys.append(entry_keys[start:end])
+            masks.append(entry_masks[start:end])
+            routes.append(np.full(len(group), route, dtype=np.uint32))
+            start = end
+            continue
+
+        t = time.time()
+        if provide_offset:
+            group_keys, group_masks = two_level.minimise(
+                entry_keys[start:end], entry_masks[start:end],
+                entry_keys[end:], entry_masks[end:])
+        else:
+            group_keys, group_masks = two_level.minimise(
+                entry_keys[start:end], entry_masks[start:end])
+        keys.append(group_keys)
+        masks.append(group_masks)
+        routes.append(np.full(len(group_keys), route, dtype=np.uint32))
+
+        times.append(EspressoCall(
+            route, len(group), len(entries) - end if provide_offset else 0,
+            len(group_keys), time.time() - t, False))
+
+        start = end
+        length += len(group_keys)
+
+    if not groups:
+        return common.RoutingTable()
+    return common.RoutingTable(np.concatenate(keys), np.concatenate(masks),
+                               np.concatenate(routes))
+
+
+def use_native_on_entire_table(table, provide_offset, times=None,
+                               target_length=None, deadline=None):
+    """Minimise a routing table as `use_espresso_on_entire_table` does, but
+    with the minimiser in `two_level` rather than Espresso.
+
+    Each route is minimised separately. If `provide_offset` is True the
+    entries with other routes are the off-set for each route (Espresso is
+    given an empty off-set), otherwise there are no don't cares. Once the
+    table `reached_target` the remaining routes are copied rather than
+    minimised.
+    """
+    table = common.RoutingTable.from_table(table)
+    order, routes, bounds = table.group_by_route()
+    keys = table.keys[order]
+    masks = table.masks[order]
+
+    t = time.time()
+    new_keys, new_masks, new_routes = list(), list(), list()
+    length = 0  # Length of the minimised routes
+    for route, start, end in zip(routes, bounds[:-1], bounds[1:]):
+        if reached_target(length + len(keys) - start, target_length,
+                          deadline):
+            route_keys, route_masks = keys[start:end], masks[start:end]
+        elif provide_offset:
+            others = np.ones(len(keys), dtype=bool)
+            others[start:end] = False
+            route_keys, route_masks = two_level.minimise(
+                keys[start:end], masks[start:end], keys[others],
+                masks[others])
+        else:
+            route_keys, route_masks = two_level.minimise(keys[start:end],
+                                                         masks[start:end])
+        new_keys.append(route_keys)
+        new_masks.append(route_masks)
+        new_routes.append(np.full(len(route_keys), route, dtype=np.uint32))
+        length += len(route_keys)
+
+    if not routes:
+        return common.RoutingTable()
+    new_table = common.RoutingTable(np.concatenate(new_keys),
+                                    np.concatenate(new_masks),
+                                    np.concatenate(new_routes))
+
+    if times is not None:
+        times.append(EspressoCall(None, len(table), 0, len(new_table),
+                                  time.time() - t, False))
 
     return new_table
 
 
-def use_espresso_on_entire_table(table, provide_offset):
-    """Call Espresso with appropriate arguments to minimise a routing table."""
-    # Begin by breaking entries up into sets of unique routes
-    route_indices = dict()
-    bits_to_route = dict()
-    for entry in table:
-        if entry.route not in route_indices:
-            route_indices[entry.route] = 1 << len(route_indices)
-            bits_to_route[route_indices[entry.route]] = entry.route
+def minimise(table, whole_table=False, provide_offset=True,
+             remove_default_entries=False, times=None, cache=None,
+             backend="espresso", target_length=None, time_budget=None):
+    """Minimise a routing table using Espresso.
+
+    Parameters
+    ----------
+    table : :py:class:`common.RoutingTable` or [RoutingTableEntry, ...]
+    whole_table : bool
+        If True the whole table is minimised as a single multiple-output
+        function, otherwise each route is minimised in turn.
+    provide_offset : bool
+        If True the entries which follow are provided as the off-set.
+    remove_default_entries : bool
+        If True entries which may be default routed are removed first.
+    times : list or None
+        List to which an :py:class:`EspressoCall` recording the time taken by
+        each call to Espresso is appended.
+    cache : :py:class:`EspressoCache` or None
+        Cache of the results of previous calls to Espresso.
+    backend : "espresso" or "native"
+        Whether to minimise with the Espresso executable or with the
+        minimiser in `two_level`.
+    target_length : int or None
+        If not None then minimisation stops once the table is no longer than
+        this.
+    time_budget : float or None
+        If not None then minimisation stops once this many seconds have
+        passed.
+
+    Returns
+    -------
+    :py:class:`common.RoutingTable`
+        The minimised table. When minimisation stops early the routes which
+        have not been minimised are copied from the table; the target and the
+        budget are only checked between calls to Espresso, so the whole-table
+        mode with Espresso either minimises the whole table or copies it.
+    """
+    if backend not in ("espresso", "native"):
+        raise ValueError("Unknown backend {!r}".format(backend))
+
+    deadline = None if time_budget is None else time.time() + time_budget
+    table = common.RoutingTable.from_table(table)
+    if times is None:
+        times = list()
 
-    # Prepare to create a new table
-    new_table = list()
+    if remove_default_entries:
+        table = fast_rde.minimise(table)
 
-    # Minimise the table, using the route indices as the function output
-    with tempfile.NamedTemporaryFile() as f:
-        if provide_offset:
-            f.write(b".i 32\n.o %u\n.type fr\n" % len(route_indices))
+    if backend == "native":
+        if whole_table:
+            return use_native_on_entire_table(table, provide_offset, times,
+                                              target_length, deadline)
         else:
-            f.write(b".i 32\n.o %u\n.type f\n" % len(route_indices))
-
-        # Write the "on-set"
-        for entry in table:
-            f.write(
-                key_mask_to_espresso(entry.key, entry.mask) +
-                " {1:0{0}b}\n".format(
-                    len(route_indices),
-                    route_indices[entry.route]).encode("utf-8")
-            )
-
-        f.write(b".e")
-        f.flush()
-
-        # Perform the minimisation and read back the result
-        with tempfile.TemporaryFile() as g:
-            subprocess.call(["espresso", f.name], stdout=g)
-
-            # Read back from g()
-            g.seek(0)
-            for line in g:
-                if b'.' not in line:
-                    keymask, route_str = \
-                        line.decode("utf-8").strip().split(" ", 1)
-                    key, mask = espresso_to_key_mask(keymask)
-                    route = bits_to_route[int(route_str, base=2)]
-                    new_table.append(RoutingTableEntry(route, key, mask))
-
-    return new_table
+            return use_native(table, times, provide_offset, target_length,
+                              deadline)
+    else:
+        if whole_table:
+            if reached_target(len(table), target_length, deadline):
+                return table
+            return use_espresso_on_entire_table(table, provide_offset, times,
+                                                cache)
+        else:
+            return use_espresso(table, times, provide_offset, cache,
+                                target_length, deadline)
 
 
-def my_minimize(chip, table, whole_table, provide_offset, remove_default_entries, times=list()):
+def my_minimize(chip, table, whole_table, provide_offset, remove_default_entries, times=list(), cache=None, backend="espresso", target_length=None, time_budget=None, verify_method="fast"):
     sys.stdout.write("({:3d}, {:3d})\t{:4d}\t".format(
         chip[0], chip[1], len(table)))
     sys.stdout.flush()
 
-    table_ = table
+    new_table = minimise(table, whole_table, provide_offset,
+                         remove_default_entries, times, cache, backend,
+                         target_length, time_budget)
 
-    if remove_default_entries:
-        table_ = rde_minimise(table, None)
+    verify.check_table(table, new_table, verify_method)
 
-    if whole_table:
-        new_table = use_espresso_on_entire_table(table_, provide_offset)
+    if target_length is None:
+        fits = len(new_table) < 1024
     else:
-        new_table = use_espresso(table_, times, provide_offset)
-
-    assert table_is_subset_of(table, new_table)
-
-    sys.stdout.write("\033[{}m{:4d}\033[39m\t{:.2f}%\n".format(
-        32 if len(new_table) < 1024 else 31,
+        fits = len(new_table) <= target_length
+    sys.stdout.write("\033[{}m{:4d}\033[39m\t{:.2f}%{}\n".format(
+        32 if fits else 31,
         len(new_table),
-        100. * float(len(table) - len(new_table)) / len(table)
+        100. * float(len(table) - len(new_table)) / len(table),
+        "" if target_length is None else
+        "\ttarget {}".format("met" if fits else "missed")
     ))
 
     return chip, new_table
@@ -166,24 +711,84 @@ if __name__ == "__main__":
     parser.add_argument("--whole-table", action="store_true", default=False)
     parser.add_argument("--no-off-set", action="store_true", default=False)
     parser.add_argument("--remove-default-entries", action="store_true", default=False)
+    parser.add_argument("--chip", nargs=2, type=int, action="append",
+                        metavar=("X", "Y"),
+                        help="only minimise the table for this chip")
+    parser.add_argument("--backend", choices=("espresso", "native"),
+                        default="espresso",
+                        help="minimise with the Espresso executable or the "
+                             "minimiser in two_level.py")
+    parser.add_argument("--espresso", default=ESPRESSO,
+                        help="Espresso executable (default: %(default)s)")
+    parser.add_argument("--times", metavar="CSV",
+                        help="write the time taken by each call to Espresso "
+                             "to this file")
+    parser.add_argument("--cache-dir", default="espresso_cache",
+                        help="directory in which to cache the results of "
+                             "Espresso (default: %(default)s)")
+    parser.add_argument("--cache-size", type=float, default=1024.0,
+                        metavar="MB",
+                        help="maximum size of the cache (default: "
+                             "%(default)s MB)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always call Espresso")
+    parser.add_argument("--target-length", type=int,
+                        help="stop minimising each table once it is no "
+                             "longer than this")
+    parser.add_argument("--time-budget", type=float, metavar="SECONDS",
+                        help="stop minimising each table after this long")
+    parser.add_argument("--verify", choices=verify.METHODS, default="fast",
+                        help="how to check that each minimised table routes "
+                             "packets as the original did (default: "
+                             "%(default)s)")
     args = parser.parse_args()
+    ESPRESSO = args.espresso
 
-    # Load and minimise all routing tables
-    print("Loading routing tables...")
-    with open(args.routing_table, "rb") as f:
-        uncompressed = common.read_routing_tables(f)
+    if args.no_cache:
+        cache = None
+    else:
+        cache = EspressoCache(args.cache_dir, int(args.cache_size * 2**20))
 
-    print("Minimising routing tables...")
+    # Minimise the routing tables one chip at a time, writing each minimised
+    # table as soon as it is produced.
+    print("Minimising routing tables into {}...".format(args.out))
     times = list()
-    compressed = dict(
-        my_minimize(chip, table, args.whole_table, not args.no_off_set, args.remove_default_entries, times) for
-        chip, table in iteritems(uncompressed)
-    )
-
-    fn = args.out
-    print("Dumping minimised routing tables to {}...".format(fn))
-    with open(fn, "wb+") as f:
-        common.dump_routing_tables(f, compressed)
-
-    print("Cumulative Espresso call-time: {}".format(sum(times)))
-    print("Mean Espresso call-time per table: {}".format(sum(times) / len(uncompressed)))
+    call_chips = list()  # Chip for each call in times
+    with common.RoutingTableFile(args.routing_table) as f, \
+            common.RoutingTableWriter(args.out) as writer:
+        chips = [tuple(c) for c in args.chip] if args.chip else list(f)
+        n_met = 0
+        for chip in chips:
+            table = f.get_table(chip)
+            chip, new_table = my_minimize(chip, table, args.whole_table,
+                                          not args.no_off_set,
+                                          args.remove_default_entries, times,
+                                          cache, args.backend,
+                                          args.target_length, args.time_budget,
+                                          args.verify)
+            writer.append(chip, new_table)
+            if (args.target_length is not None and
+                    len(new_table) <= args.target_length):
+                n_met += 1
+            call_chips.extend(chip for _ in range(len(times) -
+                                                  len(call_chips)))
+
+    if args.times is not None:
+        with open(args.times, "w") as f:
+            writer = csv.writer(f)
+            writer.writerow(("x", "y") + EspressoCall._fields)
+            for chip, call in zip(call_chips, times):
+                writer.writerow(chip + call)
+
+    if args.target_length is not None:
+        print("Target of {} entries met for {} of {} chips".format(
+            args.target_length, n_met, len(chips)))
+
+    total_time = sum(call.time for call in times)
+    name = "Espresso" if args.backend == "espresso" else args.backend
+    print("Cumulative {} call-time: {}".format(name, total_time))
+    print("Mean {} call-time per table: {}".format(name,
+                                                   total_time / len(chips)))
+    if cache is not None and args.backend == "espresso":
+        print("Espresso cache: {} hits, {} misses, {} evicted".format(
+            cache.hits, cache.misses, cache.evictions))
@@ -0,0 +1,369 @@
+"""Ordered Covering on routing tables held as Numpy arrays.
+
+:py:func:`ordered_covering` makes exactly the same merges, in the same order,
+as :py:func:`rig.routing_table.ordered_covering.ordered_covering` and so
+produces an identical table. The table is kept as arrays of keys, masks,
+routes and sources (and the entries which each entry was merged from, its
+aliases, as arrays of keys and masks with the index of the entry which owns
+them) so that, rather than inspecting one entry at a time, each step of
+evaluating a merge is a handful of bitwise operations over the whole table:
+
+- the up-check finds, for every entry of a merge at once, the first entry
+  below it which it intersects;
+- the down-check finds every alias below the insertion point which the merged
+  entry would cover, and the number of entries which would need to be removed
+  from the merge to set each bit of the merged entry, in one pass.
+"""
+import common
+import numpy as np
+from rig.routing_table import MinimisationFailedError
+import time
+
+
+_POPCOUNT_16 = np.unpackbits(
+    np.arange(1 << 16, dtype="<u2").view(np.uint8)).reshape(-1, 16).sum(
+        axis=1).astype(np.uint8)
+"""Number of bits set in each 16-bit word."""
+
+
+def popcount(words):
+    """Count the bits set in each of an array of 32-bit words."""
+    return _POPCOUNT_16[words & 0xffff] + _POPCOUNT_16[words >> 16]
+
+
+def get_generality(keys, masks):
+    """Count the number of Xs in each of an array of key-mask pairs."""
+    return popcount(~keys & ~masks)
+
+
+def _count_bits(words):
+    """Count the number of words in which each bit is set, along the last axis
+    of an array of 32-bit words.
+    """
+    words = np.ascontiguousarray(words, dtype="<u4")
+    bits = np.unpackbits(words.view(np.uint8), axis=-1, bitorder="little")
+    return bits.reshape(words.shape + (32, )).sum(axis=-2, dtype=int)
+
+
+def _intersect(key_a, mask_a, key_b, mask_b):
+    """Determine whether key-mask pairs intersect (as
+    :py:func:`rig.routing_table.utils.intersect`, with broadcasting).
+    """
+    return (key_a & mask_b) == (key_b & mask_a)
+
+
+class _Table(object):
+    """A routing table, ordered by generality, being minimised.
+
+    Attributes
+    ----------
+    keys, masks, routes, sources : np.ndarray
+        The entries of the table.
+    generality : np.ndarray
+        Number of Xs in each entry (in ascending order).
+    alias_keys, alias_masks : np.ndarray
+        Key-mask pairs of the original entries represented by the entries of
+        the table.
+    alias_owners : np.ndarray
+        Index of the entry of the table which represents each alias (in
+        ascending order).
+    refined : {route: (entries, checks), ...}
+        The refined merge of the entries with each route (see
+        `_get_best_merge`) and the checks made in refining it (see
+        `_refine_merge`).
+    """
+
+    def __init__(self, table):
+        generality = get_generality(table.keys, table.masks)
+        order = np.argsort(generality, kind="stable")
+
+        self.keys = table.keys[order]
+        self.masks = table.masks[order]
+        self.routes = table.routes[order]
+        self.sources = table.sources[order]
+        self.generality = generality[order]
+
+        self.alias_keys = self.keys.copy()
+        self.alias_masks = self.masks.copy()
+        self.alias_owners = np.arange(len(self.keys))
+        self.refined = dict()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def merge(self, entries):
+        """Get the key and mask of the entry which would result from merging
+        entries of the table, and the index at which it would be inserted.
+        """
+        keys = self.keys[entries]
+        all_ones = int(np.bitwise_and.reduce(keys))
+        any_ones = int(np.bitwise_or.reduce(keys))
+        mask = (int(np.bitwise_and.reduce(self.masks[entries])) &
+                ~(any_ones ^ all_ones) & 0xffffffff)
+        key = all_ones & mask
+
+        # Insert before the entries which are at least as general
+        generality = bin(~key & ~mask & 0xffffffff).count("1")
+        insertion_index = int(np.searchsorted(self.generality, generality,
+                                              side="left"))
+        return key, mask, generality, insertion_index
+
+    def apply(self, entries):
+        """Replace entries of the table with the entry which results from
+        merging them.
+        """
+        key, mask, generality, insertion_index = self.merge(entries)
+
+        keep = np.ones(len(self), dtype=bool)
+        keep[entries] = False
+        index = int(np.count_nonzero(keep[:insertion_index]))
+
+        # Where each of the entries will be in the new table, the aliases of
+        # the merged entries pass to the new entry.
+        new_index = np.cumsum(keep) - 1
+        new_index[insertion_index:] += 1
+        new_index[entries] = index
+        owners = new_index[self.alias_owners]
+        order = np.argsort(owners, kind="stable")
+        self.alias_keys = self.alias_keys[order]
+        self.alias_masks = self.alias_masks[order]
+        self.alias_owners = owners[order]
+
+        # A refined merge is unchanged unless the merged entry intersects a
+        # merge which was checked in refining it: otherwise none of the
+        # entries it adds or removes (or their aliases, which lie within it)
+        # are covered by the merge. Even then the down-check is unchanged
+        # unless the aliases move from above to below the merge, and neither
+        # check is changed if the entries were already below the merge.
+        route = self.routes[entries[0]]
+        lowest = int(self.generality[entries].min())
+        for other_route, (other_entries, checks) in \
+                list(self.refined.items()):
+            if other_route == route or any(
+                    _intersect(key, mask, check_key, check_mask) and
+                    lowest < check_generality and
+                    (upcheck or check_generality <= generality)
+                    for check_key, check_mask, check_generality, upcheck
+                    in checks):
+                del self.refined[other_route]
+            else:
+                self.refined[other_route] = (new_index[other_entries], checks)
+
+        self.keys = np.insert(self.keys[keep], index, key)
+        self.masks = np.insert(self.masks[keep], index, mask)
+        self.routes = np.insert(self.routes[keep], index, route)
+        self.sources = np.insert(self.sources[keep], index,
+                                 np.bitwise_or.reduce(self.sources[entries]))
+        self.generality = np.insert(self.generality[keep], index, generality)
+
+    def to_table(self):
+        return common.RoutingTable(self.keys, self.masks, self.routes,
+                                   self.sources)
+
+
+def ordered_covering(table, target_length=None, no_raise=False,
+                     time_budget=None):
+    """Reduce the size of a routing table by merging together entries where
+    possible.
+
+    The same assumptions are made about the table as by
+    :py:func:`rig.routing_table.ordered_covering.ordered_covering`, and the
+    same table is produced.
+
+    Parameters
+    ----------
+    table : :py:class:`common.RoutingTable` or [RoutingTableEntry, ...]
+        Routing entries to be merged.
+    target_length : int or None
+        Target length of the routing table; minimisation halts once either
+        this target is reached or no further minimisation is possible. If None
+        then the table will be made as small as possible.
+    no_raise : bool
+        If False (the default) then an error will be raised if the table cannot
+        be minimised to be smaller than `target_length`.
+    time_budget : float or None
+        If not None then minimisation also halts (with the table produced so
+        far) once this many seconds have passed.
+
+    Returns
+    -------
+    :py:class:`common.RoutingTable`
+        Reduced routing table.
+
+    Raises
+    ------
+    MinimisationFailedError
+        If the smallest table that can be produced is larger than
+        `target_length` and `no_raise` is False.
+    """
+    deadline = None if time_budget is None else time.time() + time_budget
+    table = _Table(common.RoutingTable.from_table(table))
+
+    while len(table) and (target_length is None or
+                          len(table) > target_length):
+        if deadline is not None and time.time() >= deadline:
+            break
+
+        entries = _get_best_merge(table)
+        if entries is None:
+            break
+        table.apply(entries)
+
+    if (not no_raise and
+            target_length is not None and
+            len(table) > target_length):
+        raise MinimisationFailedError(target_length, len(table))
+
+    return table.to_table()
+
+
+def _get_best_merge(table):
+    """Get the entries of the merge which would combine the greatest number of
+    entries, or None if no entries may be merged.
+
+    Refining a merge with a `min_goodness` only ever abandons it early, so the
+    best merge is the first (in order of the first appearance of each route)
+    of the merges refined with a `min_goodness` of 0 which combines the most
+    entries. These merges are kept in `table.refined` until they are changed
+    by applying a merge.
+    """
+    best_merge = None
+    best_goodness = 0
+
+    order, routes, bounds = table.to_table().group_by_route()
+    for route, start, end in zip(routes, bounds[:-1], bounds[1:]):
+        if end - start - 1 <= best_goodness:
+            continue
+
+        if route not in table.refined:
+            checks = list()
+            table.refined[route] = (
+                _refine_merge(table, order[start:end], 0, checks), checks)
+        entries = table.refined[route][0]
+        if len(entries) - 1 > best_goodness:
+            best_merge = entries
+            best_goodness = len(entries) - 1
+
+    return best_merge
+
+
+def _refine_merge(table, entries, min_goodness, checks):
+    """Remove entries from a merge (an ascending array of indices of entries
+    in the table) to generate a merge which may be applied to the table.
+
+    Merges which are no better than `min_goodness` are discarded, in which
+    case an empty merge is returned.
+
+    The key, mask and generality of each merge which is checked, and whether
+    it was up-checked (rather than down-checked), are appended to `checks`.
+    """
+    entries = _refine_downcheck(table, entries, min_goodness, checks)
+    if len(entries) - 1 > min_goodness:
+        entries, changed = _refine_upcheck(table, entries, min_goodness,
+                                           checks)
+        if changed and len(entries) - 1 > min_goodness:
+            entries = _refine_downcheck(table, entries, min_goodness, checks)
+    return entries
+
+
+def _refine_upcheck(table, entries, min_goodness, checks):
+    """Remove from the merge any entries which would be covered by entries
+    between their current position and the merge insertion position.
+
+    Returns
+    -------
+    np.ndarray
+        The entries of the new merge.
+    bool
+        If the merge has been changed at all.
+    """
+    key, mask, generality, insertion_index = table.merge(entries)
+    checks.append((key, mask, generality, True))
+
+    # Find the first entry below each entry of the merge which it intersects,
+    # the entry must be removed if this is above the insertion index (which
+    # only ever moves up as entries are removed).
+    start = entries[0] + 1
+    if insertion_index <= start:
+        return entries, False
+    others = slice(start, insertion_index)
+    intersects = _intersect(
+        table.keys[entries][:, np.newaxis],
+        table.masks[entries][:, np.newaxis],
+        table.keys[np.newaxis, others], table.masks[np.newaxis, others])
+    intersects &= (np.arange(start, insertion_index)[np.newaxis, :] >
+                   entries[:, np.newaxis])
+    first = np.where(np.any(intersects, axis=1),
+                     np.argmax(intersects, axis=1) + start, len(table))
+
+    changed = False
+    keep = np.ones(len(entries), dtype=bool)
+    for i in range(len(entries) - 1, -1, -1):
+        if first[i] < insertion_index:
+            keep[i] = False
+            changed = True
+            if np.count_nonzero(keep) - 1 <= min_goodness:
+                return entries[:0], changed
+            _, _, _, insertion_index = table.merge(entries[keep])
+
+    return entries[keep], changed
+
+
+def _refine_downcheck(table, entries, min_goodness, checks):
+    """Prune the merge to avoid it covering up any entries which are below the
+    merge insertion position.
+
+    Returns
+    -------
+    np.ndarray
+        The entries of the new merge, empty if the merge becomes no better
+        than `min_goodness`.
+    """
+    while len(entries) - 1 > min_goodness:
+        key, mask, generality, insertion_index = table.merge(entries)
+        checks.append((key, mask, generality, False))
+
+        # Find the aliases below the insertion point which would be covered
+        below = slice(np.searchsorted(table.alias_owners, insertion_index),
+                      None)
+        alias_keys = table.alias_keys[below]
+        alias_masks = table.alias_masks[below]
+        covered = _intersect(key, mask, alias_keys, alias_masks)
+        if not covered.any():
+            return entries
+
+        # Bits which are Xs in the merged entry but not in the covered entry,
+        # only the covered entries with fewest such bits are considered.
+        settable = alias_masks[covered] & np.uint32(~mask & 0xffffffff)
+        n_settable = popcount(settable)
+        most_stringent = n_settable.min()
+        if most_stringent == 0:
+            return entries[:0]
+
+        stringent = n_settable == most_stringent
+        settable = settable[stringent]
+        covered_keys = alias_keys[covered][stringent]
+
+        # Each option is to remove every entry with an X or a 0 (if a covered
+        # entry has a 0 in the bit) or with an X or a 1 (if a covered entry has
+        # a 1), the smallest such set is removed. Options are considered with
+        # the more significant bits first and, for each bit, removing the 0s
+        # first.
+        keys = table.keys[entries]
+        masks = table.masks[entries]
+        options = np.array([[np.bitwise_or.reduce(settable & ~covered_keys)],
+                            [np.bitwise_or.reduce(settable & covered_keys)]])
+        n_kept = np.where(_count_bits(options) != 0,
+                          _count_bits(np.stack((keys & masks, ~keys & masks))),
+                          -1)
+        option = int(np.argmax(n_kept[:, ::-1].T))
+
+        bit = np.uint32(1 << (31 - option // 2))
+        if option % 2 == 0:
+            remove = ((masks & bit) == 0) | ((keys & bit) == 0)
+        else:
+            remove = ((masks & bit) == 0) | ((keys & bit) != 0)
+        entries = entries[~remove]
+
+    return entries[:0]
+
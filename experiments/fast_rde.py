@@ -0,0 +1,174 @@
+"""Removal of default-routable entries from routing tables held as Numpy
+arrays.
+
+:py:func:`minimise` removes exactly the entries which
+:py:func:`rig.routing_table.remove_default_routes.minimise` removes. An entry
+may be default routed if it has a single source and a single route, both
+links, with the route opposite the source, and it does not intersect any entry
+below it. Rather than comparing each candidate with every entry below it, the
+candidates and the entries below them are compared in blocks or, when there are
+few distinct masks, grouped by mask so that each pair of masks needs only a
+sort and a binary search.
+"""
+import common
+import numpy as np
+from rig.routing_table import MinimisationFailedError
+
+
+_LINKS = 0x3f
+"""Route (and source) bits of the six links."""
+
+
+def is_single_link(words):
+    """Determine which of an array of route (or source) words are a single
+    link.
+    """
+    return ((words != 0) & ((words & (words - 1)) == 0) &
+            ((words & _LINKS) == words))
+
+
+def opposite_links(words):
+    """Get the route words of the links opposite those in an array of route
+    (or source) words of links.
+    """
+    return ((words << 3) | (words >> 3)) & _LINKS
+
+
+def is_defaultable(sources, routes):
+    """Determine which entries have a single source and a single route, both
+    links, with the route opposite the source (and so could be default routed
+    if they do not intersect any entries below them).
+    """
+    return (is_single_link(sources) & is_single_link(routes) &
+            (opposite_links(sources) == routes))
+
+
+def minimise(table, target_length=None, check_for_aliases=True):
+    """Remove from a routing table any entries which could be replaced by
+    default routing.
+
+    Parameters
+    ----------
+    table : :py:class:`common.RoutingTable` or [RoutingTableEntry, ...]
+    target_length : int or None
+        Target length of the routing table.
+    check_for_aliases : bool
+        If False then entries are not checked for intersections with the
+        entries below them (which is only correct if there are none).
+
+    Returns
+    -------
+    :py:class:`common.RoutingTable`
+        The entries of the table which may not be default routed, in order.
+
+    Raises
+    ------
+    MinimisationFailedError
+        If the table is longer than `target_length` after removing the
+        default-routable entries.
+    """
+    table = common.RoutingTable.from_table(table)
+
+    candidates = np.flatnonzero(is_defaultable(table.sources, table.routes))
+
+    # As in rig, aliases cannot exist when all the entries share the same mask
+    # and all the keys are unique.
+    if (check_for_aliases and len(np.unique(table.masks)) == 1 and
+            len(np.unique(table.keys)) == len(table)):
+        check_for_aliases = False
+
+    keep = np.ones(len(table), dtype=bool)
+    if check_for_aliases:
+        keep[candidates] = get_aliased(table.keys, table.masks, candidates)
+    else:
+        keep[candidates] = False
+
+    new_table = table[keep]
+    if target_length is not None and target_length < len(new_table):
+        raise MinimisationFailedError(target_length, len(new_table))
+    return new_table
+
+
+def get_aliased(keys, masks, candidates):
+    """Determine which entries intersect (as
+    :py:func:`rig.routing_table.utils.intersect`) any of the entries below them
+    in a table.
+
+    If there are few distinct masks each pair of masks is considered in turn
+    (see :py:func:`_get_aliased_by_masks`), otherwise blocks of candidates are
+    compared with every entry below them.
+
+    Parameters
+    ----------
+    keys, masks : np.ndarray
+        The keys and masks of the table.
+    candidates : np.ndarray
+        Ascending indices of the entries to check.
+
+    Returns
+    -------
+    np.ndarray
+        An array of bools, True for each candidate which intersects an entry
+        below it.
+    """
+    if len(candidates) == 0:
+        return np.zeros(0, dtype=bool)
+
+    # Only entries below the first candidate can alias a candidate
+    below = np.arange(candidates[0] + 1, len(keys))
+    n_pairs = (len(np.unique(masks[candidates])) *
+               len(np.unique(masks[below])))
+    if n_pairs * _PAIR_COST < len(candidates) * len(below):
+        return _get_aliased_by_masks(keys, masks, candidates, below)
+
+    aliased = np.zeros(len(candidates), dtype=bool)
+    for start in range(0, len(candidates), _BLOCK_SIZE):
+        block = candidates[start:start + _BLOCK_SIZE, np.newaxis]
+        others = slice(block[0, 0] + 1, None)
+        hits = ((keys[block] & masks[np.newaxis, others]) ==
+                (keys[np.newaxis, others] & masks[block]))
+        hits &= np.arange(block[0, 0] + 1, len(keys)) > block
+        aliased[start:start + _BLOCK_SIZE] = np.any(hits, axis=1)
+    return aliased
+
+
+_PAIR_COST = 1 << 12
+"""Approximate cost of considering a pair of masks relative to comparing a
+pair of entries."""
+
+_BLOCK_SIZE = 256
+"""Number of candidates compared with the table at once."""
+
+
+def _get_aliased_by_masks(keys, masks, candidates, below):
+    """Determine which candidates intersect an entry below them by considering
+    each pair of a mask of a candidate and a mask of an entry below.
+
+    A candidate with mask `a` intersects an entry with mask `b` if the key of
+    the candidate masked with `b` equals the key of the entry masked with `a`.
+    The last entry with each value of its masked key is found by sorting and
+    each candidate's masked key is looked up with a binary search.
+    """
+    aliased = np.zeros(len(candidates), dtype=bool)
+
+    for mask_a in np.unique(masks[candidates]):
+        in_group = masks[candidates] == mask_a
+        group = candidates[in_group]
+        group_aliased = np.zeros(len(group), dtype=bool)
+
+        for mask_b in np.unique(masks[below]):
+            others = below[masks[below] == mask_b]
+
+            # Find the last entry with each value of its masked key
+            values, last = np.unique((keys[others] & mask_a)[::-1],
+                                     return_index=True)
+            last = others[len(others) - 1 - last]
+
+            wanted = keys[group] & mask_b
+            found = np.minimum(np.searchsorted(values, wanted),
+                               len(values) - 1)
+            group_aliased |= (values[found] == wanted) & (last[found] > group)
+
+        aliased[in_group] = group_aliased
+
+    return aliased
@@ -1,5 +1,5 @@
 from common import read_memory_profile
-import numpy as np
+from memory_profile import summarise_profile
 from six import itervalues
 
 
@@ -7,12 +7,12 @@ if __name__ == "__main__":
     for title, x in (("Gaussian", "gaussian"),
                      ("Centroid", "centroid")):
         with open("memory_profiles/{}_12_12_xyp.bin".format(x), "rb") as f:
-            max_usage = 0
-            of_which_table = 0
+            # Find the chip with the greatest peak usage
+            summary = max((summarise_profile(usage) for usage in
+                           itervalues(read_memory_profile(f))),
+                          key=lambda s: s.peak)
 
-            for usage in itervalues(read_memory_profile(f)):
-                if np.max(usage) > max_usage:
-                    max_usage = np.max(usage)
-                    of_which_table = usage[1]
-
-            print("{}: {} bytes of which {} bytes is the table".format(title, max_usage, of_which_table))
+            print("{}: {} bytes of which {} bytes is the table "
+                  "({:.1f}%, peak after {} events)".format(
+                      title, summary.peak, summary.table,
+                      100.0 * summary.table_share, summary.time_of_peak))
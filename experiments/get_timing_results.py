@@ -1,14 +1,21 @@
+import argparse
 from collections import defaultdict
 import numpy as np
 from six import iterkeys
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("timing_file", nargs="?", default="timing.csv",
+                        help="file of times, e.g., host_timing.csv (default: "
+                             "%(default)s)")
+    args = parser.parse_args()
+
     # Load the data
     load_times = defaultdict(list)
     run_times = defaultdict(list)
 
-    with open("timing.csv", "r") as f:
+    with open(args.timing_file, "r") as f:
         next(f)  # Skip the comment row
         for row in f:
             model, target_length, load_time, run_time = tuple(row.strip().split())
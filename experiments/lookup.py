@@ -0,0 +1,226 @@
+"""Simulate first-match (TCAM) lookups of many keys in routing tables held as
+Numpy arrays.
+
+Usage: `python lookup.py original minimised [--keys N]` to compare the routes
+two files give to keys sampled from the tables of the first file, or
+`python lookup.py tables` to only measure the lookup throughput.
+
+Keys are looked up in one of two ways. If a table has few distinct masks then
+the first entry with each key is found for each mask and each key is looked up
+with a binary search for each mask. Otherwise the entries are compared with
+the keys in blocks, only the keys which have not yet matched an entry being
+compared with each block, so that no more than `max_elements` comparisons are
+held in memory at once.
+
+Unlike :py:func:`verify.find_counterexample`, which checks every key, only the
+sampled keys are checked, but many keys may be checked very quickly.
+"""
+import argparse
+import common
+import fast_rde
+import numpy as np
+import time
+import verify
+
+
+_MAX_ELEMENTS = 1 << 24
+"""Default maximum number of key and entry comparisons held at once."""
+
+_MASK_COST = 8
+"""Approximate cost of looking keys up for a mask relative to comparing them
+with an entry."""
+
+
+def first_match(table, keys, max_elements=_MAX_ELEMENTS):
+    """Get the index of the first entry of a table which matches each of an
+    array of keys.
+
+    Parameters
+    ----------
+    table : :py:class:`common.RoutingTable`
+    keys : array_like
+        32-bit keys to look up.
+    max_elements : int
+        Maximum number of comparisons of keys with entries to hold in memory
+        at once (when comparing blocks of entries with the keys).
+
+    Returns
+    -------
+    np.ndarray
+        Index of the first entry to match each key, or the length of the table
+        if no entry matches.
+    """
+    keys = np.asarray(keys, dtype=np.uint32)
+    if len(np.unique(table.masks)) * _MASK_COST < len(table):
+        return _first_match_by_masks(table, keys)
+
+    first = np.full(len(keys), len(table), dtype=int)
+    unmatched = np.arange(len(keys))
+    start = 0
+    while start < len(table) and len(unmatched):
+        block = slice(start, start + max(1, max_elements // len(unmatched)))
+        matches = ((keys[unmatched, np.newaxis] &
+                    table.masks[np.newaxis, block]) ==
+                   table.keys[np.newaxis, block])
+        matched = np.any(matches, axis=1)
+
+        first[unmatched[matched]] = start + np.argmax(matches[matched],
+                                                      axis=1)
+        unmatched = unmatched[~matched]
+        start = block.stop
+
+    return first
+
+
+def _first_match_by_masks(table, keys):
+    """Get the index of the first entry to match each key by looking up the
+    key masked with each of the masks of the table.
+
+    The masks are considered in the order in which they first appear in the
+    table, and keys which have already matched an entry above every entry
+    with a mask are not looked up for that mask.
+    """
+    # The masks, in the order of their first entries
+    masks, first_entries = np.unique(table.masks, return_index=True)
+    order = np.argsort(first_entries)
+
+    first = np.full(len(keys), len(table), dtype=int)
+    for mask, first_entry in zip(masks[order], first_entries[order]):
+        # The first entry with each key
+        entries = np.flatnonzero(table.masks == mask)
+        values, indices = np.unique(table.keys[entries], return_index=True)
+        entries = entries[indices]
+
+        unmatched = np.flatnonzero(first > first_entry)
+        wanted = keys[unmatched] & mask
+        found = np.minimum(np.searchsorted(values, wanted), len(values) - 1)
+        matched = values[found] == wanted
+        unmatched = unmatched[matched]
+        first[unmatched] = np.minimum(first[unmatched],
+                                      entries[found[matched]])
+
+    return first
+
+
+def lookup(table, keys, default_routes=0, max_elements=_MAX_ELEMENTS):
+    """Get the route word a routing table gives to each of an array of keys.
+
+    Parameters
+    ----------
+    table : :py:class:`common.RoutingTable`
+    keys : array_like
+        32-bit keys to look up.
+    default_routes : int or array_like
+        Route word (or words, one for each key) used for keys which match no
+        entry, e.g., the link opposite the one on which the packet arrived.
+    max_elements : int
+        See :py:func:`first_match`.
+
+    Returns
+    -------
+    np.ndarray
+        Route word for each key.
+    """
+    first = first_match(table, keys, max_elements)
+    routes = np.append(table.routes, np.zeros(1, dtype=np.uint32))[first]
+    return np.where(first < len(table), routes,
+                    np.asarray(default_routes, dtype=np.uint32))
+
+
+def sample_keys(table, n_keys, random_state=None):
+    """Sample keys from the key space of a routing table.
+
+    Each key is drawn from an entry chosen uniformly at random, with the
+    bits which the entry does not match chosen at random.
+
+    Returns
+    -------
+    (np.ndarray, np.ndarray)
+        The keys and the source word of the entry which each key was drawn
+        from.
+    """
+    if random_state is None:
+        random_state = np.random.RandomState()
+    valid = np.flatnonzero((table.keys & table.masks) == table.keys)
+    if len(valid) == 0:
+        return (np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32))
+
+    entries = valid[random_state.randint(len(valid), size=n_keys)]
+    bits = random_state.randint(1 << 32, size=n_keys,
+                                dtype=np.uint64).astype(np.uint32)
+    return (table.keys[entries] | (bits & ~table.masks[entries]),
+            table.sources[entries])
+
+
+def default_routes(sources):
+    """Get the route words given to packets which match no entry by default
+    routing: the opposite link if they arrived on a link, otherwise none.
+    """
+    return np.where(fast_rde.is_single_link(sources),
+                    fast_rde.opposite_links(sources), 0).astype(np.uint32)
+
+
+if __name__ == "__main__":
+    # Parse the arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("routing_table")
+    parser.add_argument("other_routing_table", nargs="?",
+                        help="file whose routes to compare with those of the "
+                             "first file")
+    parser.add_argument("--chip", nargs=2, type=int, action="append",
+                        metavar=("X", "Y"),
+                        help="only look up keys in the table for this chip")
+    parser.add_argument("--keys", "-n", type=int, default=1000000,
+                        help="number of keys to look up in the tables for "
+                             "each chip (default: %(default)s)")
+    parser.add_argument("--seed", type=int,
+                        help="seed for the random sampling of keys")
+    parser.add_argument("--max-elements", type=int, default=_MAX_ELEMENTS,
+                        help="maximum number of comparisons of keys with "
+                             "entries held in memory at once (default: "
+                             "%(default)s)")
+    args = parser.parse_args()
+
+    random_state = np.random.RandomState(args.seed)
+    files = [args.routing_table]
+    if args.other_routing_table is not None:
+        files.append(args.other_routing_table)
+
+    # Look up the keys for one chip at a time in each file, reporting the chips
+    # on which the files route keys differently.
+    lookup_time = 0.0
+    n_lookups = 0
+    n_differ = 0
+    with common.RoutingTableFile(files[0]) as f, \
+            common.RoutingTableFile(files[-1]) as other:
+        chips = [tuple(c) for c in args.chip] if args.chip else list(f)
+        for chip in chips:
+            tables = [f.get_table(chip)]
+            if len(files) > 1:
+                tables.append(other.get_table(chip) if chip in other else
+                              common.RoutingTable())
+            keys, sources = sample_keys(tables[0], args.keys, random_state)
+
+            routes = list()
+            for table in tables:
+                t = time.time()
+                routes.append(lookup(table, keys, default_routes(sources),
+                                     args.max_elements))
+                lookup_time += time.time() - t
+                n_lookups += len(keys)
+
+            differ = np.flatnonzero(routes[0] != routes[-1])
+            if len(differ):
+                n_differ += 1
+                i = differ[0]
+                print("({:3d}, {:3d})\t{} of {} keys differ, e.g., {}".format(
+                    chip[0], chip[1], len(differ), len(keys),
+                    verify.describe_counterexample(
+                        (int(keys[i]), int(routes[0][i]),
+                         int(routes[-1][i])))))
+
+    if len(files) > 1:
+        print("Keys routed differently on {} of {} chips".format(
+            n_differ, len(chips)))
+    print("{} lookups in {:.3f} s ({:.3g} lookups/s)".format(
+        n_lookups, lookup_time, n_lookups / max(lookup_time, 1e-9)))
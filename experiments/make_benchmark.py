@@ -0,0 +1,276 @@
+"""Constructs benchmark routing tables for a SpiNNaker machine of any size.
+
+The same connectivity profiles as `make_gaussian.py` ("gaussian") and
+`make_centroid.py` ("centroid") are used, but the size of the machine and the
+number of application cores on each chip may be chosen. The nets are routed
+once (in batches, by the NER algorithm as implemented in Rig) and the tables
+for each key scheme are then written one chip at a time. The fields of the
+keys are made just wide enough for the machine (see :py:func:`netgen.make_keys`).
+
+The routing table entries of each routed network are cached (in
+`benchmark_cache`, see :py:class:`netgen.RouteCache`), keyed by the profile,
+size of the machine, number of cores and seed, so the tables for other key
+schemes, or of a rerun, are written without generating or routing the nets
+again. The tables for the key schemes are written by a pool of worker
+processes.
+
+Usage::
+
+    python make_benchmark.py --width 48 --height 48 --profile centroid
+
+writes `uncompressed/centroid_48_48_{xyp,xyzp,hilbert,rnd}.bin`.
+"""
+import argparse
+from collections import OrderedDict
+import common
+import math
+import multiprocessing
+import netgen
+import numpy as np
+import os
+from rig.place_and_route import Cores, Machine
+from six import iteritems, itervalues
+import time
+
+
+PROFILES = ("gaussian", "centroid")
+"""Connectivity profiles which may be generated."""
+
+DEFAULT_SEED = 123
+"""Seed used for the nets unless another is given."""
+
+DEFAULT_CORES = 17
+"""Number of application cores on each chip of a SpiNNaker machine."""
+
+
+def make_nets(profile, machine, vertices, random_state):
+    """Make the nets of a connectivity profile.
+
+    Parameters
+    ----------
+    profile : str
+        One of `PROFILES`.
+    machine : :py:class:`rig.place_and_route.Machine`
+    vertices : OrderedDict
+        Mapping from (x, y, p) to each vertex.
+    random_state : :py:class:`numpy.random.RandomState`
+
+    Returns
+    -------
+    OrderedDict
+        Mapping from the (x, y, p) of each vertex to the net it sources.
+    """
+    distances = range(
+        netgen.offset_distances(machine.width, machine.height).max() + 1)
+
+    if profile == "gaussian":
+        probs = {d: .5*math.exp(-.65*d) for d in distances}
+        return netgen.distance_dependent_nets(machine, vertices, probs,
+                                              random_state)
+    elif profile == "centroid":
+        p = 0.5
+        probs = {d: p*(1 - p)**d for d in distances}
+        p = 0.3
+        dprobs = {d: p*(1 - p)**d for d in distances}
+        vector_centroids = [(i, j, d - i - j) for d in (5, 6, 7)
+                            for i in range(d + 1) for j in range(d + 1 - i)]
+        return netgen.centroid_nets(machine, vertices, probs, dprobs,
+                                    vector_centroids,
+                                    17*(0, ) + (1, 1) + (2, ), random_state,
+                                    compatible=False)
+    else:
+        raise ValueError("Unknown profile {!r}".format(profile))
+
+
+def make_machine(width, height, cores=DEFAULT_CORES):
+    """Get a perfect SpiNNaker machine and a vertex for each of the
+    application cores on each chip.
+
+    Returns
+    -------
+    (:py:class:`rig.place_and_route.Machine`, OrderedDict)
+        The machine and a mapping from (x, y, p) to each vertex.
+    """
+    machine = Machine(width, height, chip_resources={Cores: cores + 1})
+    vertices = OrderedDict(
+        ((x, y, p), object()) for x, y in machine for p in range(1, cores + 1)
+    )
+    return machine, vertices
+
+
+def route_benchmark(profile, width, height, cores=DEFAULT_CORES,
+                    seed=DEFAULT_SEED, batch_size=1024):
+    """Generate and route the nets of a benchmark.
+
+    Returns
+    -------
+    (np.ndarray, ...)
+        The routing table entries, see :py:func:`netgen.route_nets`.
+    """
+    machine, vertices = make_machine(width, height, cores)
+
+    # Generate the vertex resources, placements and allocations (required for
+    # routing)
+    vertices_resources = OrderedDict(
+        (vertex, {Cores: 1}) for vertex in itervalues(vertices)
+    )
+    placements = OrderedDict(
+        (vertex, (x, y)) for (x, y, p), vertex in iteritems(vertices)
+    )
+    allocations = OrderedDict(
+        (vertex, {Cores: slice(p, p+1)}) for (x, y, p), vertex in
+        iteritems(vertices)
+    )
+
+    print("Making nets...")
+    t = time.time()
+    nets = make_nets(profile, machine, vertices,
+                     netgen.python_random_state(seed))
+    print("\t{:.1f} s".format(time.time() - t))
+
+    print("Routing...")
+    t = time.time()
+    entries = netgen.route_nets(vertices_resources, list(itervalues(nets)),
+                                machine, placements, allocations, batch_size)
+    print("\t{} entries in {:.1f} s".format(len(entries[0]),
+                                             time.time() - t))
+    return entries
+
+
+# Network for which the current worker process writes tables
+_worker_network = None
+
+
+def _init_worker(width, height, cores, seed, entries, version):
+    global _worker_network
+    machine, vertices = make_machine(width, height, cores)
+    _worker_network = (machine, vertices, seed, entries, version)
+
+
+def _write_scheme(args):
+    """Write the tables for a key scheme of the network given to
+    `_init_worker` to a file.
+    """
+    scheme, fn = args
+    machine, vertices, seed, entries, version = _worker_network
+
+    # The random keys depend only on the seed, not on whether the nets were
+    # generated or read from the cache.
+    keys, masks = netgen.make_keys(scheme, machine, vertices,
+                                   np.random.RandomState(seed))
+    with common.RoutingTableWriter(fn, version) as writer:
+        lengths = netgen.write_tables(writer, entries, keys, masks)
+    return fn, lengths
+
+
+def make_routing_tables(profile, width, height, cores=DEFAULT_CORES,
+                        seed=DEFAULT_SEED, key_schemes=netgen.KEY_SCHEMES,
+                        output_dir="uncompressed", version=1,
+                        batch_size=1024, cache=None, jobs=1):
+    """Generate, route and write the routing tables for a benchmark.
+
+    Parameters
+    ----------
+    cache : :py:class:`netgen.RouteCache` or None
+        Cache in which the routed network is looked up and, if it is not
+        there, stored.
+    jobs : int
+        Number of worker processes which write the tables for the key
+        schemes, if 1 the tables are written in this process.
+
+    Returns
+    -------
+    OrderedDict
+        Mapping from the name of each file written to the lengths of its
+        tables.
+    """
+    params = dict(profile=profile, width=width, height=height, cores=cores,
+                  seed=seed)
+    key = None if cache is None else netgen.RouteCache.key(**params)
+    entries = None if cache is None else cache.get(key)
+    if entries is None:
+        entries = route_benchmark(profile, width, height, cores, seed,
+                                  batch_size)
+        if cache is not None:
+            cache.put(key, entries, **params)
+    else:
+        print("Read {} entries from the cache".format(len(entries[0])))
+
+    # Write the routing tables for each key scheme
+    suffix = "{}{}".format(
+        "" if cores == DEFAULT_CORES else "_{}cores".format(cores),
+        "" if seed == DEFAULT_SEED else "_seed{}".format(seed))
+    files = [(scheme, os.path.join(output_dir, "{}_{}_{}_{}{}.bin".format(
+        profile, width, height, scheme, suffix))) for scheme in key_schemes]
+
+    print("Writing tables for {}...".format(", ".join(key_schemes)))
+    init_args = (width, height, cores, seed, entries, version)
+    if jobs == 1:
+        _init_worker(*init_args)
+        results = OrderedDict(_write_scheme(f) for f in files)
+    else:
+        pool = multiprocessing.Pool(min(jobs, len(files)), _init_worker,
+                                    init_args)
+        try:
+            results = OrderedDict(pool.imap(_write_scheme, files))
+        finally:
+            pool.terminate()
+            pool.join()
+
+    for fn, lengths in iteritems(results):
+        print("\t{}: {} tables, longest {} entries".format(
+            fn, len(lengths), max(itervalues(lengths)) if lengths else 0))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=12)
+    parser.add_argument("--height", type=int, default=12)
+    parser.add_argument("--cores-per-chip", type=int, default=DEFAULT_CORES,
+                        help="number of application cores on each chip, at "
+                             "most 17 (default: %(default)s)")
+    parser.add_argument("--profile", choices=PROFILES, default="gaussian",
+                        help="connectivity profile (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED,
+                        help="seed for the random connectivity and keys "
+                             "(default: %(default)s, other seeds are appended "
+                             "to the file names)")
+    parser.add_argument("--keys", choices=netgen.KEY_SCHEMES,
+                        action="append",
+                        help="key scheme to write tables for, may be "
+                             "repeated (default: all)")
+    parser.add_argument("--output-dir", default="uncompressed")
+    parser.add_argument("--version", type=int, choices=(1, 2), default=1,
+                        help="version of the file format to write, version 2 "
+                             "is required for machines wider or taller than "
+                             "256 chips (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=1024,
+                        help="number of nets routed at once (default: "
+                             "%(default)s)")
+    parser.add_argument("--cache-dir", default="benchmark_cache",
+                        help="directory in which to cache the routed "
+                             "networks (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always generate and route the network")
+    parser.add_argument("--jobs", "-j", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of worker processes writing the tables "
+                             "for the key schemes (default: one per CPU)")
+    args = parser.parse_args()
+
+    if not 1 <= args.cores_per_chip <= 17:
+        parser.error("--cores-per-chip must be between 1 and 17")
+    if args.version == 1 and max(args.width, args.height) > 256:
+        parser.error("version 1 files cannot hold chips beyond (255, 255), "
+                     "use --version 2")
+
+    if args.no_cache:
+        cache = None
+    else:
+        cache = netgen.RouteCache(args.cache_dir)
+
+    make_routing_tables(args.profile, args.width, args.height,
+                        args.cores_per_chip, args.seed,
+                        args.keys or netgen.KEY_SCHEMES, args.output_dir,
+                        args.version, args.batch_size, cache, args.jobs)
@@ -8,12 +8,15 @@ Four sets of routing tables are produced for the same network:
     * With 12-bit keys randomly assigned to each core
 
 Routing is performed by the NER algorithm, as implemented in Rig.
+
+Usage: `python make_centroid.py [--seed N]`, the nets depend only on the seed.
 """
+import argparse
 from collections import OrderedDict
+import netgen
 import random
 from rig.bitfield import BitField
-from rig.netlist import Net
-from rig.geometry import to_xyz, minimise_xyz, shortest_torus_path_length
+from rig.geometry import to_xyz, minimise_xyz
 from rig.place_and_route import Cores, Machine
 from rig.place_and_route.place.hilbert import hilbert_chip_order
 from rig.place_and_route.route.ner import route
@@ -23,7 +26,11 @@ from six import iteritems, itervalues
 from common import dump_routing_tables
 
 
-def make_routing_tables():
+DEFAULT_SEED = 123
+"""Seed used for the nets unless another is given."""
+
+
+def make_routing_tables(seed=DEFAULT_SEED):
     # Create a perfect SpiNNaker machine to build against
     machine = Machine(12, 12)
 
@@ -65,46 +72,11 @@ def make_routing_tables():
                 vector_centroids.append((i, j, d - i - j))
 
     # Make the nets, each vertex is connected with distance dependent
-    # probability to other vertices.
-    random.seed(123)
-    nets = OrderedDict()
-    for source_coord, source in iteritems(vertices):
-        # Convert source_coord to xyz form
-        source_coord_xyz = minimise_xyz(to_xyz(source_coord[:-1]))
-
-        # Add a number of centroids
-        x, y, z = source_coord_xyz
-        possible_centroids = [minimise_xyz((x + i, y + j, z + k)) for
-                              i, j, k in vector_centroids]
-        n_centroids = random.choice(17*(0, ) + (1, 1) + (2, ))
-        centroids = random.sample(possible_centroids, n_centroids)
-
-        # Construct the sinks list
-        sinks = list()
-        for sink_coord, sink in iteritems(vertices):
-            # Convert sink_coord to xyz form
-            sink_coord = minimise_xyz(to_xyz(sink_coord[:-1]))
-
-            # Get the path length to the original source
-            dist = shortest_torus_path_length(source_coord_xyz, sink_coord,
-                                              machine.width, machine.height)
-            if random.random() < probs[dist]:
-                sinks.append(sink)
-                continue
-
-            # See if the sink is connected to the centre of any of the
-            # centroids.
-            for coord in centroids:
-                dist = shortest_torus_path_length(
-                    coord, sink_coord, machine.width, machine.height
-                )
-
-                if random.random() < dprobs[dist]:
-                    sinks.append(sink)
-                    break
-
-        # Add the net
-        nets[source_coord] = Net(source, sinks)
+    # probability to other vertices and to the vertices around a number of
+    # centroids.
+    nets = netgen.centroid_nets(machine, vertices, probs, dprobs,
+                                vector_centroids, 17*(0, ) + (1, 1) + (2, ),
+                                netgen.python_random_state(seed))
 
     rig_nets = list(itervalues(nets))  # Just the nets
 
@@ -180,11 +152,18 @@ def make_routing_tables():
         print([len(x) for x in itervalues(tables)])
 
         print("Writing to file...")
-        fn = "uncompressed/centroid_{}_{}_{}.bin".format(
-            machine.width, machine.height, desc)
+        fn = "uncompressed/centroid_{}_{}_{}{}.bin".format(
+            machine.width, machine.height, desc,
+            "" if seed == DEFAULT_SEED else "_seed{}".format(seed))
         with open(fn, "wb+") as f:
             dump_routing_tables(f, tables)
 
 
 if __name__ == "__main__":
-    make_routing_tables()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED,
+                        help="seed for the random connectivity (default: "
+                             "%(default)s, other seeds are appended to the "
+                             "file names)")
+    args = parser.parse_args()
+    make_routing_tables(args.seed)
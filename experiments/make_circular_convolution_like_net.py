@@ -1,19 +1,42 @@
 """Constructs a circular-convolution-like network (very large fan-out followed
 by very large fan-in) on a 3-board toroid.
 
-Nets are assigned unique IDs based on their order of creation.
+Nets are assigned unique IDs based on their order of creation, which are used
+as the keys of the "id" tables. The other key schemes (see
+:py:func:`netgen.make_keys`) use the location of the source core of each net
+and the order of the net among those with the same source.
+
+The time taken to place, allocate and route the network is logged for each
+step.
+
+Usage: `python make_circular_convolution_like_net.py [--seed N]`, which writes
+`uncompressed/circular_convolution_12_12_{id,xyp,xyzp,hilbert,rnd}.bin`.
 """
+import argparse
+from collections import Counter
+import common
 import logging
+import netgen
+import numpy as np
+import os
+import random
+import time
 
 from rig.netlist import Net
 from rig.place_and_route import Cores, Machine, place, allocate
-from rig.place_and_route.constraints import SameChipConstraint
-from rig.place_and_route.route.ner import route
-from rig.routing_table import routing_tree_to_tables
-
-from common import dump_routing_tables
+from rig.place_and_route.constraints import (ReserveResourceConstraint,
+                                             SameChipConstraint)
+from six import itervalues
 
 logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_SEED = 123
+"""Seed used for the placement unless another is given."""
+
+KEY_SCHEMES = ("id", ) + netgen.KEY_SCHEMES
+"""Ways in which keys may be allocated to the nets."""
 
 
 def share_list(items, n_shares):
@@ -31,7 +54,22 @@ def share_list(items, n_shares):
         yield values
 
 
-def make_routing_tables():
+def id_keys(n_nets):
+    """Get keys which are the ID of each net, in the most significant bits.
+
+    Returns
+    -------
+    (np.ndarray, np.ndarray)
+        The key and mask for each net.
+    """
+    length = max(1, (n_nets - 1).bit_length())
+    mask = ((1 << length) - 1) << (32 - length)
+    return ((np.arange(n_nets, dtype=np.uint32) << (32 - length)),
+            np.full(n_nets, mask, dtype=np.uint32))
+
+
+def make_routing_tables(seed=DEFAULT_SEED, key_schemes=KEY_SCHEMES,
+                        output_dir="uncompressed"):
     # Construct the vertices
     vertex_a = [object() for _ in range(17*2)]
     vertex_b = [object() for _ in range(2056)]
@@ -50,9 +88,11 @@ def make_routing_tables():
                      share_list(vertex_b, len(vertex_c))):
         nets.extend(Net(b, c) for b in bs)
 
+    # Reserve the monitor processor of each chip
+    constraints = [ReserveResourceConstraint(Cores, slice(0, 1))]
+
     # Construct constraints that place elements of vertex A together on the
     # same chip
-    constraints = list()
     for aa in share_list(vertex_a, 2):
         constraints.append(SameChipConstraint(aa))
 
@@ -70,12 +110,61 @@ def make_routing_tables():
     machine = Machine(12, 12)
 
     # Place and route the net
-    placements = place(vertices_resources, nets, machine, constraints)
+    t = time.time()
+    placements = place(vertices_resources, nets, machine, constraints,
+                       random=random.Random(seed))
+    logger.info("Placed %d vertices in %.1f s", len(placements),
+                time.time() - t)
+
+    t = time.time()
     allocations = allocate(vertices_resources, nets, machine, constraints,
                            placements)
-    routes = route(vertices_resources, nets, machine, constraints, placements,
-                   allocations)
+    logger.info("Allocated %d vertices in %.1f s", len(allocations),
+                time.time() - t)
+
+    t = time.time()
+    entries = netgen.route_nets(vertices_resources, nets, machine,
+                                placements, allocations)
+    logger.info("Routed %d nets (%d routing table entries) in %.1f s",
+                len(nets), len(entries[0]), time.time() - t)
+
+    # The core which sources each net and the order of each net among those
+    # with the same source.
+    sources = list()
+    index = list()
+    n_sourced = Counter()
+    for net in nets:
+        x, y = placements[net.source]
+        sources.append((x, y, allocations[net.source][Cores].start))
+        index.append(n_sourced[net.source])
+        n_sourced[net.source] += 1
+
+    # Write the routing tables for each key scheme
+    for scheme in key_schemes:
+        if scheme == "id":
+            keys, masks = id_keys(len(nets))
+        else:
+            keys, masks = netgen.make_keys(scheme, machine, sources,
+                                           np.random.RandomState(seed),
+                                           index)
+
+        fn = os.path.join(output_dir, "circular_convolution_{}_{}_{}{}.bin".format(
+            machine.width, machine.height, scheme,
+            "" if seed == DEFAULT_SEED else "_seed{}".format(seed)))
+        with common.RoutingTableWriter(fn) as writer:
+            lengths = netgen.write_tables(writer, entries, keys, masks)
+        logger.info("Wrote %d tables (longest %d entries) to %s",
+                    len(lengths), max(itervalues(lengths)), fn)
 
 
 if __name__ == "__main__":
-    make_routing_tables()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED,
+                        help="seed for the placement (default: %(default)s, "
+                             "other seeds are appended to the file names)")
+    parser.add_argument("--keys", choices=KEY_SCHEMES, action="append",
+                        help="key scheme to write tables for, may be "
+                             "repeated (default: all)")
+    parser.add_argument("--output-dir", default="uncompressed")
+    args = parser.parse_args()
+    make_routing_tables(args.seed, args.keys or KEY_SCHEMES, args.output_dir)
@@ -10,13 +10,16 @@ Four sets of routing tables are produced for the same network:
     * With 12-bit keys randomly assigned to each core
 
 Routing is performed by the NER algorithm, as implemented in Rig.
+
+Usage: `python make_gaussian.py [--seed N]`, the nets depend only on the seed.
 """
+import argparse
 from collections import OrderedDict
 import math
+import netgen
 import random
 from rig.bitfield import BitField
-from rig.netlist import Net
-from rig.geometry import to_xyz, minimise_xyz, shortest_torus_path_length
+from rig.geometry import to_xyz, minimise_xyz
 from rig.place_and_route import Cores, Machine
 from rig.place_and_route.place.hilbert import hilbert_chip_order
 from rig.place_and_route.route.ner import route
@@ -26,7 +29,11 @@ from six import iteritems, itervalues
 from common import dump_routing_tables
 
 
-def make_routing_tables():
+DEFAULT_SEED = 123
+"""Seed used for the nets unless another is given."""
+
+
+def make_routing_tables(seed=DEFAULT_SEED):
     # Create a perfect SpiNNaker machine to build against
     machine = Machine(12, 12)
 
@@ -54,27 +61,8 @@ def make_routing_tables():
 
     # Make the nets, each vertex is connected with distance dependent
     # probability to other vertices.
-    random.seed(123)
-    nets = OrderedDict()
-    for source_coord, source in iteritems(vertices):
-        # Convert source_coord to xyz form
-        source_coord_xyz = minimise_xyz(to_xyz(source_coord[:-1]))
-
-        # Construct the sinks list
-        sinks = list()
-        for sink_coord, sink in iteritems(vertices):
-            # Convert sink_coord to xyz form
-            sink_coord = minimise_xyz(to_xyz(sink_coord[:-1]))
-
-            # Get the path length
-            dist = shortest_torus_path_length(source_coord_xyz, sink_coord,
-                                              machine.width, machine.height)
-
-            if random.random() < probs[dist]:
-                sinks.append(sink)
-
-        # Add the net
-        nets[source_coord] = Net(source, sinks)
+    nets = netgen.distance_dependent_nets(
+        machine, vertices, probs, netgen.python_random_state(seed))
 
     rig_nets = list(itervalues(nets))  # Just the nets
 
@@ -148,10 +136,17 @@ def make_routing_tables():
         print([len(x) for x in itervalues(tables)])
 
         print("Writing to file...")
-        fn = "uncompressed/gaussian_{}_{}_{}.bin".format(
-            machine.width, machine.height, desc)
+        fn = "uncompressed/gaussian_{}_{}_{}{}.bin".format(
+            machine.width, machine.height, desc,
+            "" if seed == DEFAULT_SEED else "_seed{}".format(seed))
         with open(fn, "wb+") as f:
             dump_routing_tables(f, tables)
 
 if __name__ == "__main__":
-    make_routing_tables()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED,
+                        help="seed for the random connectivity (default: "
+                             "%(default)s, other seeds are appended to the "
+                             "file names)")
+    args = parser.parse_args()
+    make_routing_tables(args.seed)
@@ -0,0 +1,91 @@
+"""Tools for replaying and summarising the heap allocation logs recorded by
+the profiled SpiNNaker implementation of Ordered Covering.
+
+The log is a sequence of `(n_bytes, ptr)` events: an allocation of `n_bytes`
+at `ptr`, or (where `n_bytes` is 0) the freeing of `ptr`.
+"""
+from collections import namedtuple
+import numpy as np
+
+
+def replay_allocations(events):
+    """Compute the cumulative heap usage over time from an allocation log.
+
+    Each free is matched to the most recent allocation of the same pointer by
+    sorting the events by pointer, after which the usage is the cumulative sum
+    of the allocated and freed sizes.
+
+    Parameters
+    ----------
+    events : array_like
+        An (n, 2) array of `(n_bytes, ptr)` events.
+
+    Returns
+    -------
+    np.ndarray
+        The heap usage (in bytes) before the first event and after each
+        event.
+
+    Raises
+    ------
+    KeyError
+        If a pointer is freed which is not allocated.
+    """
+    events = np.asarray(events, dtype=np.uint32).reshape(-1, 2)
+    n_bytes = events[:, 0].astype(np.int64)
+    ptrs = events[:, 1]
+    is_free = n_bytes == 0
+
+    # Group the events by pointer (retaining their order in time)
+    order = np.argsort(ptrs, kind="stable")
+    sorted_ptrs = ptrs[order]
+    sorted_bytes = n_bytes[order]
+    sorted_free = is_free[order]
+
+    # Find the most recent allocation preceding each event in the same group
+    positions = np.arange(len(order))
+    last_alloc = np.maximum.accumulate(np.where(sorted_free, -1, positions))
+
+    # Every free must match a distinct allocation of the same pointer
+    freed = last_alloc[sorted_free]
+    if (np.any(freed < 0) or
+            np.any(sorted_ptrs[freed] != sorted_ptrs[sorted_free]) or
+            len(np.unique(freed)) != len(freed)):
+        raise KeyError("Free of a pointer which is not allocated")
+
+    # Allocations increase the usage, frees reduce it by the size of the
+    # matching allocation.
+    deltas = np.empty(len(order), dtype=np.int64)
+    deltas[order] = np.where(sorted_free, -sorted_bytes[last_alloc],
+                             sorted_bytes)
+
+    usage = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(deltas, out=usage[1:])
+    return usage.astype(np.uint32)
+
+
+class ProfileSummary(namedtuple("ProfileSummary",
+                                "peak, time_of_peak, table, table_share")):
+    """Summary statistics of a memory profile.
+
+    Parameters
+    ----------
+    peak : int
+        Peak heap usage in bytes.
+    time_of_peak : int
+        Number of events after which the peak usage was first reached (i.e.,
+        the index of the peak in the usage).
+    table : int
+        Size of the routing table (the first allocation) in bytes.
+    table_share : float
+        Fraction of the peak usage which is the routing table.
+    """
+
+
+def summarise_profile(usage):
+    """Summarise the heap usage produced by `replay_allocations`."""
+    time_of_peak = int(np.argmax(usage)) if len(usage) else 0
+    peak = int(usage[time_of_peak]) if len(usage) else 0
+    table = int(usage[1]) if len(usage) > 1 else 0
+    return ProfileSummary(peak, time_of_peak, table,
+                          float(table) / peak if peak else 0.0)
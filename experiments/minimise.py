@@ -0,0 +1,202 @@
+"""Minimise every routing table in a file with any of the minimisers, spreading
+the chips over a pool of worker processes.
+
+Usage: `python minimise.py in out --method mtrie --jobs 4`.
+
+The largest tables are minimised first (so that the longest-running chips do
+not start last) and the minimised tables are written in the same order as the
+tables in the input file, regardless of the order in which they complete.
+"""
+import argparse
+from collections import OrderedDict
+import common
+import espresso
+import fast_oc
+import fast_rde
+import multiprocessing
+import mtrie
+from rig.routing_table.ordered_covering import ordered_covering
+from six import iteritems
+import sys
+import time
+import verify
+
+
+def minimise_with_mtrie(table):
+    return mtrie.minimise(table)
+
+
+def minimise_with_espresso(table):
+    """Order-exploiting Espresso."""
+    return espresso.minimise(table)
+
+
+def minimise_with_espresso_whole(table):
+    """Non-order-exploiting Espresso."""
+    return espresso.minimise(table, whole_table=True, provide_offset=False,
+                             remove_default_entries=True)
+
+
+def minimise_with_rde(table):
+    return fast_rde.minimise(table)
+
+
+def minimise_with_oc(table):
+    new_table, _ = ordered_covering(table.to_entries(), None)
+    return common.RoutingTable.from_entries(new_table)
+
+
+def minimise_with_fast_oc(table):
+    """Ordered Covering, producing the same tables as `oc`."""
+    return fast_oc.ordered_covering(table)
+
+
+METHODS = OrderedDict((
+    ("mtrie", minimise_with_mtrie),
+    ("espresso", minimise_with_espresso),
+    ("espresso-whole", minimise_with_espresso_whole),
+    ("rde", minimise_with_rde),
+    ("oc", minimise_with_oc),
+    ("oc-fast", minimise_with_fast_oc),
+))
+"""Minimisation methods which may be selected by name."""
+
+
+# Tables, method and verification method used by the current worker process
+_worker_tables = None
+_worker_method = None
+_worker_verify_method = None
+
+
+def _init_worker(tables, method, verify_method="fast"):
+    global _worker_tables, _worker_method, _worker_verify_method
+    _worker_tables = tables
+    _worker_method = method
+    _worker_verify_method = verify_method
+
+
+def _minimise_chip(chip):
+    """Minimise (and verify) the table for a chip using the tables and methods
+    given to `_init_worker`.
+    """
+    if isinstance(_worker_tables, common.RoutingTableFile):
+        table = _worker_tables.get_table(chip)
+    else:
+        table = common.RoutingTable.from_table(_worker_tables[chip])
+
+    t = time.time()
+    new_table = METHODS[_worker_method](table)
+    run_time = time.time() - t
+
+    verify.check_table(table, new_table, _worker_verify_method)
+
+    return chip, len(table), new_table, run_time
+
+
+def minimise_tables(tables, method, jobs=1, chips=None, progress=None,
+                    verify_method="fast"):
+    """Minimise a set of routing tables, in parallel.
+
+    Parameters
+    ----------
+    tables : :py:class:`common.RoutingTableFile` or {(x, y): table, ...}
+        Tables to minimise. :py:class:`common.RoutingTableFile` objects are
+        cheap to send to worker processes, which read only the tables they
+        minimise.
+    method : str
+        Name of the minimisation method (see `METHODS`).
+    jobs : int
+        Number of worker processes to use, if 1 the tables are minimised in
+        this process.
+    chips : [(x, y), ...] or None
+        Chips whose tables should be minimised, if None then all the tables
+        are minimised.
+    progress : file or None
+        File to which progress is reported.
+    verify_method : str
+        How to check each minimised table (see `verify.METHODS`).
+
+    Returns
+    -------
+    OrderedDict
+        Mapping from chips to the minimised :py:class:`common.RoutingTable`,
+        in the order in which the chips appear in `chips` or `tables`.
+    """
+    if method not in METHODS:
+        raise ValueError("Unknown method {!r}".format(method))
+    if verify_method not in verify.METHODS:
+        raise ValueError("Unknown verification method {!r}".format(
+            verify_method))
+
+    chips = list(tables) if chips is None else list(chips)
+
+    # Schedule the largest tables first
+    if isinstance(tables, common.RoutingTableFile):
+        lengths = tables.lengths()
+    else:
+        lengths = {chip: len(table) for chip, table in iteritems(tables)}
+    schedule = sorted(chips, key=lambda chip: lengths[chip], reverse=True)
+
+    # Minimise the tables, in this process or a pool of workers
+    if jobs == 1:
+        _init_worker(tables, method, verify_method)
+        results = (_minimise_chip(chip) for chip in schedule)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(jobs, _init_worker,
+                                    (tables, method, verify_method))
+        results = pool.imap_unordered(_minimise_chip, schedule)
+
+    try:
+        minimised = dict()
+        for i, (chip, length, new_table, run_time) in enumerate(results):
+            minimised[chip] = new_table
+
+            if progress is not None:
+                progress.write(
+                    "[{:3d}/{:3d}] ({:3d}, {:3d})\t{:4d}\t{:4d}\t"
+                    "{:.2f} s\n".format(i + 1, len(schedule), chip[0],
+                                        chip[1], length, len(new_table),
+                                        run_time))
+                progress.flush()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    return OrderedDict((chip, minimised[chip]) for chip in chips)
+
+
+if __name__ == "__main__":
+    # Parse the arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("routing_table")
+    parser.add_argument("out")
+    parser.add_argument("--method", choices=list(METHODS), required=True)
+    parser.add_argument("--jobs", "-j", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of worker processes (default: one per "
+                             "CPU)")
+    parser.add_argument("--chip", nargs=2, type=int, action="append",
+                        metavar=("X", "Y"),
+                        help="only minimise the table for this chip")
+    parser.add_argument("--verify", choices=verify.METHODS, default="fast",
+                        help="how to check that each minimised table routes "
+                             "packets as the original did (default: "
+                             "%(default)s)")
+    args = parser.parse_args()
+
+    with common.RoutingTableFile(args.routing_table) as f:
+        chips = [tuple(c) for c in args.chip] if args.chip else None
+
+        print("Minimising routing tables with {} ({} jobs)...".format(
+            args.method, args.jobs))
+        t = time.time()
+        compressed = minimise_tables(f, args.method, args.jobs, chips,
+                                     progress=sys.stdout,
+                                     verify_method=args.verify)
+        print("... took {:.3f} s".format(time.time() - t))
+
+    print("Dumping minimised routing tables to {}...".format(args.out))
+    with open(args.out, "wb+") as f:
+        common.dump_routing_tables(f, compressed)
@@ -5,57 +5,241 @@ minimization," in Computer Aided Design, 2004. ICCAD-2004. IEEE/ACM
 International Conference on , vol., no., pp.428-435, 7-11 Nov. 2004
 """
 import argparse
-from collections import defaultdict
+from collections import Counter, OrderedDict
 import common
-from rig.routing_table import RoutingTableEntry, table_is_subset_of
-from rig.routing_table.remove_default_routes import minimise as rde_minimise
+import fast_rde
+from itertools import repeat
+import numpy as np
 from six import iteritems
 import sys
+import time
+import verify
 
 
-def my_minimize(chip, table):
+stats = Counter()
+"""Counts of the work done in finding paths to merge during insertion:
+`paths` is the number of paths enumerated and `nodes` the number of Nodes
+visited in doing so (only counted by the engines which search for common paths
+rather than enumerating every path). Reset with `stats.clear()`.
+"""
+
+
+def my_minimize(chip, table, engine="node", batch=False, target_length=None,
+                time_budget=None, verify_method="fast"):
     sys.stdout.write("({:3d}, {:3d})\t{:4d}\t".format(
         chip[0], chip[1], len(table)))
     sys.stdout.flush()
 
-    new_table = minimise(table)
+    new_table = minimise(table, engine, batch, target_length, time_budget)
 
-    assert table_is_subset_of(table, new_table)
+    verify.check_table(table, new_table, verify_method)
 
-    sys.stdout.write("\033[{}m{:4d}\033[39m\t{:.2f}%\n".format(
-        32 if len(new_table) < 1024 else 31,
+    if target_length is None:
+        fits = len(new_table) < 1024
+    else:
+        fits = len(new_table) <= target_length
+    sys.stdout.write("\033[{}m{:4d}\033[39m\t{:.2f}%{}\n".format(
+        32 if fits else 31,
         len(new_table),
-        100. * float(len(table) - len(new_table)) / len(table)
+        100. * float(len(table) - len(new_table)) / len(table),
+        "" if target_length is None else
+        "\ttarget {}".format("met" if fits else "missed")
     ))
 
     return chip, new_table
 
 
-def minimise(table):
-    """Minimise a routing table."""
+def minimise(table, engine="node", batch=False, target_length=None,
+             time_budget=None):
+    """Minimise a routing table.
+
+    Parameters
+    ----------
+    table : :py:class:`common.RoutingTable` or [RoutingTableEntry, ...]
+    engine : str
+        m-Trie implementation to use (see `ENGINES`), all of which produce the
+        same minimised tables.
+    batch : bool
+        If True then sub-tables in which no entries can be merged (see
+        `find_mergeable_subtables`) are copied rather than built into a trie,
+        this also produces the same minimised tables.
+    target_length : int or None
+        If not None then no more sub-tables are minimised once the table is no
+        longer than this.
+    time_budget : float or None
+        If not None then no more sub-tables are minimised once this many
+        seconds have passed.
+
+    Returns
+    -------
+    :py:class:`common.RoutingTable`
+        The minimised table, in which any sub-tables which were not minimised
+        are copied from the table.
+    """
+    deadline = None if time_budget is None else time.time() + time_budget
+    table = common.RoutingTable.from_table(table)
+
     # Remove default entries
-    table_ = rde_minimise(table, None)
+    table_ = fast_rde.minimise(table)
+
+    return minimise_subtables(table_, engine, batch, target_length, deadline)
+
+
+def minimise_subtables(table, engine="node", batch=False, target_length=None,
+                       deadline=None):
+    """Minimise each of the sub-tables of a :py:class:`common.RoutingTable`
+    with the same route, without first removing default entries.
+
+    See :py:func:`minimise` for the parameters, except that `deadline` is the
+    time (as given by `time.time()`) after which no more sub-tables are
+    minimised.
+    """
+    minimise_subtable = ENGINES[engine]
+    mergeable = find_mergeable_subtables(table) if batch else repeat(True)
+
+    # Split the table into sub-tables with the same route and minimise each
+    # subtable in turn.
+    keys, masks, routes = list(), list(), list()
+    remaining = len(table)  # Entries in this and the following sub-tables
+    for (route, group_keys, group_masks), merge in zip(subtables(table),
+                                                       mergeable):
+        # Stop minimising once the target or the deadline is reached
+        if ((target_length is not None and
+                len(keys) + remaining <= target_length) or
+                (deadline is not None and time.time() >= deadline)):
+            merge = False
+        remaining -= len(group_keys)
+
+        if merge:
+            keys_and_masks = minimise_subtable(group_keys, group_masks)
+        else:
+            # The trie would contain exactly the entries we started with
+            keys_and_masks = OrderedDict.fromkeys(zip(group_keys,
+                                                      group_masks))
 
-    # Split the table into sub-tables with the same route.
-    subtables = defaultdict(list)
-    for entry in table_:
-        subtables[entry.route].append((entry.key, entry.mask))
+        for key, mask in keys_and_masks:
+            keys.append(key)
+            masks.append(mask)
+            routes.append(route)
 
-    # Minimise each subtable in turn
-    mintables = dict()
-    for i, (route, keymasks) in enumerate(iteritems(subtables)):
-        trie = Node()
+    # Return to routing table form
+    return common.RoutingTable(keys, masks, routes)
 
-        for key, mask in keymasks:
-            insert(trie, key, mask)
 
-        mintables[route] = list(trie.get_keys_and_masks())
+def find_mergeable_subtables(table):
+    """Determine which of the sub-tables produced by `subtables` contain
+    entries which could be merged by an m-Trie.
 
-    # Return to routing table form
-    return [
-        RoutingTableEntry(r, k, m) for r, kms in iteritems(mintables) for
-        k, m in kms
-    ]
+    Inserting a path into an m-Trie only changes the trie if one of the Nodes
+    has two children (0 and 1, or X and either) below which the same path
+    exists, i.e., if there are two entries with the same route which differ in
+    exactly one bit which is set in the mask of at least one of them. If there
+    is no such pair in a sub-table then no entries are ever merged and the
+    minimised sub-table is just the (unique) entries of the sub-table,
+    regardless of the order in which they are inserted. The test is made for
+    every bit of every entry of the table at once.
+
+    Returns
+    -------
+    np.ndarray
+        Array of bools, one for each sub-table, True if the sub-table may be
+        changed by inserting it into an m-Trie.
+    """
+    order, group_routes, bounds = table.group_by_route()
+    n_groups = len(group_routes)
+    if n_groups == 0:
+        return np.zeros(0, dtype=bool)
+
+    keys = table.keys[order]
+    masks = table.masks[order]
+
+    # Identify each entry by its sub-table, its mask and its key
+    unique_masks, mask_ids = np.unique(masks, return_inverse=True)
+    if n_groups * len(unique_masks) >= 1 << 32:
+        return np.ones(n_groups, dtype=bool)  # Too large to identify entries
+
+    groups = np.repeat(np.arange(n_groups, dtype=np.uint64), np.diff(bounds))
+    groups *= np.uint64(len(unique_masks))
+
+    def identify(mask_ids, keys):
+        return (((groups + mask_ids.astype(np.uint64)) << np.uint64(32)) |
+                keys.astype(np.uint64))
+
+    entries = np.unique(identify(mask_ids, keys))
+
+    def exists(ids):
+        i = np.minimum(np.searchsorted(entries, ids), len(entries) - 1)
+        return entries[i] == ids
+
+    # Look for the neighbours of every entry in each bit in its mask
+    mergeable = np.zeros(len(keys), dtype=bool)
+    for bit in range(32):
+        bit = np.uint32(1 << bit)
+        in_mask = (masks & bit) != 0
+
+        # An entry which differs only in this bit (a 0 and 1 pair)
+        mergeable |= in_mask & exists(identify(mask_ids, keys ^ bit))
+
+        # An entry with an X in this bit (an X and 0, or X and 1, pair)
+        x_masks = masks & ~bit
+        x_mask_ids = np.minimum(np.searchsorted(unique_masks, x_masks),
+                                len(unique_masks) - 1)
+        mergeable |= (in_mask & (unique_masks[x_mask_ids] == x_masks) &
+                      exists(identify(x_mask_ids, keys & ~bit)))
+
+    return np.logical_or.reduceat(mergeable, bounds[:-1])
+
+
+def subtables(table):
+    """Split a :py:class:`common.RoutingTable` into sub-tables with the same
+    route.
+
+    Yields
+    ------
+    (route, [key, ...], [mask, ...])
+    """
+    order, group_routes, bounds = table.group_by_route()
+    group_keys = table.keys[order].tolist()
+    group_masks = table.masks[order].tolist()
+
+    for route, start, end in zip(group_routes, bounds[:-1], bounds[1:]):
+        yield route, group_keys[start:end], group_masks[start:end]
+
+
+def minimise_with_nodes(keys, masks):
+    """Minimise a set of keys and masks with the same route using a trie of
+    :py:class:`Node` objects.
+    """
+    trie = Node()
+
+    for key, mask in zip(keys, masks):
+        insert(trie, key, mask)
+
+    return list(trie.get_keys_and_masks())
+
+
+def minimise_with_node_sets(keys, masks):
+    """Minimise a set of keys and masks with the same route using a trie of
+    :py:class:`Node` objects and :py:func:`insert_by_enumeration`.
+    """
+    trie = Node()
+
+    for key, mask in zip(keys, masks):
+        insert_by_enumeration(trie, key, mask)
+
+    return list(trie.get_keys_and_masks())
+
+
+def minimise_with_arrays(keys, masks):
+    """Minimise a set of keys and masks with the same route using an
+    :py:class:`ArrayTrie`.
+    """
+    trie = ArrayTrie()
+
+    for key, mask in zip(keys, masks):
+        trie.insert(key, mask)
+
+    return trie.get_keys_and_masks()
 
 
 def insert(root, key, mask):
@@ -67,17 +251,42 @@ def insert(root, key, mask):
 
     # Visit each Node in the queue to minimise the trie
     for node in queue:
-        # If there are any intersections between the paths beginning 0... and
+        zero, one, x = (0, node.mask), (node.mask, node.mask), (0, 0)
+
+        # If there are any paths common to the children reached by 0... and
         # 1... then those paths should be untraversed and replaced by a path
         # beginning X...
-        for path in node.get_paths_from_0() & node.get_paths_from_1():
+        for path in node.get_common_paths(zero, one):
             node.untraverse_from_0(*path)
             node.untraverse_from_1(*path)
             next(node.traverse(*path))  # Finish the traversal
 
-        # If there are any intersections between the paths beginning 0... or
+        # If there are any paths common to the children reached by 0... or
         # 1... and X... then the paths beginning 0... or 1... should be
         # removed.
+        for path in node.get_common_paths(x, zero):
+            node.untraverse_from_0(*path)
+
+        for path in node.get_common_paths(x, one):
+            node.untraverse_from_1(*path)
+
+
+def insert_by_enumeration(root, key, mask):
+    """Add a new key and mask pair to a trie, finding the paths to merge by
+    enumerating every path below each child of the Nodes on the path.
+
+    This is the original implementation of :py:func:`insert`, which finds the
+    same paths, retained for comparison.
+    """
+    queue = root.traverse(key, mask)
+    next(queue)  # We don't care about the leaf
+
+    for node in queue:
+        for path in node.get_paths_from_0() & node.get_paths_from_1():
+            node.untraverse_from_0(*path)
+            node.untraverse_from_1(*path)
+            next(node.traverse(*path))  # Finish the traversal
+
         for path in node.get_paths_from_X() & node.get_paths_from_0():
             node.untraverse_from_0(*path)
 
@@ -140,10 +349,49 @@ class Node(object):
 
     def get_paths_from(self, child):
         if child in self.children:
-            return set(self.children[child].get_keys_and_masks())
+            paths = set(self.children[child].get_keys_and_masks())
+            stats["paths"] += len(paths)
+            return paths
         else:
             return set()
 
+    def get_common_paths(self, a, b):
+        """Get the paths which exist below both of two children.
+
+        The subtries below the children are walked in lockstep, so only the
+        Nodes which they have in common are visited.
+
+        Parameters
+        ----------
+        a, b : (key, mask)
+            Children of this Node.
+
+        Returns
+        -------
+        [(key, mask), ...]
+        """
+        paths = list()
+        if a not in self.children or b not in self.children:
+            return paths
+
+        n_nodes = 0
+        stack = [(self.children[a], self.children[b], 0, 0)]
+        while stack:
+            node_a, node_b, key, mask = stack.pop()
+            n_nodes += 1
+
+            if node_a.is_leaf:
+                paths.append((key, mask))
+            else:
+                for (k, m), child in iteritems(node_a.children):
+                    other = node_b.children.get((k, m))
+                    if other is not None:
+                        stack.append((child, other, key | k, mask | m))
+
+        stats["paths"] += len(paths)
+        stats["nodes"] += n_nodes
+        return paths
+
     def traverse(self, key, mask):
         """Traverse the tree adding new Nodes when necessary.
 
@@ -200,24 +448,288 @@ class Node(object):
         self.untraverse(key | self.mask, mask | self.mask)
 
 
+_EMPTY = -1  # Child slot which is not in use
+_LEAF = -2  # Child slot which holds a leaf
+
+
+class ArrayTrie(object):
+    """m-Trie with its Nodes held in an array of integers.
+
+    Every Node has three consecutive child slots (for the children reached by
+    0, 1 and X) in `children`, each of which holds the index of the child Node,
+    `_LEAF` or `_EMPTY`. The bit inspected by a Node is given by its depth so
+    is not stored; Node 0 is the root and inspects bit 31. Nodes removed by
+    untraversal are returned to a free list for reuse and the array is only
+    grown when the free list is exhausted.
+
+    Insertion and untraversal follow :py:func:`insert` and
+    :py:meth:`Node.untraverse` exactly (including which Nodes are removed
+    after untraversing a path), so the minimised keys and masks are the same
+    as those of a trie of :py:class:`Node` objects. Keys are expected not to
+    have bits set outside their masks.
+    """
+    def __init__(self, capacity=1024):
+        """Create an empty trie with space for `capacity` Nodes."""
+        self.children = [_EMPTY] * (3 * capacity)
+        self.free = list(range(capacity - 1, 0, -1))
+
+    def _allocate(self):
+        """Get the index of an unused Node, growing the arrays if
+        necessary.
+        """
+        if not self.free:
+            n_nodes = len(self.children) // 3
+            self.children.extend([_EMPTY] * (3 * n_nodes))
+            self.free.extend(range(2 * n_nodes - 1, n_nodes - 1, -1))
+
+        return self.free.pop()
+
+    def _release(self, node):
+        """Return a Node and all of its descendants to the free list."""
+        children = self.children
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for i in range(3 * node, 3 * node + 3):
+                if children[i] >= 0:
+                    stack.append(children[i])
+                children[i] = _EMPTY
+            self.free.append(node)
+
+    def insert(self, key, mask):
+        """Add a new key and mask pair to the trie."""
+        # Visit each Node along the path from the leaf to the root to minimise
+        # the trie (see :py:func:`insert`).
+        path = self.traverse(key, mask)
+        for bit in range(32):
+            node = path[31 - bit]
+            bit_mask = 1 << bit
+
+            for k, m in self.get_common_paths(node, 0, 1, bit):
+                self.untraverse(k, m | bit_mask, node, bit)
+                self.untraverse(k | bit_mask, m | bit_mask, node, bit)
+                self.traverse(k, m, node, bit)
+
+            for k, m in self.get_common_paths(node, 2, 0, bit):
+                self.untraverse(k, m | bit_mask, node, bit)
+
+            for k, m in self.get_common_paths(node, 2, 1, bit):
+                self.untraverse(k | bit_mask, m | bit_mask, node, bit)
+
+    def traverse(self, key, mask, node=0, bit=31):
+        """Traverse the trie from a Node adding new Nodes when necessary.
+
+        Returns
+        -------
+        [int, ...]
+            Nodes along the path, in order from `node` to the Node which
+            inspects bit 0.
+        """
+        children = self.children
+        path = list()
+
+        while bit >= 0:
+            path.append(node)
+
+            bit_mask = 1 << bit
+            if not mask & bit_mask:
+                i = 3 * node + 2
+            elif key & bit_mask:
+                i = 3 * node + 1
+            else:
+                i = 3 * node
+
+            node = children[i]
+            if node == _EMPTY:
+                node = _LEAF if bit == 0 else self._allocate()
+                children[i] = node
+
+            bit -= 1
+
+        return path
+
+    def untraverse(self, key, mask, node=0, bit=31):
+        """Remove a key and mask from the trie below a Node.
+
+        As in :py:meth:`Node.untraverse`, the leaf is removed and then each
+        Node on the path back up is removed if its child was removed and it
+        still has other children.
+        """
+        children = self.children
+
+        # Find the child slots along the path
+        slots = list()
+        while True:
+            bit_mask = 1 << bit
+            if not mask & bit_mask:
+                i = 3 * node + 2
+            elif key & bit_mask:
+                i = 3 * node + 1
+            else:
+                i = 3 * node
+
+            node = children[i]
+            if node == _EMPTY:
+                raise KeyError((key, mask))
+
+            slots.append(i)
+            if node == _LEAF:
+                break
+            bit -= 1
+
+        # Remove children on the way back up
+        for i in reversed(slots):
+            child = children[i]
+            children[i] = _EMPTY
+            if child != _LEAF:
+                self._release(child)
+
+            parent = 3 * (i // 3)
+            if (children[parent] == _EMPTY and
+                    children[parent + 1] == _EMPTY and
+                    children[parent + 2] == _EMPTY):
+                break
+
+    def get_common_paths(self, node, slot_a, slot_b, bit):
+        """Get the paths which exist below both of two children of a Node,
+        walking the subtries below them in lockstep.
+
+        Parameters
+        ----------
+        node : int
+            Node which inspects `bit`.
+        slot_a, slot_b : int
+            0, 1 or 2 for the children reached by 0, 1 or X respectively.
+
+        Returns
+        -------
+        [(key, mask), ...]
+        """
+        children = self.children
+        paths = list()
+
+        a = children[3 * node + slot_a]
+        b = children[3 * node + slot_b]
+        if a == _EMPTY or b == _EMPTY:
+            return paths
+        elif a == _LEAF:
+            paths.append((0, 0))
+            stats["paths"] += 1
+            return paths
+
+        n_nodes = 0
+        stack = [(a, b, bit - 1, 0, 0)]
+        while stack:
+            a, b, bit, key, mask = stack.pop()
+            n_nodes += 1
+            bit_mask = 1 << bit
+
+            for i, j, k, m in ((3 * a, 3 * b, key, mask | bit_mask),
+                               (3 * a + 1, 3 * b + 1, key | bit_mask,
+                                mask | bit_mask),
+                               (3 * a + 2, 3 * b + 2, key, mask)):
+                child_a = children[i]
+                child_b = children[j]
+                if child_a == _EMPTY or child_b == _EMPTY:
+                    continue
+                elif child_a == _LEAF:
+                    paths.append((k, m))
+                else:
+                    stack.append((child_a, child_b, bit - 1, k, m))
+
+        stats["paths"] += len(paths)
+        stats["nodes"] += n_nodes
+        return paths
+
+    def get_keys_and_masks(self):
+        """Retrieve minimised keys and masks from the trie.
+
+        Returns
+        -------
+        [(key, mask), ...]
+        """
+        children = self.children
+        keys_and_masks = list()
+        stack = [(0, 31, 0, 0)]
+        while stack:
+            node, bit, key, mask = stack.pop()
+            bit_mask = 1 << bit
+            i = 3 * node
+
+            # Child reached by 0
+            child = children[i]
+            if child == _LEAF:
+                keys_and_masks.append((key, mask | bit_mask))
+            elif child != _EMPTY:
+                stack.append((child, bit - 1, key, mask | bit_mask))
+
+            # Child reached by 1
+            child = children[i + 1]
+            if child == _LEAF:
+                keys_and_masks.append((key | bit_mask, mask | bit_mask))
+            elif child != _EMPTY:
+                stack.append((child, bit - 1, key | bit_mask,
+                              mask | bit_mask))
+
+            # Child reached by X
+            child = children[i + 2]
+            if child == _LEAF:
+                keys_and_masks.append((key, mask))
+            elif child != _EMPTY:
+                stack.append((child, bit - 1, key, mask))
+
+        return keys_and_masks
+
+
+ENGINES = OrderedDict((
+    ("node", minimise_with_nodes),
+    ("array", minimise_with_arrays),
+    ("node-sets", minimise_with_node_sets),
+))
+"""m-Trie implementations which may be selected by name."""
+
+
 if __name__ == "__main__":
     # Parse the arguments
     parser = argparse.ArgumentParser()
     parser.add_argument("input_file")
     parser.add_argument("output_file")
+    parser.add_argument("--chip", nargs=2, type=int, action="append",
+                        metavar=("X", "Y"),
+                        help="only minimise the table for this chip")
+    parser.add_argument("--engine", choices=list(ENGINES), default="node",
+                        help="m-Trie implementation to use")
+    parser.add_argument("--batch", action="store_true",
+                        help="copy sub-tables which cannot be merged rather "
+                             "than building a trie for each")
+    parser.add_argument("--target-length", type=int,
+                        help="stop minimising each table once it is no "
+                             "longer than this")
+    parser.add_argument("--time-budget", type=float, metavar="SECONDS",
+                        help="stop minimising each table after this long")
+    parser.add_argument("--verify", choices=verify.METHODS, default="fast",
+                        help="how to check that each minimised table routes "
+                             "packets as the original did (default: "
+                             "%(default)s)")
     args = parser.parse_args()
 
-    # Load and minimise all routing tables
-    print("Loading routing tables...")
-    with open(args.input_file, "rb") as f:
-        uncompressed = common.read_routing_tables(f)
-
-    print("Minimising routing tables...")
-    compressed = dict(
-        my_minimize(chip, table) for chip, table in iteritems(uncompressed)
-    )
-
-    fn = args.output_file
-    print("Dumping minimised routing tables to {}...".format(fn))
-    with open(fn, "wb+") as f:
-        common.dump_routing_tables(f, compressed)
+    # Minimise the routing tables one chip at a time, writing each minimised
+    # table as soon as it is produced.
+    print("Minimising routing tables into {}...".format(args.output_file))
+    with common.RoutingTableFile(args.input_file) as f, \
+            common.RoutingTableWriter(args.output_file) as writer:
+        chips = [tuple(c) for c in args.chip] if args.chip else list(f)
+        n_met = 0
+        for chip in chips:
+            table = f.get_table(chip)
+            chip, new_table = my_minimize(chip, table, args.engine,
+                                          args.batch, args.target_length,
+                                          args.time_budget, args.verify)
+            writer.append(chip, new_table)
+            if (args.target_length is not None and
+                    len(new_table) <= args.target_length):
+                n_met += 1
+
+    if args.target_length is not None:
+        print("Target of {} entries met for {} of {} chips".format(
+            args.target_length, n_met, len(chips)))
@@ -0,0 +1,489 @@
+"""Generation of the nets, keys and routing tables of benchmark networks with
+Numpy.
+
+The connectivity of each source is drawn for every sink at once, with the
+probability of each connection looked up from a table of the distances between
+chips at each offset, which is computed once per machine.
+
+The random numbers are drawn from a :py:class:`numpy.random.RandomState` with
+the same state as Python's :py:mod:`random` after `random.seed(seed)` and are
+consumed in the same order as by the loops over each pair of cores which
+`make_gaussian.py` and `make_centroid.py` used to use (which called
+`random.random()` for each pair), so a seed produces the same nets as it did
+with those loops.
+
+:py:func:`route_nets` routes the nets in batches and records the routing table
+entries of every net as arrays of integers, so the tables for any key
+allocation (see :py:func:`make_keys`) may be written one chip at a time with
+:py:func:`write_tables`. These entries may be kept in a :py:class:`RouteCache`
+so that the same network need not be generated and routed again.
+"""
+from collections import OrderedDict
+import common
+import hashlib
+import json
+import math
+import numpy as np
+import os
+import random
+import tempfile
+from rig.netlist import Net
+from rig.place_and_route.place.hilbert import hilbert_chip_order
+from rig.place_and_route.route.ner import route
+
+
+def python_random_state(seed):
+    """Get a :py:class:`numpy.random.RandomState` which produces the same
+    stream of random numbers as Python's :py:mod:`random` seeded with `seed`.
+    """
+    state = random.Random(seed).getstate()[1]
+    random_state = np.random.RandomState()
+    random_state.set_state(("MT19937", np.array(state[:-1], dtype=np.uint32),
+                            state[-1]))
+    return random_state
+
+
+def randbelow(random_state, n):
+    """Get a random integer in [0, n) as `random.randrange(n)` does."""
+    k = n.bit_length()
+    while True:
+        r = int(random_state.randint(1 << 32, dtype=np.uint64)) >> (32 - k)
+        if r < n:
+            return r
+
+
+def sample(random_state, n, k):
+    """Get the indices of a random sample of `k` of `n` items as
+    `random.sample(range(n), k)` does.
+    """
+    setsize = 21
+    if k > 5:
+        setsize += 4 ** int(math.ceil(math.log(k * 3, 4)))
+
+    if n <= setsize:
+        pool = list(range(n))
+        selected = list()
+        for i in range(k):
+            j = randbelow(random_state, n - i)
+            selected.append(pool[j])
+            pool[j] = pool[n - i - 1]
+    else:
+        selected = list()
+        for _ in range(k):
+            j = randbelow(random_state, n)
+            while j in selected:
+                j = randbelow(random_state, n)
+            selected.append(j)
+    return selected
+
+
+def offset_distances(width, height):
+    """Get the length of a shortest path, using the wrap-around links, between
+    chips at every offset in a machine.
+
+    As in :py:func:`rig.geometry.shortest_torus_path_length`, see
+    http://jhnet.co.uk/articles/torus_paths.
+
+    Returns
+    -------
+    np.ndarray
+        The distance from any chip (x, y) to the chip (x + dx, y + dy) (modulo
+        the size of the machine) is at [dx, dy].
+    """
+    x = np.arange(width)[:, np.newaxis]
+    y = np.arange(height)[np.newaxis, :]
+    return np.minimum.reduce([np.maximum(x, y), width - x + y,
+                              x + height - y,
+                              np.maximum(width - x, height - y)])
+
+
+class _Offsets(object):
+    """Look up values by the offset from a chip to the chip of each vertex."""
+
+    def __init__(self, machine, vertices):
+        coords = np.array(list(vertices), dtype=int).reshape(-1, 3)
+        self.xs, self.ys = coords[:, 0], coords[:, 1]
+        self.width, self.height = machine.width, machine.height
+        self.distances = offset_distances(machine.width, machine.height)
+
+    def lookup(self, values, x, y):
+        """Get the value for the offset from (x, y) to each vertex."""
+        return values[(self.xs - x) % self.width, (self.ys - y) % self.height]
+
+    def probabilities(self, probs):
+        """Get the probability for the distance at each offset."""
+        return np.array([probs[d] for d in
+                         range(self.distances.max() + 1)])[self.distances]
+
+
+def distance_dependent_nets(machine, vertices, probs, random_state):
+    """Connect every vertex to every vertex with a probability which depends
+    on the distance between their chips.
+
+    Parameters
+    ----------
+    machine : :py:class:`rig.place_and_route.Machine`
+    vertices : OrderedDict
+        Mapping from (x, y, p) to each vertex.
+    probs : {distance: probability, ...}
+        Probability of connecting vertices on chips this distance apart.
+    random_state : :py:class:`numpy.random.RandomState`
+
+    Returns
+    -------
+    OrderedDict
+        Mapping from the (x, y, p) of each vertex to the net it sources.
+    """
+    offsets = _Offsets(machine, vertices)
+    offset_probs = offsets.probabilities(probs)
+    sinks = list(vertices.values())
+
+    nets = OrderedDict()
+    for (x, y, p), source in zip(vertices, sinks):
+        connected = (random_state.random_sample(len(sinks)) <
+                     offsets.lookup(offset_probs, x, y))
+        nets[(x, y, p)] = Net(source, [sinks[i] for i in
+                                       np.flatnonzero(connected)])
+    return nets
+
+
+def centroid_nets(machine, vertices, probs, centroid_probs, centroid_offsets,
+                  n_centroids, random_state, compatible=True):
+    """Connect every vertex to every vertex with a probability which depends
+    on the distance between their chips and, failing that, to vertices near
+    some randomly chosen centroids.
+
+    Parameters
+    ----------
+    machine : :py:class:`rig.place_and_route.Machine`
+    vertices : OrderedDict
+        Mapping from (x, y, p) to each vertex.
+    probs : {distance: probability, ...}
+        Probability of connecting vertices on chips this distance apart.
+    centroid_probs : {distance: probability, ...}
+        Probability of connecting to a vertex this far from a centroid.
+    centroid_offsets : [(x, y, z), ...]
+        Offsets from the source from which the centroids are sampled.
+    n_centroids : [int, ...]
+        Numbers of centroids, from which the number of centroids of each
+        vertex is chosen.
+    random_state : :py:class:`numpy.random.RandomState`
+    compatible : bool
+        If True then random numbers are drawn for each sink only until it is
+        connected, as `make_centroid.py` always has (which requires a loop
+        over the sinks of each source with centroids), otherwise the same
+        number are drawn for every sink.
+
+    Returns
+    -------
+    OrderedDict
+        Mapping from the (x, y, p) of each vertex to the net it sources.
+    """
+    offsets = _Offsets(machine, vertices)
+    offset_probs = offsets.probabilities(probs)
+    offset_centroid_probs = offsets.probabilities(centroid_probs)
+    sinks = list(vertices.values())
+
+    nets = OrderedDict()
+    for (x, y, p), source in zip(vertices, sinks):
+        # Choose the centroids, as random.choice and random.sample do
+        n = n_centroids[randbelow(random_state, len(n_centroids))]
+        selected = sample(random_state, len(centroid_offsets), n)
+
+        # Probability of connecting to each sink directly and via each
+        # centroid (which is on the chip at (x + i - k, y + j - k)).
+        sink_probs = np.array(
+            [offsets.lookup(offset_probs, x, y)] +
+            [offsets.lookup(offset_centroid_probs, x + i - k, y + j - k)
+             for i, j, k in (centroid_offsets[c] for c in selected)])
+
+        if compatible and selected:
+            connected = _connect_via_centroids(sink_probs, random_state)
+        else:
+            connected = np.any(
+                random_state.random_sample(sink_probs.shape) < sink_probs,
+                axis=0)
+
+        nets[(x, y, p)] = Net(source, [sinks[i] for i in
+                                       np.flatnonzero(connected)])
+    return nets
+
+
+def _connect_via_centroids(sink_probs, random_state):
+    """Draw the connections to each sink, trying the source and then each
+    centroid in turn until one connects.
+
+    The number of random numbers used for each sink depends on those used for
+    the previous sinks, so enough are drawn for the worst case and the state
+    is then advanced by only as many as were used.
+    """
+    state = random_state.get_state()
+    draws = random_state.random_sample(sink_probs.size).tolist()
+
+    connected = np.zeros(sink_probs.shape[1], dtype=bool)
+    used = 0
+    for sink, ps in enumerate(zip(*sink_probs.tolist())):
+        for p in ps:
+            used += 1
+            if draws[used - 1] < p:
+                connected[sink] = True
+                break
+
+    random_state.set_state(state)
+    random_state.random_sample(used)
+    return connected
+
+
+KEY_SCHEMES = ("xyp", "xyzp", "hilbert", "rnd")
+"""Ways in which keys may be allocated to the vertices (see
+:py:func:`make_keys`)."""
+
+
+def make_keys(scheme, machine, vertices, random_state=None, index=None):
+    """Allocate a key to the net sourced by each vertex.
+
+    The fields of the keys are placed from the most significant bit down, in
+    the order given below, and each field is made just wide enough for the
+    largest value it takes.
+
+    Parameters
+    ----------
+    scheme : str
+        One of:
+
+        - "xyp": the chip co-ordinates and core number of the vertex.
+        - "xyzp": the minimised hexagonal co-ordinates (with the absolute value
+          of `z`) of the chip and the core number.
+        - "hilbert": the position of the chip along a Hilbert curve and the
+          core number.
+        - "rnd": a unique random number for each vertex.
+    machine : :py:class:`rig.place_and_route.Machine`
+    vertices : OrderedDict or [(x, y, p), ...]
+        Mapping from (x, y, p) to each vertex, or the (x, y, p) of the source
+        of each net.
+    random_state : :py:class:`numpy.random.RandomState`
+        Used for the "rnd" scheme.
+    index : array_like or None
+        If not None, a final field which distinguishes nets with the same
+        source (not used by the "rnd" scheme).
+
+    Returns
+    -------
+    (np.ndarray, np.ndarray)
+        The key and mask for each vertex (or net), in the order of
+        `vertices`.
+
+    Raises
+    ------
+    ValueError
+        If the fields do not fit in 32 bits.
+    """
+    coords = np.array(list(vertices), dtype=np.int64).reshape(-1, 3)
+    x, y, p = coords.T
+
+    if scheme == "xyp":
+        fields = [x, y, p]
+    elif scheme == "xyzp":
+        m = np.minimum(x, y)
+        fields = [x - m, y - m, m, p]
+    elif scheme == "hilbert":
+        order = np.zeros((machine.width, machine.height), dtype=np.int64)
+        for i, (cx, cy) in enumerate(chip for chip in
+                                     hilbert_chip_order(machine)
+                                     if chip in machine):
+            order[cx, cy] = i
+        fields = [order[x, y], p]
+    elif scheme == "rnd":
+        if random_state is None:
+            random_state = np.random.RandomState()
+        n_bits = max(1, int(len(coords) - 1).bit_length())
+        fields = [random_state.permutation(1 << n_bits)[:len(coords)]]
+    else:
+        raise ValueError("Unknown key scheme {!r}".format(scheme))
+
+    if index is not None and scheme != "rnd":
+        fields.append(np.asarray(index, dtype=np.int64))
+
+    keys = np.zeros(len(coords), dtype=np.int64)
+    mask = 0
+    start = 32
+    for field in fields:
+        length = max(1, int(field.max()).bit_length())
+        start -= length
+        if start < 0:
+            raise ValueError("The {} keys of {} vertices do not fit in 32 "
+                             "bits".format(scheme, len(coords)))
+        keys |= field << start
+        mask |= ((1 << length) - 1) << start
+
+    return (keys.astype(np.uint32),
+            np.full(len(coords), mask, dtype=np.uint32))
+
+
+def route_nets(vertices_resources, nets, machine, placements, allocations,
+               batch_size=1024):
+    """Route nets with NER and get the routing table entry of each net on
+    each chip it passes through.
+
+    The nets are routed in batches, so only the routing trees of one batch
+    are held at once.
+
+    Returns
+    -------
+    (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray)
+        For each routing table entry: the x and y co-ordinates of the chip,
+        the index of the net (in `nets`), the source word and the route word.
+        The entries for each chip are in the order in which `rig`'s
+        :py:func:`~rig.routing_table.routing_tree_to_tables` would produce
+        them.
+    """
+    columns = ([], [], [], [], [])
+    for start in range(0, len(nets), batch_size):
+        batch = nets[start:start + batch_size]
+        routes = route(vertices_resources, batch, machine, [], placements,
+                       allocations)
+
+        for i, net in enumerate(batch, start):
+            # As in routing_tree_to_tables, a net which reaches a chip more
+            # than once has a single entry with all the sources.
+            entries = OrderedDict()  # {(x, y): [source, route], ...}
+            for direction, chip, out_directions in routes[net].traverse():
+                source = (0 if direction is None else
+                          1 << direction.opposite)
+                route_word = common.route_word(out_directions)
+                if chip not in entries:
+                    entries[chip] = [source, route_word]
+                elif entries[chip][1] != route_word:
+                    raise ValueError("Net {} reaches chip {} with different "
+                                     "routes".format(i, chip))
+                else:
+                    entries[chip][0] |= source
+
+            for (x, y), (source, route_word) in entries.items():
+                for column, value in zip(columns, (x, y, i, source,
+                                                   route_word)):
+                    column.append(value)
+
+    return tuple(np.array(column, dtype=dtype) for column, dtype in
+                 zip(columns, (int, int, int, np.uint32, np.uint32)))
+
+
+def write_tables(writer, entries, keys, masks):
+    """Write the routing table of each chip, one chip at a time.
+
+    Parameters
+    ----------
+    writer : :py:class:`common.RoutingTableWriter`
+    entries : (np.ndarray, ...)
+        Routing table entries, as returned by :py:func:`route_nets`.
+    keys, masks : np.ndarray
+        Key and mask of each net.
+
+    Returns
+    -------
+    OrderedDict
+        Length of the table written for each chip.
+    """
+    xs, ys, nets, sources, routes = entries
+    order = np.lexsort((ys, xs))  # Stable, so entries stay in order
+    chips = np.stack((xs[order], ys[order]), axis=1)
+    bounds = np.concatenate((
+        [0], np.flatnonzero(np.any(chips[1:] != chips[:-1], axis=1)) + 1,
+        [len(order)]))
+
+    lengths = OrderedDict()
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if start == stop:
+            continue  # There are no entries at all
+        chip = tuple(int(c) for c in chips[start])
+        indices = order[start:stop]
+        writer.append(chip, common.RoutingTable(
+            keys[nets[indices]], masks[nets[indices]], routes[indices],
+            sources[indices]))
+        lengths[chip] = stop - start
+    return lengths
+
+
+ENTRY_COLUMNS = ("xs", "ys", "nets", "sources", "routes")
+"""Names of the arrays returned by :py:func:`route_nets`."""
+
+
+class RouteCache(object):
+    """On-disk cache of the routing table entries of routed networks.
+
+    The entries returned by :py:func:`route_nets` are stored in `.npz` files
+    named with the SHA-256 hash of the parameters of the network (e.g., the
+    profile, size of the machine and seed), from which the tables for any key
+    allocation may be written without generating or routing the nets again.
+    The parameters are stored alongside the entries.
+
+    Writes are atomic, so several processes may share a cache.
+
+    Attributes
+    ----------
+    hits : int
+        Number of networks read from the cache.
+    misses : int
+        Number of networks which were not in the cache.
+    """
+
+    VERSION = 1
+    """Included in every key, changed whenever the networks generated for the
+    same parameters change."""
+
+    def __init__(self, directory):
+        """
+        Parameters
+        ----------
+        directory : str
+            Directory in which the networks are stored, created if it does not
+            exist.
+        """
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    @classmethod
+    def key(cls, **params):
+        """Get the key for the network generated with the given parameters
+        (which must be JSON serialisable).
+        """
+        params = dict(params, cache_version=cls.VERSION)
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode(
+            "utf-8")).hexdigest()
+
+    def get(self, key):
+        """Get the routing table entries stored for a key.
+
+        Returns
+        -------
+        (np.ndarray, ...) or None
+            The entries, as returned by :py:func:`route_nets`, or None if the
+            network is not in the cache.
+        """
+        try:
+            with np.load(self._path(key)) as data:
+                entries = tuple(data[column] for column in ENTRY_COLUMNS)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entries
+
+    def put(self, key, entries, **params):
+        """Store the routing table entries (and the parameters) of a
+        network.
+        """
+        arrays = dict(zip(ENTRY_COLUMNS, entries))
+        arrays["params"] = np.array(json.dumps(params, sort_keys=True))
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".npz",
+                                         delete=False) as f:
+            np.savez(f, **arrays)
+        os.rename(f.name, self._path(key))
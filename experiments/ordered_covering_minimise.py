@@ -1,15 +1,24 @@
 import argparse
 import common
+import fast_oc
 from rig.routing_table.ordered_covering import ordered_covering
-from six import iteritems
 import time
 
-def my_minimize(chip, table):
+def my_minimize(chip, table, engine="rig", target_length=None,
+                time_budget=None):
     print("Minimising {}, {} entries...".format(chip, len(table)))
-    t = time.clock()
-    table, _ = ordered_covering(table, None)
-    total = time.clock() - t
+    t = time.time()
+    if engine == "rig":
+        table, _ = ordered_covering(table.to_entries(), target_length,
+                                    no_raise=True)
+    else:
+        table = fast_oc.ordered_covering(table, target_length, no_raise=True,
+                                         time_budget=time_budget)
+    total = time.time() - t
     print("... to {} entries in {} s".format(len(table), total))
+    if target_length is not None:
+        print("... target of {} entries {}".format(
+            target_length, "met" if len(table) <= target_length else "missed"))
     return chip, table
 
 if __name__ == "__main__":
@@ -17,18 +26,40 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("routing_table")
     parser.add_argument("output")
+    parser.add_argument("--chip", nargs=2, type=int, action="append",
+                        metavar=("X", "Y"),
+                        help="only minimise the table for this chip")
+    parser.add_argument("--engine", choices=("rig", "fast"), default="rig",
+                        help="implementation of Ordered Covering to use "
+                             "(`fast` is `fast_oc`, which produces the same "
+                             "tables)")
+    parser.add_argument("--target-length", type=int,
+                        help="stop minimising each table once it is no "
+                             "longer than this")
+    parser.add_argument("--time-budget", type=float, metavar="SECONDS",
+                        help="stop minimising each table after this long "
+                             "(requires `--engine fast`)")
     args = parser.parse_args()
+    if args.time_budget is not None and args.engine != "fast":
+        parser.error("--time-budget requires --engine fast")
 
-    # Load and minimise all routing tables
-    print("Loading routing tables...")
-    with open(args.routing_table, "rb") as f:
-        uncompressed = common.read_routing_tables(f)
+    # Minimise the routing tables one chip at a time, writing each minimised
+    # table as soon as it is produced.
+    print("Minimising routing tables into {}...".format(args.output))
+    with common.RoutingTableFile(args.routing_table) as f, \
+            common.RoutingTableWriter(args.output) as writer:
+        chips = [tuple(c) for c in args.chip] if args.chip else list(f)
+        n_met = 0
+        for chip in chips:
+            table = f.get_table(chip)
+            chip, new_table = my_minimize(chip, table, args.engine,
+                                          args.target_length,
+                                          args.time_budget)
+            writer.append(chip, new_table)
+            if (args.target_length is not None and
+                    len(new_table) <= args.target_length):
+                n_met += 1
 
-    print("Minimising routing tables...")
-    compressed = dict(
-        my_minimize(chip, table) for chip, table in iteritems(uncompressed)
-    )
-
-    print("Dumping minimised routing tables to {}...".format(args.output))
-    with open(args.output, "wb+") as f:
-        common.dump_routing_tables(f, compressed)
+    if args.target_length is not None:
+        print("Target of {} entries met for {} of {} chips".format(
+            args.target_length, n_met, len(chips)))
@@ -1,17 +1,16 @@
 import argparse
 import common
-from rig.routing_table.remove_default_routes import minimise
-from rig.routing_table import table_is_subset_of
-from six import iteritems
+import fast_rde
 import sys
+import verify
 
 
-def my_minimize(chip, table):
+def my_minimize(chip, table, verify_method="fast"):
     sys.stdout.write("({:3d}, {:3d})\t{:4d}\t".format(
         chip[0], chip[1], len(table)))
 
-    new_table = minimise(table, None)
-    assert table_is_subset_of(table, new_table)
+    new_table = fast_rde.minimise(table)
+    verify.check_table(table, new_table, verify_method)
 
     sys.stdout.write("\033[{}m{:4d}\033[39m\t{:.2f}%\n".format(
         32 if len(new_table) < 1024 else 31,
@@ -26,19 +25,21 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("routing_table")
     parser.add_argument("out")
+    parser.add_argument("--chip", nargs=2, type=int, action="append",
+                        metavar=("X", "Y"),
+                        help="only minimise the table for this chip")
+    parser.add_argument("--verify", choices=verify.METHODS, default="fast",
+                        help="how to check that each minimised table routes "
+                             "packets as the original did (default: "
+                             "%(default)s)")
     args = parser.parse_args()
 
-    # Load and minimise all routing tables
-    print("Loading routing tables...")
-    with open(args.routing_table, "rb") as f:
-        uncompressed = common.read_routing_tables(f)
-
-    print("Minimising routing tables...")
-    compressed = dict(
-        my_minimize(chip, table) for chip, table in iteritems(uncompressed)
-    )
-
-    fn = args.out
-    print("Dumping minimised routing tables to {}...".format(fn))
-    with open(fn, "wb+") as f:
-        common.dump_routing_tables(f, compressed)
+    # Minimise the routing tables one chip at a time, writing each minimised
+    # table as soon as it is produced.
+    print("Minimising routing tables into {}...".format(args.out))
+    with common.RoutingTableFile(args.routing_table) as f, \
+            common.RoutingTableWriter(args.out) as writer:
+        chips = [tuple(c) for c in args.chip] if args.chip else list(f)
+        for chip in chips:
+            table = f.get_table(chip)
+            writer.append(*my_minimize(chip, table, args.verify))
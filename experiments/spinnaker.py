@@ -3,9 +3,9 @@ tables.
 """
 import argparse
 import common
+from memory_profile import replay_allocations
 import numpy as np
 from rig.machine_control import MachineController
-from rig.routing_table import RoutingTableEntry, Routes
 from six import iteritems, iterkeys, itervalues
 import struct
 import time
@@ -13,12 +13,8 @@ import time
 
 def get_memory_profile(mc):
     """Return the cumulative heap usage over time."""
-    # Keep a track of how much memory is associated with each pointer,
-    # track cumulative memory usage over time
-    usage = [0]
-    pointers = dict()
-
-    # Read the linked list of entry arrays
+    # Read the linked list of allocation records
+    blocks = list()
     buf = mc.read_vcpu_struct_field("user0")
     while buf != 0x0:
         # Read back the data
@@ -27,66 +23,43 @@ def get_memory_profile(mc):
         # Unpack the header
         n_entries, buf_next = struct.unpack_from("<2I", data)
 
-        # Read in the memory recording entries
-        alloc_data = np.ndarray(
-            shape=(n_entries, 2),
-            dtype=np.uint32,
-            buffer=data[8:8 + n_entries*8]
-        )
-        for n_bytes, ptr in alloc_data[:]:
-            if n_bytes == 0:
-                # This is a free
-                usage.append(usage[-1] - pointers.pop(ptr))
-            else:
-                # This is an allocation
-                usage.append(usage[-1] + n_bytes)
-                pointers[ptr] = n_bytes
+        # View the memory recording entries
+        blocks.append(np.frombuffer(data, dtype=np.uint32,
+                                    count=n_entries*2, offset=8))
 
         # Progress to the next block of memory
         buf = buf_next
 
-    return np.array(usage, dtype=np.uint32)
+    # Replay the allocations to track cumulative memory usage over time
+    return replay_allocations(np.concatenate(blocks) if blocks else
+                              np.zeros(0, dtype=np.uint32))
 
 
 def pack_table(table, target_length):
     """Pack a routing table into the form required for dumping into SDRAM."""
+    table = common.RoutingTable.from_table(table)
     data = bytearray(2*4 + len(table)*3*4)
 
     # Pack the header
     struct.pack_into("<2I", data, 0, len(table), target_length)
 
     # Pack in the entries
-    offset = 8
-    for entry in table:
-        pack_rte_into(entry, data, offset)
-        offset += 12
+    entries = np.frombuffer(data, dtype="<u4", offset=8).reshape(-1, 3)
+    entries[:, 0] = table.keys
+    entries[:, 1] = table.masks
+    entries[:, 2] = table.routes
 
     return data
 
 
-def pack_rte_into(rte, buf, offset):
-    """Pack a routing table entry into a buffer."""
-    # Construct the route integer
-    route = 0x0
-    for r in rte.route:
-        route |= 1 << r
-
-    # Pack
-    struct.pack_into("<3I", buf, offset, rte.key, rte.mask, route)
-
-
 def unpack_table(data):
     # Unpack the header
     length, _ = struct.unpack_from("<2I", data)
 
     # Unpack the table
-    table = [None for __ in range(length)]
-    for i in range(length):
-        key, mask, route = struct.unpack_from("<3I", data, i*12 + 8)
-        routes = {r for r in Routes if (1 << r) & route}
-        table[i] = RoutingTableEntry(routes, key, mask)
-
-    return table
+    entries = np.frombuffer(data, dtype="<u4", count=length*3,
+                            offset=8).reshape(-1, 3)
+    return common.RoutingTable(entries[:, 0], entries[:, 1], entries[:, 2])
 
 
 if __name__ == "__main__":
@@ -101,7 +74,7 @@ if __name__ == "__main__":
     # Load and minimise all routing tables
     print("Reading routing tables...")
     with open(args.routing_table, "rb") as f:
-        uncompressed = common.read_routing_tables(f)
+        uncompressed = common.read_routing_table_columns(f)
 
     # Talk to the machine
     mc = MachineController("192.168.1.1")
@@ -1,25 +1,55 @@
 import argparse
 import common
+import multiprocessing
 from rig.routing_table import table_is_subset_of
 from six import iteritems
 import sys
+import verify
 
 if __name__ == "__main__":
     # Parse the arguments
     parser = argparse.ArgumentParser()
     parser.add_argument("original_table")
     parser.add_argument("compressed_table")
+    parser.add_argument("--verify", choices=("fast", "rig"), default="fast",
+                        help="how to compare the tables (default: "
+                             "%(default)s)")
+    parser.add_argument("--jobs", "-j", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of worker processes for --verify fast "
+                             "(default: one per CPU)")
     args = parser.parse_args()
 
-    # Load and test all routing tables
-    print("Loading...")
-    with open(args.original_table, "rb") as f:
-        original = common.read_routing_tables(f)
+    if args.verify == "rig":
+        # Load and test all routing tables
+        print("Loading...")
+        with open(args.original_table, "rb") as f:
+            original = common.read_routing_tables(f)
 
-    with open(args.compressed_table, "rb") as f:
-        compressed = common.read_routing_tables(f)
+        with open(args.compressed_table, "rb") as f:
+            compressed = common.read_routing_tables(f)
 
-    print("Testing...")
-    for chip, table in iteritems(original):
-        print("\t{}".format(chip))
-        assert table_is_subset_of(table, compressed[chip])
+        print("Testing...")
+        for chip, table in iteritems(original):
+            print("\t{}".format(chip))
+            assert table_is_subset_of(table, compressed[chip])
+    elif args.verify == "fast":
+        # Test the tables for each chip in parallel, reporting the first key
+        # which each chip routes differently.
+        print("Testing...")
+        with common.RoutingTableFile(args.original_table) as original, \
+                common.RoutingTableFile(args.compressed_table) as compressed:
+            results = verify.check_tables(original, compressed, args.jobs)
+
+        n_failed = 0
+        for chip, counterexample in iteritems(results):
+            if counterexample is None:
+                print("\t{}".format(chip))
+            else:
+                print("\t{}\t{}".format(
+                    chip, verify.describe_counterexample(counterexample)))
+                n_failed += 1
+
+        if n_failed:
+            print("{} of {} tables differ".format(n_failed, len(results)))
+            sys.exit(1)
@@ -0,0 +1,280 @@
+"""Heuristic two-level logic minimisation of cubes held as Numpy arrays.
+
+A cube is a 32-bit key and mask, as in a routing table entry: bits which are
+set in the mask are literals with the value of the corresponding bit of the
+key, other bits are don't cares. A set of cubes (a cover) is a pair of arrays
+of keys and masks.
+
+:py:func:`minimise` follows the main loop of Espresso: the on-set is expanded
+into prime cubes which do not intersect the off-set, redundant cubes are
+removed and then each cube is reduced and re-expanded for as long as this
+reduces the size of the cover. Unlike Espresso, a cube is only considered to
+cover a cube of the on-set if it contains it entirely (rather than the cover as
+a whole containing it), which keeps every step a matter of comparing arrays of
+keys and masks.
+"""
+import numpy as np
+
+
+_BITS = np.arange(32, dtype=np.uint32)
+
+
+def popcount(words):
+    """Count the bits set in each of an array of 32-bit words."""
+    words = np.ascontiguousarray(words, dtype=np.uint32)
+    return np.unpackbits(words.view(np.uint8)).reshape(
+        words.shape + (32, )).sum(axis=-1)
+
+
+def intersects(key_a, mask_a, key_b, mask_b):
+    """Determine whether cubes intersect (with broadcasting)."""
+    return ((key_a ^ key_b) & mask_a & mask_b) == 0
+
+
+def contains(key_a, mask_a, key_b, mask_b):
+    """Determine whether cube(s) a contain cube(s) b (with broadcasting)."""
+    return ((mask_a & ~mask_b) == 0) & (((key_a ^ key_b) & mask_a) == 0)
+
+
+def supercube(keys, masks):
+    """Get the smallest cube which contains all of a set of cubes."""
+    mask = (np.bitwise_and.reduce(masks) &
+            ~(np.bitwise_or.reduce(keys) ^ np.bitwise_and.reduce(keys)))
+    return np.bitwise_and.reduce(keys) & mask, mask
+
+
+def complement(keys, masks):
+    """Get a set of disjoint cubes which covers exactly the points which are
+    not covered by any of a set of cubes.
+
+    The complement is built by repeatedly removing each cube from the cubes of
+    the complement so far (starting from the universe), splitting every cube
+    which intersects it into the pieces which lie outside it.
+    """
+    out_keys = np.zeros(1, dtype=np.uint32)
+    out_masks = np.zeros(1, dtype=np.uint32)
+
+    for key, mask in zip(keys, masks):
+        disjoint = ((out_keys ^ key) & out_masks & mask) != 0
+        new_keys = [out_keys[disjoint]]
+        new_masks = [out_masks[disjoint]]
+
+        # Split the cubes which intersect this one on each literal of this
+        # cube which they do not have, keeping the half which differs and
+        # continuing with the half which agrees.
+        rest_keys = out_keys[~disjoint]
+        rest_masks = out_masks[~disjoint]
+        free = mask & ~rest_masks
+        for bit in (np.uint32(1 << b) for b in range(32) if mask & (1 << b)):
+            split = (free & bit) != 0
+            new_keys.append((rest_keys[split] & ~bit) | (~key & bit))
+            new_masks.append(rest_masks[split] | bit)
+            rest_keys = rest_keys | (key & bit)
+            rest_masks = rest_masks | bit
+
+        # What remains is inside this cube
+        out_keys = np.concatenate(new_keys)
+        out_masks = np.concatenate(new_masks)
+
+    return out_keys, out_masks
+
+
+def expand_cube(key, mask, keys, masks, off_keys, off_masks):
+    """Expand a cube into a prime cube which does not intersect the off-set.
+
+    Literals are first raised so as to cover as many of the given cubes as
+    possible (cheapest cube first) and then the remaining literals are reduced
+    to a minimal set which still excludes every cube of the off-set.
+
+    Parameters
+    ----------
+    key, mask : int
+        Cube to expand.
+    keys, masks : np.ndarray
+        Cubes which it would be desirable to cover.
+    off_keys, off_masks : np.ndarray
+        The off-set.
+
+    Returns
+    -------
+    (int, int)
+        The expanded cube.
+    """
+    # The literals which exclude each cube of the off-set, at least one of
+    # which must be retained for each. Cubes of the off-set which already
+    # intersect the cube can not be excluded and are ignored.
+    conflicts = (off_keys ^ key) & off_masks & mask
+    conflicts = np.unique(conflicts[conflicts != 0])
+
+    # Cover the other cubes, the cube which needs fewest literals raised first
+    while len(keys):
+        to_raise = mask & (~masks | (keys ^ key))
+        feasible = np.all(
+            (conflicts[np.newaxis, :] & ~to_raise[:, np.newaxis]) != 0,
+            axis=1) & (to_raise != 0)
+        if not np.any(feasible):
+            break
+
+        keys, masks, to_raise = keys[feasible], masks[feasible], \
+            to_raise[feasible]
+        best = np.argmin(popcount(to_raise))
+        mask &= ~to_raise[best]
+        key &= mask
+        conflicts &= mask
+
+    # Keep a minimal set of the literals which exclude the off-set
+    keep = np.uint32(0)
+    remaining = conflicts
+    while len(remaining):
+        counts = ((remaining[:, np.newaxis] >> _BITS) & 1).sum(axis=0)
+        bit = np.uint32(1 << int(np.argmax(counts)))
+        keep |= bit
+        remaining = remaining[(remaining & bit) == 0]
+
+    for bit in (np.uint32(1 << b) for b in range(32) if keep & (1 << b)):
+        if np.all((conflicts & keep & ~bit) != 0):
+            keep &= ~bit
+
+    return key & keep, keep
+
+
+def expand(keys, masks, off_keys, off_masks):
+    """Expand every cube of a cover into a prime, dropping any cubes which
+    are covered by the expanded cubes.
+    """
+    order = np.argsort(popcount(masks), kind="stable")  # Largest first
+    keys, masks = keys[order], masks[order]
+
+    covered = np.zeros(len(keys), dtype=bool)
+    new_keys, new_masks = list(), list()
+    for i in range(len(keys)):
+        if covered[i]:
+            continue
+        covered[i] = True
+
+        key, mask = expand_cube(keys[i], masks[i], keys[~covered],
+                                masks[~covered], off_keys, off_masks)
+        covered |= contains(key, mask, keys, masks)
+        new_keys.append(key)
+        new_masks.append(mask)
+
+    return (np.array(new_keys, dtype=np.uint32),
+            np.array(new_masks, dtype=np.uint32))
+
+
+def irredundant(keys, masks, on_keys, on_masks):
+    """Select a small subset of a cover which still covers every cube of the
+    on-set.
+
+    Cubes which are the only cover of a cube of the on-set are selected
+    first, then the cubes which cover most of the remaining cubes.
+    """
+    covers = contains(keys[np.newaxis, :], masks[np.newaxis, :],
+                      on_keys[:, np.newaxis], on_masks[:, np.newaxis])
+    n_covers = covers.sum(axis=1)
+
+    # Essential cubes
+    selected = np.zeros(len(keys), dtype=bool)
+    selected[np.argmax(covers[n_covers == 1], axis=1)] = True
+    uncovered = ~np.any(covers[:, selected], axis=1)
+
+    # Greedily cover the rest (preferring larger cubes)
+    sizes = popcount(masks)
+    while np.any(uncovered):
+        gains = covers[uncovered].sum(axis=0)
+        best = np.lexsort((sizes, -gains))[0]
+        selected[best] = True
+        uncovered &= ~covers[:, best]
+
+    # Remove cubes made redundant by those selected later
+    n_covers = covers[:, selected].sum(axis=1)
+    for i in np.flatnonzero(selected)[np.argsort(-sizes[selected],
+                                                 kind="stable")]:
+        if np.all(n_covers[covers[:, i]] > 1):
+            selected[i] = False
+            n_covers -= covers[:, i]
+
+    return keys[selected], masks[selected]
+
+
+def reduce(keys, masks, on_keys, on_masks):
+    """Reduce each cube of a cover to the smallest cube which contains the
+    cubes of the on-set which no other cube of the cover covers.
+
+    Cubes which cover nothing on their own are removed.
+    """
+    covers = contains(keys[np.newaxis, :], masks[np.newaxis, :],
+                      on_keys[:, np.newaxis], on_masks[:, np.newaxis])
+    n_covers = covers.sum(axis=1)
+
+    keys, masks = keys.copy(), masks.copy()
+    keep = np.ones(len(keys), dtype=bool)
+    for i in np.argsort(popcount(masks), kind="stable"):  # Largest first
+        unique = covers[:, i] & (n_covers == 1)
+        n_covers -= covers[:, i]
+
+        if not np.any(unique):
+            keep[i] = False
+            covers[:, i] = False
+        else:
+            keys[i], masks[i] = supercube(on_keys[unique], on_masks[unique])
+            covers[:, i] = contains(keys[i], masks[i], on_keys, on_masks)
+            n_covers += covers[:, i]
+
+    return keys[keep], masks[keep]
+
+
+def cost(keys, masks):
+    """Cost of a cover: the number of cubes and then the number of
+    literals.
+    """
+    return len(keys), int(popcount(masks).sum())
+
+
+def minimise(keys, masks, off_keys=None, off_masks=None):
+    """Minimise a set of cubes.
+
+    Parameters
+    ----------
+    keys, masks : array_like
+        The on-set.
+    off_keys, off_masks : array_like or None
+        The off-set. If None then the off-set is the complement of the on-set
+        (i.e., there are no don't cares), otherwise everything which is in
+        neither the on-set nor the off-set is a don't care.
+
+    Returns
+    -------
+    (np.ndarray, np.ndarray)
+        Keys and masks of the minimised cover, which covers every cube of the
+        on-set and intersects only those cubes of the off-set which intersect
+        the on-set.
+    """
+    # Remove duplicate cubes from the on-set
+    keys = np.asarray(keys, dtype=np.uint32)
+    masks = np.asarray(masks, dtype=np.uint32)
+    cubes = np.unique((masks.astype(np.uint64) << np.uint64(32)) | keys)
+    on_keys = (cubes & np.uint64(0xffffffff)).astype(np.uint32)
+    on_masks = (cubes >> np.uint64(32)).astype(np.uint32)
+
+    if off_keys is None:
+        off_keys, off_masks = complement(on_keys, on_masks)
+    else:
+        off_keys = np.asarray(off_keys, dtype=np.uint32)
+        off_masks = np.asarray(off_masks, dtype=np.uint32)
+
+    cover = expand(on_keys, on_masks, off_keys, off_masks)
+    cover = irredundant(cover[0], cover[1], on_keys, on_masks)
+
+    # Reduce, expand and remove redundant cubes until nothing improves
+    while len(cover[0]) > 1:
+        new_cover = reduce(cover[0], cover[1], on_keys, on_masks)
+        new_cover = expand(new_cover[0], new_cover[1], off_keys, off_masks)
+        new_cover = irredundant(new_cover[0], new_cover[1], on_keys,
+                                on_masks)
+
+        if cost(*new_cover) >= cost(*cover):
+            break
+        cover = new_cover
+
+    return cover
@@ -0,0 +1,269 @@
+"""Check that minimised routing tables route packets as the original tables
+did.
+
+:py:func:`find_counterexample` gives the same answer as
+:py:func:`rig.routing_table.table_is_subset_of` without expanding the entries
+of either table: the key space is partitioned, as in a ternary trie, into
+cubes which are matched first by the same entry of each table. A cube is only
+split (on a bit of the first entry of either table which intersects it) until
+the first entry of each table covers it, so the number of cubes visited
+depends on the structure of the tables rather than on the number of keys they
+match.
+
+:py:func:`check_tables` checks many chips in parallel and
+:py:func:`check_table` is used by the minimisers to verify each table they
+produce, with the method selected by `--verify`.
+"""
+from collections import OrderedDict
+import common
+import fast_rde
+import multiprocessing
+import numpy as np
+from rig.routing_table import table_is_subset_of
+
+
+METHODS = ("fast", "rig", "none")
+"""Methods with which minimised tables may be verified: with
+:py:func:`find_counterexample`, with
+:py:func:`rig.routing_table.table_is_subset_of` or not at all.
+"""
+
+
+def find_counterexample(table_a, table_b):
+    """Find a key which is routed differently by two routing tables.
+
+    As in :py:func:`rig.routing_table.table_is_subset_of` only keys which are
+    matched by an entry of `table_a` are considered and a key which matches no
+    entry of `table_b` is routed correctly if the entry of `table_a` which it
+    matches could be default routed.
+
+    Parameters
+    ----------
+    table_a, table_b : :py:class:`common.RoutingTable` or [RoutingTableEntry, ...]
+        Ordered routing tables to compare.
+
+    Returns
+    -------
+    (int, int, int or None) or None
+        None if every key matched by `table_a` is routed in the same way by
+        `table_b`, otherwise a key which is not (matched by the earliest
+        possible entry of `table_a`) and the route words given to it by each
+        table (None if the key matches no entry of `table_b`).
+    """
+    table_a = common.RoutingTable.from_table(table_a)
+    table_b = common.RoutingTable.from_table(table_b)
+
+    # Entries with key bits outside their mask match no keys. A catch-all
+    # entry is appended to table_b to stand for the keys it does not match.
+    table_a = table_a[(table_a.keys & table_a.masks) == table_a.keys]
+    table_b = table_b[(table_b.keys & table_b.masks) == table_b.keys]
+    table_b = common.RoutingTable(
+        *(np.append(words, np.zeros(1, dtype=np.uint32)) for words in
+          (table_b.keys, table_b.masks, table_b.routes, table_b.sources)))
+    defaultable = fast_rde.is_defaultable(table_a.sources, table_a.routes)
+
+    # Most entries of table_a are the first entry of table_a to match any of
+    # the keys they match and have every key they match matched first by the
+    # same entry of table_b, so can be checked at once.
+    keys, masks, routes = table_a.keys, table_a.masks, table_a.routes
+    first_a = _first_intersecting(keys, masks, keys, masks)
+    first_b = _first_intersecting(table_b.keys, table_b.masks, keys, masks)
+    matched = first_b < len(table_b) - 1
+    uniform = ((first_a == np.arange(len(table_a))) &
+               ((table_b.masks[first_b] & ~masks) == 0))
+    correct = np.where(matched, table_b.routes[first_b] == routes,
+                       defaultable)
+
+    for i in np.flatnonzero(~(uniform & correct)):
+        if uniform[i]:
+            return (int(keys[i]), int(routes[i]),
+                    int(table_b.routes[first_b[i]]) if matched[i] else None)
+
+        # Partition the keys matched by the entry
+        counterexample = _find_in_cube(table_a, defaultable, table_b,
+                                       int(keys[i]), int(masks[i]), i)
+        if counterexample is not None:
+            return counterexample
+
+    return None
+
+
+def _intersects(keys_a, masks_a, keys_b, masks_b):
+    """Determine whether cubes intersect (with broadcasting)."""
+    return ((keys_a ^ keys_b) & masks_a & masks_b) == 0
+
+
+_BLOCK_SIZE = 256
+"""Number of cubes compared with a table at once."""
+
+
+def _first_intersecting(keys, masks, cube_keys, cube_masks):
+    """Get the index of the first of a set of entries which intersects each of
+    a set of cubes (at least one entry must intersect each cube).
+    """
+    first = np.empty(len(cube_keys), dtype=int)
+    for start in range(0, len(cube_keys), _BLOCK_SIZE):
+        block = slice(start, start + _BLOCK_SIZE)
+        first[block] = np.argmax(
+            _intersects(keys, masks, cube_keys[block, np.newaxis],
+                        cube_masks[block, np.newaxis]), axis=1)
+    return first
+
+
+def _find_in_cube(table_a, defaultable, table_b, key, mask, entry):
+    """Find a key matched by an entry of `table_a` which is routed
+    differently by `table_b`.
+
+    The keys matched by the entry are partitioned, as in a ternary trie, into
+    cubes which are matched first by a single entry of each table.
+
+    Parameters
+    ----------
+    table_a : :py:class:`common.RoutingTable`
+    defaultable : np.ndarray
+        Which entries of `table_a` could be default routed.
+    table_b : :py:class:`common.RoutingTable`
+        Ending with a catch-all entry.
+    key, mask : int
+        Key and mask of the entry.
+    entry : int
+        Index of the entry in `table_a`.
+
+    Returns
+    -------
+    (int, int, int or None) or None
+        See :py:func:`find_counterexample`.
+    """
+    # Cubes still to check, with the entries of each table which intersected
+    # their parent.
+    cubes = [(key, mask, np.arange(entry + 1), np.arange(len(table_b)))]
+    while cubes:
+        key, mask, in_a, in_b = cubes.pop()
+
+        in_a = in_a[_intersects(table_a.keys[in_a], table_a.masks[in_a],
+                                key, mask)]
+        if len(in_a) == 0:
+            continue  # No key in the cube is matched by table_a
+        in_b = in_b[_intersects(table_b.keys[in_b], table_b.masks[in_b],
+                                key, mask)]
+
+        # Split the cube unless it is covered by the first entry of each table
+        # which intersects it.
+        split = ((int(table_a.masks[in_a[0]]) |
+                  int(table_b.masks[in_b[0]])) & ~mask)
+        if split:
+            bit = split & -split
+            cubes.append((key | bit, mask | bit, in_a, in_b))
+            cubes.append((key, mask | bit, in_a, in_b))
+            continue
+
+        route_a = int(table_a.routes[in_a[0]])
+        if in_b[0] < len(table_b) - 1:
+            route_b = int(table_b.routes[in_b[0]])
+            if route_a != route_b:
+                return key, route_a, route_b
+        elif not defaultable[in_a[0]]:
+            return key, route_a, None
+
+    return None
+
+
+def describe_counterexample(counterexample):
+    """Describe a counterexample returned by :py:func:`find_counterexample`."""
+    key, route_a, route_b = counterexample
+
+    def describe(route):
+        if route is None:
+            return "default routed"
+        return "{{{}}}".format(", ".join(
+            r.name for r in sorted(common.routes_from_word(route))))
+
+    return "key {:#010x} is routed {} by the first table but {} by the " \
+        "second".format(key, describe(route_a), describe(route_b))
+
+
+def check_table(table, new_table, method="fast"):
+    """Check that a minimised table routes every key matched by the original
+    table in the same way.
+
+    Parameters
+    ----------
+    table, new_table : :py:class:`common.RoutingTable`
+        The original and minimised tables.
+    method : str
+        One of `METHODS`.
+
+    Raises
+    ------
+    AssertionError
+        If the tables route a key differently.
+    """
+    if method == "fast":
+        counterexample = find_counterexample(table, new_table)
+        assert counterexample is None, \
+            describe_counterexample(counterexample)
+    elif method == "rig":
+        assert table_is_subset_of(table.to_entries(), new_table.to_entries())
+    elif method != "none":
+        raise ValueError("Unknown verification method {!r}".format(method))
+
+
+# Tables compared by the current worker process
+_worker_tables = None
+
+
+def _init_worker(tables_a, tables_b):
+    global _worker_tables
+    _worker_tables = (tables_a, tables_b)
+
+
+def _get_table(tables, chip):
+    if isinstance(tables, common.RoutingTableFile):
+        return tables.get_table(chip)
+    else:
+        return common.RoutingTable.from_table(tables[chip])
+
+
+def _check_chip(chip):
+    """Compare the tables for a chip given to `_init_worker`."""
+    tables_a, tables_b = _worker_tables
+    table_b = (_get_table(tables_b, chip) if chip in tables_b else
+               common.RoutingTable())
+    return chip, find_counterexample(_get_table(tables_a, chip), table_b)
+
+
+def check_tables(tables_a, tables_b, jobs=1, chips=None):
+    """Compare the routing tables of many chips, in parallel.
+
+    Parameters
+    ----------
+    tables_a, tables_b : :py:class:`common.RoutingTableFile` or {(x, y): table, ...}
+        Original and minimised tables. Chips without a table in `tables_b`
+        are compared with an empty table.
+    jobs : int
+        Number of worker processes to use, if 1 the tables are compared in
+        this process.
+    chips : [(x, y), ...] or None
+        Chips whose tables should be compared, if None then every chip in
+        `tables_a` is compared.
+
+    Returns
+    -------
+    OrderedDict
+        Mapping from chips to the result of :py:func:`find_counterexample`,
+        in the order in which the chips appear in `chips` or `tables_a`.
+    """
+    chips = list(tables_a) if chips is None else list(chips)
+
+    if jobs == 1:
+        _init_worker(tables_a, tables_b)
+        return OrderedDict(_check_chip(chip) for chip in chips)
+
+    pool = multiprocessing.Pool(jobs, _init_worker, (tables_a, tables_b))
+    try:
+        results = dict(pool.imap_unordered(_check_chip, chips))
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return OrderedDict((chip, results[chip]) for chip in chips)